@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+import sys
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,6 +26,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config("SECRET_KEY")
 DEBUG = config("DEBUG", cast=bool)
 
+# Running under `manage.py test`.
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Application definition
 
@@ -41,11 +45,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lmsApp.middleware.StaticFilesMiddleware',
+    'lmsApp.middleware.CompressionMiddleware',
+    'lmsApp.middleware.SlowQueryMiddleware',
+    'lmsApp.middleware.PrometheusMiddleware',
+    'lmsApp.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'lmsApp.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'lmsApp.middleware.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,7 +65,8 @@ ROOT_URLCONF = 'LMS.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, with render times reported to RequestMetricsMiddleware.
+        'BACKEND': 'lmsApp.instrumentation.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -62,22 +74,238 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'lmsApp.context_processors.template_cache',
             ],
         },
     },
 ]
 
+# Production template profile: parsed templates are kept in memory by the
+# cached loader for the life of the process. With DEBUG, Django's default
+# loaders are left in place so template edits are picked up by runserver.
+TEMPLATE_FRAGMENT_TIMEOUT = config("TEMPLATE_FRAGMENT_TIMEOUT", default=600, cast=int)
+
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'LMS.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+def postgres_database(config):
+    """
+    The 'default' database of the postgres profile, read through `config`
+    (decouple's config, or any callable with its signature).
+
+    Connections come from psycopg's pool (Django 5.1+) when DATABASE_POOL is
+    on. The pool replaces persistent connections, so CONN_MAX_AGE only
+    applies with the pool turned off. Server-side cursors stream
+    QuerySet.iterator() scans; disable them behind a transaction-pooling
+    PgBouncer.
+    """
+    pool = config("DATABASE_POOL", default=True, cast=bool)
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config("DATABASE_NAME", default="lms"),
+        'USER': config("DATABASE_USER", default="lms"),
+        'PASSWORD': config("DATABASE_PASSWORD", default=""),
+        'HOST': config("DATABASE_HOST", default="localhost"),
+        'PORT': config("DATABASE_PORT", default="5432"),
+        'CONN_MAX_AGE': 0 if pool else config("DATABASE_CONN_MAX_AGE", default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config("DATABASE_CONN_HEALTH_CHECKS", default=True, cast=bool),
+        'DISABLE_SERVER_SIDE_CURSORS': config("DATABASE_DISABLE_SERVER_SIDE_CURSORS", default=False, cast=bool),
+        'OPTIONS': {
+            'pool': {
+                'min_size': config("DATABASE_POOL_MIN_SIZE", default=2, cast=int),
+                'max_size': config("DATABASE_POOL_MAX_SIZE", default=20, cast=int),
+                'timeout': config("DATABASE_POOL_TIMEOUT", default=10, cast=int),
+            },
+        } if pool else {},
+    }
+
+
+def sqlite_database(config):
+    """
+    The 'default' database of the sqlite profile, tuned for concurrent web
+    traffic: WAL lets readers run alongside a writer, writers wait
+    (busy_timeout) instead of failing with "database is locked", and atomic()
+    blocks take the write lock up front (IMMEDIATE) so a read-then-write
+    transaction can't deadlock against another writer.
+    """
+    busy_timeout_ms = config("SQLITE_BUSY_TIMEOUT_MS", default=20000, cast=int)
+    cache_size_kb = config("SQLITE_CACHE_SIZE_KB", default=65536, cast=int)
+    mmap_size = config("SQLITE_MMAP_SIZE", default=268435456, cast=int)  # 256 MB
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': busy_timeout_ms / 1000,
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f'PRAGMA busy_timeout={busy_timeout_ms};'
+                f'PRAGMA cache_size=-{cache_size_kb};'
+                f'PRAGMA mmap_size={mmap_size};'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
     }
+
+
+# DATABASE_ENGINE selects the profile: "sqlite" (default) or "postgres".
+DATABASE_ENGINE = config("DATABASE_ENGINE", default="sqlite")
+DATABASES = {
+    'default': postgres_database(config) if DATABASE_ENGINE == "postgres" else sqlite_database(config),
+}
+
+# Optional read replica. When DATABASE_REPLICA_HOST (Postgres) or
+# DATABASE_REPLICA_NAME (database name / SQLite file) is set, a 'replica' alias
+# is added and lmsApp.routers sends reads there; writes, and reads that follow
+# a write in the same request, stay on 'default'.
+DATABASE_REPLICA_HOST = config("DATABASE_REPLICA_HOST", default="")
+DATABASE_REPLICA_NAME = config("DATABASE_REPLICA_NAME", default="")
+if DATABASE_REPLICA_HOST or DATABASE_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DATABASE_REPLICA_HOST or DATABASES['default'].get('HOST', ''),
+        'NAME': DATABASE_REPLICA_NAME or DATABASES['default']['NAME'],
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['lmsApp.routers.PrimaryReplicaRouter']
+
+# How long a browser keeps reading from the primary after it wrote something.
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", default=5, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND selects the profile: "locmem" (default, per process), "file"
+# (shared by processes on one host) or "redis" (any Redis-compatible server).
+
+CACHE_BACKEND = config("CACHE_BACKEND", default="locmem")
+
+if CACHE_BACKEND == "redis":
+    CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config("CACHE_URL", default="redis://127.0.0.1:6379/1"),
+    }
+elif CACHE_BACKEND == "file":
+    CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config("CACHE_LOCATION", default=os.path.join(BASE_DIR, '.cache')),
+    }
+else:
+    CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lms',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+CACHES = {
+    'default': {
+        **CACHE_DEFAULT,
+        'KEY_PREFIX': 'lms',
+        # Bump CACHE_VERSION to drop every cached entry at once (e.g. on deploy).
+        'VERSION': config("CACHE_VERSION", default=1, cast=int),
+        'TIMEOUT': config("CACHE_TIMEOUT", default=300, cast=int),
+    }
+}
+
+
+# Request metrics (lmsApp.middleware.RequestMetricsMiddleware)
+# Fraction of requests measured; each measured request is logged to the
+# 'lmsApp.metrics' logger and gets a Server-Timing header. Requests running
+# more queries than their view's budget, or repeating one statement more than
+# REQUEST_METRICS_REPEATED_QUERY_THRESHOLD times, are logged as warnings.
+
+REQUEST_METRICS_SAMPLE_RATE = config("REQUEST_METRICS_SAMPLE_RATE", default=1.0, cast=float)
+REQUEST_METRICS_SERVER_TIMING = config("REQUEST_METRICS_SERVER_TIMING", default=True, cast=bool)
+REQUEST_METRICS_QUERY_BUDGET = config("REQUEST_METRICS_QUERY_BUDGET", default=30, cast=int)
+REQUEST_METRICS_REPEATED_QUERY_THRESHOLD = config("REQUEST_METRICS_REPEATED_QUERY_THRESHOLD", default=5, cast=int)
+REQUEST_METRICS_VIEW_BUDGETS = {
+    'dashboard': 15,
+    'course_detail': 12,
+    'content_detail': 15,
+    'quiz_take': 12,
+    'quiz_submit': 20,
+    'quiz_result': 15,
+}
+
+# Slow query log (lmsApp.slow_queries): statements slower than this are
+# aggregated per fingerprint and view in the SlowQuery table, listed at
+# /slow-queries/ for staff and by `manage.py slow_queries`.
+SLOW_QUERY_LOG_ENABLED = config("SLOW_QUERY_LOG_ENABLED", default=True, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config("SLOW_QUERY_THRESHOLD_MS", default=100, cast=float)
+
+# Instructor analytics (lmsApp.analytics), precomputed by the refresh_analytics
+# command, which should run on a schedule. A learner is active if they
+# completed content or attempted a quiz in the last ANALYTICS_ACTIVE_DAYS;
+# analytics older than ANALYTICS_MAX_AGE_HOURS are refreshed even without
+# new activity.
+ANALYTICS_ACTIVE_DAYS = config("ANALYTICS_ACTIVE_DAYS", default=7, cast=int)
+ANALYTICS_MAX_AGE_HOURS = config("ANALYTICS_MAX_AGE_HOURS", default=24, cast=int)
+
+# Admin changelists of the large tables (lmsApp.admin_tools) count at most
+# this many rows; unfiltered tables bigger than this show the database's row
+# estimate instead.
+ADMIN_COUNT_LIMIT = config("ADMIN_COUNT_LIMIT", default=10000, cast=int)
+
+# lmsApp.middleware.CompressionMiddleware compresses text responses (HTML,
+# JSON, CSV, including streamed ones) of at least RESPONSE_COMPRESSION_MIN_SIZE
+# bytes with brotli or gzip. Turn it off when a front-end server compresses.
+RESPONSE_COMPRESSION = config("RESPONSE_COMPRESSION", default=True, cast=bool)
+RESPONSE_COMPRESSION_MIN_SIZE = config("RESPONSE_COMPRESSION_MIN_SIZE", default=1024, cast=int)
+RESPONSE_COMPRESSION_BROTLI_QUALITY = config("RESPONSE_COMPRESSION_BROTLI_QUALITY", default=5, cast=int)
+
+# Prometheus metrics (lmsApp.metrics), served at /metrics/ to staff users, to
+# scrapers sending "Authorization: Bearer <METRICS_BEARER_TOKEN>", and to the
+# client addresses in METRICS_ALLOWED_IPS. Both are empty by default. Behind a
+# reverse proxy every request arrives from the proxy's address, so only list
+# addresses that reach the app directly; use the token otherwise. See
+# lmsApp/metrics.py for running with several worker processes
+# (PROMETHEUS_MULTIPROC_DIR).
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", default="", cast=Csv())
+METRICS_BEARER_TOKEN = config("METRICS_BEARER_TOKEN", default="")
+
+# On-demand profiling (lmsApp.middleware.RequestProfilingMiddleware). When
+# enabled, staff can profile a request with ?profile=cprofile or ?profile=sample,
+# and REQUEST_PROFILING_SAMPLE_RATE profiles a fraction of all requests with
+# the sampling profiler. Profiles and SQL logs are written to
+# REQUEST_PROFILING_DIR. Disabled, the middleware is removed at startup.
+REQUEST_PROFILING_ENABLED = config("REQUEST_PROFILING_ENABLED", default=False, cast=bool)
+REQUEST_PROFILING_SAMPLE_RATE = config("REQUEST_PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+REQUEST_PROFILING_DIR = config("REQUEST_PROFILING_DIR", default=str(BASE_DIR / 'profiles'))
+REQUEST_PROFILING_INTERVAL = config("REQUEST_PROFILING_INTERVAL", default=0.005, cast=float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'lmsApp.metrics': {
+            'handlers': ['console'],
+            'level': config("REQUEST_METRICS_LOG_LEVEL", default="WARNING"),
+            'propagate': False,
+        },
+        'lmsApp.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -119,10 +347,64 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+STATIC_ROOT = config("STATIC_ROOT", default=os.path.join(BASE_DIR, 'staticfiles'))
+
+# Production static build: `manage.py collectstatic` writes content-hashed
+# copies of every file (names in STATIC_ROOT/staticfiles.json) plus gzip and
+# brotli variants of the text ones (lmsApp.storage). Off by default with DEBUG,
+# where files are served straight from the apps, and under the test runner,
+# which doesn't run collectstatic.
+STATIC_MANIFEST = config("STATIC_MANIFEST", default=not DEBUG and not TESTING, cast=bool)
+STATIC_BROTLI_QUALITY = config("STATIC_BROTLI_QUALITY", default=11, cast=int)
+
+# Uploaded media is stored once per distinct file, named by its SHA-256
+# digest (lmsApp.storage.ContentAddressedStorage); `manage.py gc_media`
+# deletes files no longer referenced that are older than MEDIA_GC_GRACE_HOURS.
+# Keep FILE_UPLOAD_TEMP_DIR on the same filesystem as MEDIA_ROOT so large
+# uploads are renamed into place rather than copied.
+MEDIA_CONTENT_ADDRESSED = config("MEDIA_CONTENT_ADDRESSED", default=True, cast=bool)
+MEDIA_GC_GRACE_HOURS = config("MEDIA_GC_GRACE_HOURS", default=24, cast=int)
+FILE_UPLOAD_TEMP_DIR = config("FILE_UPLOAD_TEMP_DIR", default=None)
+FILE_UPLOAD_HANDLERS = [
+    'lmsApp.storage.HashingMemoryFileUploadHandler',
+    'lmsApp.storage.HashingTemporaryFileUploadHandler',
+]
+
+STORAGES = {
+    'default': {
+        'BACKEND': (
+            'lmsApp.storage.ContentAddressedStorage' if MEDIA_CONTENT_ADDRESSED
+            else 'django.core.files.storage.FileSystemStorage'
+        ),
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'lmsApp.storage.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+# lmsApp.middleware.StaticFilesMiddleware serves STATIC_ROOT from the app,
+# choosing the precompressed variant by Accept-Encoding. Hashed files are
+# cached by browsers for a year; other files for STATIC_MAX_AGE seconds. Turn
+# it off when a front-end server or CDN serves STATIC_ROOT.
+STATIC_SERVE = config("STATIC_SERVE", default=not DEBUG, cast=bool)
+STATIC_MAX_AGE = config("STATIC_MAX_AGE", default=60, cast=int)
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Resumable chunked uploads of Content files (lmsApp.uploads). Partial files
+# live in UPLOAD_SESSION_DIR, which must be on the same filesystem as
+# MEDIA_ROOT so finished files are renamed into place rather than copied.
+# Unfinished uploads are removed by `manage.py purge_uploads` after
+# UPLOAD_SESSION_MAX_AGE_HOURS without a chunk.
+UPLOAD_SESSION_DIR = config("UPLOAD_SESSION_DIR", default=os.path.join(MEDIA_ROOT, 'upload_sessions'))
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int)
+UPLOAD_MAX_SIZE = config("UPLOAD_MAX_SIZE", default=5 * 1024 ** 3, cast=int)
+UPLOAD_SESSION_MAX_AGE_HOURS = config("UPLOAD_SESSION_MAX_AGE_HOURS", default=48, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -145,4 +427,7 @@ EMAIL_HOST = config("EMAIL_HOST")
 EMAIL_PORT = config("EMAIL_PORT", cast=int)
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Base URL for links in emails sent outside a request (e.g. by enroll_students).
+SITE_URL = config("SITE_URL", default="http://localhost:8000")
@@ -1,6 +1,14 @@
 # core/admin.py
-from django.contrib import admin
+import io
+
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from .admin_tools import LargeTableAdmin, course_filter, input_filter, student_filter
+from .enrollment_import import EnrollmentImporter, EnrollmentImportError
+from .forms import BulkEnrollmentForm
 from .models import *
 
 # Register your models here.
@@ -37,14 +45,63 @@ class ContentInline(admin.TabularInline):
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'instructor', 'price', 'is_published', 'created_at', 'updated_at', 'slug')
+    list_select_related = ('instructor',)
     list_filter = ('is_published', 'instructor')
     search_fields = ('title', 'description', 'instructor__username')
     prepopulated_fields = {'slug': ('title',)} # Auto-populate slug from title
     inlines = [ModuleInline]
+    actions = ['bulk_enroll']
+
+    def get_urls(self):
+        return [
+            path('<int:course_id>/bulk-enroll/', self.admin_site.admin_view(self.bulk_enroll_view),
+                 name='lmsApp_course_bulk_enroll'),
+        ] + super().get_urls()
+
+    @admin.action(description="Bulk enroll students from a CSV file")
+    def bulk_enroll(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one course to enroll students in.", messages.WARNING)
+            return None
+        return redirect('admin:lmsApp_course_bulk_enroll', course_id=queryset.get().pk)
+
+    def bulk_enroll_view(self, request, course_id):
+        """Upload form for EnrollmentImporter; shows the import report afterwards."""
+        course = get_object_or_404(Course.objects.select_related('instructor'), pk=course_id)
+        if not self.has_change_permission(request, course):
+            return redirect('admin:index')
+
+        stats = errors = None
+        form = BulkEnrollmentForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            importer = EnrollmentImporter(
+                course, request.build_absolute_uri('/'), send_emails=form.cleaned_data['send_emails'],
+            )
+            # Read the upload as a text stream; large uploads are already on disk.
+            stream = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+            try:
+                stats = importer.import_csv(stream)
+                errors = importer.errors
+                self.message_user(request, f"Enrolled {stats['enrolled']} student(s) in \"{course.title}\".", messages.SUCCESS)
+            except (EnrollmentImportError, UnicodeDecodeError) as e:
+                form.add_error('csv_file', str(e))
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"Bulk enroll students: {course.title}",
+            'course': course,
+            'form': form,
+            'stats': stats,
+            'errors': errors,
+            'opts': self.model._meta,
+            'course_change_url': reverse('admin:lmsApp_course_change', args=[course.pk]),
+        }
+        return TemplateResponse(request, 'admin/lmsApp/course/bulk_enroll.html', context)
 
 @admin.register(Module)
 class ModuleAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'order')
+    list_select_related = ('course',)
     list_filter = ('course',)
     search_fields = ('title', 'description', 'course__title')
     inlines = [LessonInline]
@@ -52,6 +109,7 @@ class ModuleAdmin(admin.ModelAdmin):
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
     list_display = ('title', 'module', 'order')
+    list_select_related = ('module__course',)
     list_filter = ('module__course', 'module')
     search_fields = ('title', 'description', 'module__title')
     inlines = [ContentInline]
@@ -59,21 +117,24 @@ class LessonAdmin(admin.ModelAdmin):
 @admin.register(Content)
 class ContentAdmin(admin.ModelAdmin):
     list_display = ('title', 'lesson', 'content_type', 'order', 'created_at')
+    list_select_related = ('lesson',)
     list_filter = ('content_type', 'lesson__module__course', 'lesson__module', 'lesson')
     search_fields = ('title', 'text_content', 'video_url', 'lesson__title')
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
     list_display = ('student', 'course', 'enrolled_at', 'completed')
-    list_filter = ('completed', 'course', 'student')
-    search_fields = ('student__username', 'course__title')
+    list_filter = ('completed', course_filter(), student_filter())
+    list_select_related = ('student', 'course')
+    search_fields = ('student__username__exact',)
     raw_id_fields = ('student', 'course') # Use raw_id_fields for FKs to improve performance with many users/courses
 
 @admin.register(StudentContentProgress)
-class StudentContentProgressAdmin(admin.ModelAdmin):
+class StudentContentProgressAdmin(LargeTableAdmin):
     list_display = ('student', 'content', 'completed', 'completed_at')
-    list_filter = ('completed', 'content__lesson__module__course', 'student')
-    search_fields = ('student__username', 'content__title')
+    list_filter = ('completed', course_filter('content__lesson__module__course__slug'), student_filter())
+    list_select_related = ('student', 'content__lesson')
+    search_fields = ('student__username__exact',)
     raw_id_fields = ('student', 'content')
     readonly_fields = ('completed_at',) # completed_at is set automatically by save method
 
@@ -87,6 +148,7 @@ class OptionInline(admin.TabularInline):
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('text', 'quiz', 'order')
+    list_select_related = ('quiz',)
     list_filter = ('quiz',)
     search_fields = ('text', 'quiz__title')
     inlines = [OptionInline]
@@ -100,29 +162,70 @@ class QuestionInline(admin.TabularInline):
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'lesson', 'duration_minutes', 'pass_percentage', 'created_at')
+    list_select_related = ('lesson__module__course',)
     list_filter = ('lesson__module__course', 'lesson')
     search_fields = ('title', 'description', 'lesson__title')
     inlines = [QuestionInline]
     raw_id_fields = ('lesson',) # Use raw_id_fields for OneToOneField
 
 @admin.register(StudentQuizAttempt)
-class StudentQuizAttemptAdmin(admin.ModelAdmin):
+class StudentQuizAttemptAdmin(LargeTableAdmin):
     list_display = ('student', 'quiz', 'score', 'passed', 'attempt_date')
-    list_filter = ('passed', 'quiz', 'student')
-    search_fields = ('student__username', 'quiz__title')
+    list_filter = (
+        'passed', course_filter('quiz__lesson__module__course__slug'),
+        input_filter('quiz', 'quiz', 'quiz_id', placeholder='Quiz ID'), student_filter(),
+    )
+    list_select_related = ('student', 'quiz')
+    search_fields = ('student__username__exact',)
     raw_id_fields = ('student', 'quiz')
 
 @admin.register(StudentAnswer)
-class StudentAnswerAdmin(admin.ModelAdmin):
+class StudentAnswerAdmin(LargeTableAdmin):
     list_display = ('attempt', 'question', 'chosen_option')
-    list_filter = ('attempt__quiz', 'question__quiz')
-    search_fields = ('attempt__student__username', 'question__text', 'chosen_option__text')
+    list_filter = (
+        input_filter('quiz', 'quiz', 'attempt__quiz_id', placeholder='Quiz ID'),
+        input_filter('attempt', 'attempt', 'attempt_id', placeholder='Attempt ID'),
+        student_filter('attempt__student__username'),
+    )
+    list_select_related = ('attempt__student', 'attempt__quiz', 'question', 'chosen_option')
+    search_fields = ('attempt__student__username__exact',)
     raw_id_fields = ('attempt', 'question', 'chosen_option')
 
 @admin.register(Certificate)
-class CertificateAdmin(admin.ModelAdmin):
+class CertificateAdmin(LargeTableAdmin):
     list_display = ('student', 'course', 'issue_date', 'certificate_id', 'pdf_file')
-    list_filter = ('issue_date', 'course', 'student')
-    search_fields = ('student__username', 'course__title', 'certificate_id')
+    list_filter = ('issue_date', course_filter(), student_filter())
+    list_select_related = ('student', 'course')
+    search_fields = ('student__username__exact', 'certificate_id__exact')
     readonly_fields = ('issue_date', 'certificate_id')
-    raw_id_fields = ('student', 'course')
\ No newline at end of file
+    raw_id_fields = ('student', 'course')
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('view', 'fingerprint', 'calls', 'total_ms', 'max_ms', 'last_seen')
+    list_filter = ('view',)
+    search_fields = ('fingerprint', 'view')
+    readonly_fields = ('fingerprint_hash', 'first_seen', 'last_seen')
+
+
+@admin.register(CourseAnalytics)
+class CourseAnalyticsAdmin(admin.ModelAdmin):
+    list_display = ('course', 'enrollments', 'active_learners', 'completions', 'average_quiz_score', 'refreshed_at')
+    list_select_related = ('course',)
+    search_fields = ('course__title',)
+    readonly_fields = [field.name for field in CourseAnalytics._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'offset', 'size', 'content', 'updated_at', 'completed_at')
+    list_filter = ('completed_at',)
+    list_select_related = ('user', 'content')
+    search_fields = ('filename', 'user__username__exact')
+    readonly_fields = [field.name for field in UploadSession._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
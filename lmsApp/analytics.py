@@ -0,0 +1,127 @@
+"""
+Per-course analytics for instructors, precomputed into CourseAnalytics.
+
+refresh_course_analytics() recomputes one course with grouped aggregate
+queries: counts over enrollments and quiz attempts, one grouped query for
+the lessons' content totals, and one pass over the completed contents
+grouped by student and lesson, from which the funnel's starters and
+completions per lesson and per module are counted. The number of queries
+is fixed, whatever the size of the course or the number of students.
+
+The `refresh_analytics` management command is meant to run on a schedule
+(e.g. every few minutes from cron). By default it only refreshes courses
+that had enrollments, progress, quiz attempts or new content since their
+last refresh, plus those older than ANALYTICS_MAX_AGE_HOURS, which picks up
+changes the timestamps can't show (deleted rows, content marked incomplete).
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Content, Course, CourseAnalytics, Enrollment, Lesson, Module, StudentContentProgress, StudentQuizAttempt
+
+
+def _students_completing(progress, contents):
+    """How many students have `contents` completed rows in `progress`, counted by the database."""
+    if not contents:
+        return 0
+    return progress.order_by().values('student').annotate(done=Count('id')).filter(done=contents).count()
+
+
+def _funnel(course_id, progress):
+    contents_by_lesson = dict(
+        Content.objects.filter(lesson__module__course_id=course_id)
+        .order_by().values_list('lesson').annotate(contents=Count('id'))
+    )
+    lessons = {}
+    lessons_by_module = {}
+    for lesson_id, module_id, title in Lesson.objects.filter(module__course_id=course_id).values_list('id', 'module_id', 'title'):
+        lessons[lesson_id] = {
+            'id': lesson_id,
+            'title': title,
+            'contents': contents_by_lesson.get(lesson_id, 0),
+            'started': 0,
+            'completed': 0,
+        }
+        lessons_by_module.setdefault(module_id, []).append(lessons[lesson_id])
+
+    # One row per student and lesson, with the number of its contents the student completed.
+    done_by_student_module = defaultdict(int)
+    rows = (
+        progress.order_by()
+        .values_list('student_id', 'content__lesson_id', 'content__lesson__module_id')
+        .annotate(done=Count('id'))
+    )
+    for student_id, lesson_id, module_id, done in rows.iterator(chunk_size=5000):
+        lesson = lessons[lesson_id]
+        lesson['started'] += 1
+        if done == lesson['contents']:
+            lesson['completed'] += 1
+        done_by_student_module[student_id, module_id] += done
+
+    contents_by_module = {
+        module_id: sum(lesson['contents'] for lesson in module_lessons)
+        for module_id, module_lessons in lessons_by_module.items()
+    }
+    completed_by_module = Counter(
+        module_id for (_, module_id), done in done_by_student_module.items() if done == contents_by_module[module_id]
+    )
+    return [
+        {'id': module_id, 'title': title, 'completed': completed_by_module[module_id],
+         'lessons': lessons_by_module.get(module_id, [])}
+        for module_id, title in Module.objects.filter(course_id=course_id).values_list('id', 'title')
+    ]
+
+
+def refresh_course_analytics(course_id, now=None):
+    """Recomputes and saves the CourseAnalytics row of one course."""
+    now = now or timezone.now()
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    progress = StudentContentProgress.objects.filter(
+        content__lesson__module__course_id=course_id, completed=True,
+        student__enrollments__course_id=course_id,
+    )
+    attempts = StudentQuizAttempt.objects.filter(quiz__lesson__module__course_id=course_id)
+
+    since = now - timedelta(days=settings.ANALYTICS_ACTIVE_DAYS)
+    active_learners = enrollments.filter(
+        Exists(progress.filter(student=OuterRef('student_id'), completed_at__gte=since))
+        | Exists(attempts.filter(student=OuterRef('student_id'), attempt_date__gte=since))
+    ).count()
+    total_contents = Content.objects.filter(lesson__module__course_id=course_id).count()
+    quiz = attempts.aggregate(attempts=Count('id'), average=Avg('score'))
+
+    analytics, _ = CourseAnalytics.objects.update_or_create(course_id=course_id, defaults={
+        'enrollments': enrollments.count(),
+        'active_learners': active_learners,
+        'completions': _students_completing(progress, total_contents),
+        'total_contents': total_contents,
+        'quiz_attempts': quiz['attempts'],
+        'average_quiz_score': round(quiz['average'], 2) if quiz['average'] is not None else None,
+        'funnel': _funnel(course_id, progress),
+        'refreshed_at': now,
+    })
+    return analytics
+
+
+def stale_course_ids(now=None):
+    """
+    Courses whose analytics are missing, older than ANALYTICS_MAX_AGE_HOURS,
+    or older than the latest enrollment, completed content, quiz attempt or
+    added content item of the course.
+    """
+    now = now or timezone.now()
+    refreshed_at = OuterRef('analytics__refreshed_at')
+    return list(Course.objects.filter(
+        Q(analytics__isnull=True)
+        | Q(analytics__refreshed_at__lt=now - timedelta(hours=settings.ANALYTICS_MAX_AGE_HOURS))
+        | Exists(Enrollment.objects.filter(course=OuterRef('pk'), enrolled_at__gt=refreshed_at))
+        | Exists(StudentContentProgress.objects.filter(
+            content__lesson__module__course=OuterRef('pk'), completed_at__gt=refreshed_at))
+        | Exists(StudentQuizAttempt.objects.filter(
+            quiz__lesson__module__course=OuterRef('pk'), attempt_date__gt=refreshed_at))
+        | Exists(Content.objects.filter(lesson__module__course=OuterRef('pk'), created_at__gt=refreshed_at))
+    ).values_list('id', flat=True))
@@ -0,0 +1,239 @@
+"""
+Read-only JSON API (v1) for the mobile client: the course catalog, a course's
+outline and the current student's progress.
+
+Rows are read with values(), so no model instances are built. Clients can
+ask for fewer fields per resource type with sparse fieldsets
+(?fields[course]=id,title&fields[content]=id,title), lists are paginated
+with an opaque cursor (?cursor=...&limit=...; the response's `next` is the
+URL of the following page), and the catalog and outlines carry an ETag
+derived from their cache version, so a client revalidating with
+If-None-Match gets a 304 without the data being read again.
+"""
+import base64
+import hashlib
+import json
+from functools import wraps
+
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import etag, require_GET
+
+from .cache import get_version
+from .models import Content, Course, Enrollment, StudentContentProgress
+from .queries import course_outline_data
+
+
+# Public name -> values() lookup, per resource type. Every field is returned
+# unless the client asks for specific ones. Progress fields without a lookup
+# are computed.
+FIELDS = {
+    'course': {
+        'id': 'id', 'slug': 'slug', 'title': 'title', 'description': 'description', 'price': 'price',
+        'thumbnail': 'thumbnail', 'instructor': 'instructor__username', 'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    'module': {'id': 'id', 'title': 'title', 'description': 'description', 'order': 'order'},
+    'lesson': {'id': 'id', 'title': 'title', 'description': 'description', 'order': 'order'},
+    'content': {'id': 'id', 'title': 'title', 'content_type': 'content_type', 'order': 'order'},
+    'progress': {
+        'course_id': 'course_id', 'course_slug': 'course__slug', 'course_title': 'course__title',
+        'enrolled_at': 'enrolled_at', 'completed': 'completed', 'total_contents': None,
+        'completed_contents': None, 'progress_percentage': None,
+    },
+}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """GET only, authenticated (401 rather than a login redirect), APIError -> JSON error."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Authentication required.', 401)
+        try:
+            response = view(request, *args, **kwargs)
+        except APIError as e:
+            return error_response(str(e), e.status)
+        response['Vary'] = 'Cookie'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+
+def requested_fields(request, resource):
+    """The fields of `resource` the client asked for with fields[<resource>], in declaration order."""
+    available = FIELDS[resource]
+    param = request.GET.get(f'fields[{resource}]')
+    if not param:
+        return list(available)
+    names = {name.strip() for name in param.split(',') if name.strip()}
+    unknown = names - available.keys()
+    if unknown:
+        raise APIError(f"Unknown {resource} field(s): {', '.join(sorted(unknown))}.")
+    return [name for name in available if name in names]
+
+
+def pick(row, fields):
+    return {name: row[name] for name in fields}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError
+        return timestamp, int(pk)
+    except (ValueError, TypeError):
+        raise APIError('Invalid cursor.')
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIError('limit must be a number.')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(request, queryset, timestamp_field):
+    """
+    Keyset pagination over `queryset`, newest first by (timestamp_field, id):
+    each page continues strictly after the last row of the previous one, so
+    it costs the same however deep the client goes and doesn't skip or repeat
+    rows when new ones are added. Returns (rows, next page URL or None).
+    """
+    limit = page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{timestamp_field}__lt': timestamp}) | Q(**{timestamp_field: timestamp, 'id__lt': pk})
+        )
+    rows = list(queryset.order_by(f'-{timestamp_field}', '-id')[:limit + 1])
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor([rows[-1][timestamp_field].isoformat(), rows[-1]['id']])
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode(safe="[],")}')
+    return rows, next_url
+
+
+def _query_etag(version, request):
+    digest = hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:12]
+    return f'{version}-{digest}'
+
+
+def catalog_etag(request):
+    return _query_etag(get_version('catalog'), request)
+
+
+def visible_course_id(request, slug):
+    """The id of the course `slug`, or None if it doesn't exist or the requester can't see it."""
+    course = Course.objects.filter(slug=slug).values('id', 'is_published', 'instructor_id').first()
+    if course is None or not (course['is_published'] or course['instructor_id'] == request.user.pk
+                              or request.user.is_staff):
+        return None
+    return course['id']
+
+
+def outline_etag(request, slug):
+    # No ETag for hidden courses, so a matching If-None-Match can't answer
+    # 304 and confirm that a draft exists.
+    course_id = visible_course_id(request, slug)
+    if course_id is None:
+        return None
+    return _query_etag(get_version('course', course_id), request)
+
+
+@api_view
+@etag(catalog_etag)
+def course_list(request):
+    """GET /api/v1/courses/ - published courses, newest first."""
+    fields = requested_fields(request, 'course')
+    lookups = FIELDS['course']
+    queryset = Course.objects.filter(is_published=True).values(
+        'id', 'created_at', *(lookups[name] for name in fields)
+    )
+    rows, next_url = paginate(request, queryset, 'created_at')
+    data = [{name: row[lookups[name]] for name in fields} for row in rows]
+    return JsonResponse({'data': data, 'next': next_url})
+
+
+@api_view
+@etag(outline_etag)
+def course_outline(request, slug):
+    """GET /api/v1/courses/<slug>/ - the course with its modules, lessons and content items."""
+    course_id = visible_course_id(request, slug)
+    if course_id is None:
+        raise APIError('Course not found.', 404)
+
+    outline = course_outline_data(course_id)
+    fields = {resource: requested_fields(request, resource) for resource in ('course', 'module', 'lesson', 'content')}
+    data = pick(outline['course'], fields['course'])
+    data['modules'] = [
+        {
+            **pick(module, fields['module']),
+            'lessons': [
+                {
+                    **pick(lesson, fields['lesson']),
+                    'contents': [pick(content, fields['content']) for content in lesson['contents']],
+                }
+                for lesson in module['lessons']
+            ],
+        }
+        for module in outline['modules']
+    ]
+    return JsonResponse({'data': data})
+
+
+@api_view
+def my_progress(request):
+    """GET /api/v1/me/progress/ - the current student's enrollments with their progress, newest first."""
+    fields = requested_fields(request, 'progress')
+    lookups = {name: lookup for name, lookup in FIELDS['progress'].items() if lookup}
+    queryset = Enrollment.objects.filter(student=request.user).values('id', *lookups.values())
+    rows, next_url = paginate(request, queryset, 'enrolled_at')
+
+    # Totals and completions for the whole page in two grouped queries.
+    course_ids = [row['course_id'] for row in rows]
+    total_by_course = dict(
+        Content.objects.filter(lesson__module__course__in=course_ids)
+        .values_list('lesson__module__course').annotate(total=Count('id'))
+    )
+    completed_by_course = dict(
+        StudentContentProgress.objects.filter(
+            student=request.user, content__lesson__module__course__in=course_ids, completed=True,
+        ).values_list('content__lesson__module__course').annotate(completed=Count('id'))
+    )
+
+    data = []
+    for row in rows:
+        total = total_by_course.get(row['course_id'], 0)
+        completed = completed_by_course.get(row['course_id'], 0)
+        item = {name: row[lookup] for name, lookup in lookups.items()}
+        item['total_contents'] = total
+        item['completed_contents'] = completed
+        item['progress_percentage'] = int(completed / total * 100) if total else 0
+        data.append(pick(item, fields))
+    return JsonResponse({'data': data, 'next': next_url})
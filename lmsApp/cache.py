@@ -0,0 +1,181 @@
+"""
+Helpers for caching query results in the configured cache (settings.CACHES).
+
+Keys are built with make_key() as "<namespace>:<part>:<part>...". Cached
+entries are never deleted individually. Each entry is instead tied to one
+or more version scopes, such as ('course', 42) or ('catalog',), and records
+the versions it was built from. bump_version() moves a scope to a new
+version, which makes every entry built on the old one stale.
+
+    @cached_query('course_outline', depends_on=lambda course_id: [('course', course_id)])
+    def course_outline(course_id):
+        ...
+
+Arguments of a cached function become part of the key, so they must be
+plain values (ids, slugs) rather than model instances.
+
+Rebuilds are single-flight: when an entry is stale or missing, one caller
+takes a short lock (cache.add) and recomputes it, while concurrent callers
+keep serving the stale value, or wait briefly for the new one if there is
+nothing to serve. Entries are also refreshed a little before they expire,
+with a probability that grows as expiry approaches and with how long the
+entry took to build ("XFetch", Vattani et al., "Optimal Probabilistic Cache
+Stampede Prevention", VLDB 2015), so hot keys rarely expire under load.
+"""
+import functools
+import hashlib
+import math
+import random
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .metrics import CACHE_REQUESTS
+
+
+# Memcached rejects keys longer than 250 characters; leave room for the
+# KEY_PREFIX and VERSION that Django adds.
+MAX_KEY_LENGTH = 200
+
+# How long a rebuild may hold its lock, and how long callers with nothing
+# stale to serve wait for it before building the value themselves.
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+# XFetch beta: values above 1 favour refreshing earlier.
+EARLY_REFRESH_BETA = 1.0
+
+
+def make_key(namespace, *parts):
+    """Builds a cache key, hashing the parts when the key would be too long."""
+    key = ':'.join([namespace, *(str(part) for part in parts)])
+    if len(key) > MAX_KEY_LENGTH:
+        key = f"{namespace}:{hashlib.md5(key.encode()).hexdigest()}"
+    return key
+
+
+def _version_key(scope):
+    return make_key('ver', *scope)
+
+
+def _new_version():
+    # Time based rather than a counter starting at 1: if a version key is
+    # evicted, the value it is recreated with can't match an older version
+    # that entries were cached under.
+    return time.time_ns()
+
+
+def get_versions(scopes):
+    """Returns the current version of each scope, in one cache round trip."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            version = _new_version()
+            if not cache.add(key, version, timeout=None):
+                # Another process initialised it first; use theirs.
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def get_version(*scope):
+    return get_versions([scope])[0]
+
+
+def bump_version(*scope):
+    """Makes every entry cached under the given scope stale."""
+    cache.set(_version_key(scope), _new_version(), timeout=None)
+
+
+class _Entry:
+    """A cached value with the versions it was built from and its logical expiry."""
+    __slots__ = ('value', 'versions', 'expires', 'build_time')
+
+    def __init__(self, value, versions, expires, build_time):
+        self.value = value
+        self.versions = versions
+        self.expires = expires
+        self.build_time = build_time
+
+    def should_refresh(self, now, beta=EARLY_REFRESH_BETA):
+        # -log(random()) is exponentially distributed, so a refresh becomes
+        # likely within a few build times of the expiry.
+        if self.expires is None:
+            return False
+        return now - self.build_time * beta * math.log(1.0 - random.random()) >= self.expires
+
+
+def _build(key, func, args, versions, timeout, stale_timeout):
+    started = time.time()
+    value = func(*args)
+    finished = time.time()
+
+    ttl = cache.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+    if ttl is None:
+        expires, physical_ttl = None, None
+    else:
+        expires = finished + ttl
+        physical_ttl = ttl + (ttl if stale_timeout is None else stale_timeout)
+    cache.set(key, _Entry(value, versions, expires, finished - started), physical_ttl)
+    return value
+
+
+def cached_query(namespace, depends_on=None, timeout=DEFAULT_TIMEOUT, stale_timeout=None):
+    """
+    Caches a function's return value under a key built from the namespace and
+    its positional arguments. The value is rebuilt once the scopes returned by
+    depends_on(*args) change version, or after `timeout` seconds (defaults to
+    the cache's TIMEOUT setting).
+
+    Stale values stay in the cache for another `stale_timeout` seconds
+    (defaults to `timeout`) so they can be served while one caller rebuilds.
+
+    The undecorated function stays available as `func.uncached`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            scopes = list(depends_on(*args)) if depends_on else []
+            versions = tuple(get_versions(scopes)) if scopes else ()
+            key = make_key(namespace, *args)
+
+            entry = cache.get(key)
+            now = time.time()
+            if entry is not None and entry.versions == versions and not entry.should_refresh(now):
+                CACHE_REQUESTS.labels(namespace, 'hit').inc()
+                return entry.value
+
+            lock_key = make_key('lock', key)
+            if cache.add(lock_key, 1, LOCK_TIMEOUT):
+                early = entry is not None and entry.versions == versions
+                CACHE_REQUESTS.labels(namespace, 'refresh' if early else 'miss').inc()
+                try:
+                    return _build(key, func, args, versions, timeout, stale_timeout)
+                finally:
+                    cache.delete(lock_key)
+
+            # Someone else is rebuilding: serve what we have, stale or not.
+            if entry is not None:
+                CACHE_REQUESTS.labels(namespace, 'stale').inc()
+                return entry.value
+
+            deadline = now + LOCK_WAIT
+            while time.time() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = cache.get(key)
+                if entry is not None and entry.versions == versions:
+                    CACHE_REQUESTS.labels(namespace, 'hit').inc()
+                    return entry.value
+                if cache.get(lock_key) is None:
+                    break
+            CACHE_REQUESTS.labels(namespace, 'miss').inc()
+            return _build(key, func, args, versions, timeout, stale_timeout)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+from django.db import transaction
+
+from .models import Course, Module, Lesson, Content, Quiz, Question, Option
+
+
+def _copy_rows(queryset, fk_name, id_map):
+    """
+    Copies every row of `queryset` with a single bulk_create, pointing the
+    `fk_name` foreign key at the already-copied parent (looked up in `id_map`).
+    Returns a dict mapping old primary keys to the new ones.
+    """
+    fk_attname = f'{fk_name}_id'
+    old_ids = []
+    copies = []
+    for obj in queryset.order_by('pk'):
+        old_ids.append(obj.pk)
+        obj.pk = None
+        obj._state.adding = True
+        setattr(obj, fk_attname, id_map[getattr(obj, fk_attname)])
+        copies.append(obj)
+
+    queryset.model.objects.bulk_create(copies)
+    return {old_id: copy.pk for old_id, copy in zip(old_ids, copies)}
+
+
+@transaction.atomic
+def duplicate_course(course, instructor=None, title=None):
+    """
+    Creates a copy of `course` including its full Module -> Lesson -> Content
+    and Quiz -> Question -> Option tree.
+
+    Each level is copied with one bulk INSERT and foreign keys are remapped in
+    memory, so the number of queries does not grow with the size of the course.
+    Uploaded files are shared with the original (only the stored file name is
+    copied). The copy always starts unpublished.
+    """
+    new_course = Course.objects.create(
+        title=title or f"{course.title} (Copy)",
+        description=course.description,
+        instructor=instructor or course.instructor,
+        price=course.price,
+        is_published=False,
+        thumbnail=course.thumbnail,
+    )
+
+    module_map = _copy_rows(Module.objects.filter(course=course), 'course', {course.pk: new_course.pk})
+    lesson_map = _copy_rows(Lesson.objects.filter(module__course=course), 'module', module_map)
+    _copy_rows(Content.objects.filter(lesson__module__course=course), 'lesson', lesson_map)
+    quiz_map = _copy_rows(Quiz.objects.filter(lesson__module__course=course), 'lesson', lesson_map)
+    question_map = _copy_rows(Question.objects.filter(quiz__lesson__module__course=course), 'quiz', quiz_map)
+    _copy_rows(Option.objects.filter(question__quiz__lesson__module__course=course), 'question', question_map)
+
+    return new_course
@@ -0,0 +1,23 @@
+from django.conf import settings
+
+
+def user_role(user):
+    """The role a page is rendered for; part of every template fragment cache key."""
+    if not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff:
+        return 'admin'
+    if user.is_instructor:
+        return 'instructor'
+    if user.is_student:
+        return 'student'
+    return 'user'
+
+
+def template_cache(request):
+    """Values used by the {% cache %} fragments in the templates."""
+    user = getattr(request, 'user', None)
+    return {
+        'fragment_timeout': settings.TEMPLATE_FRAGMENT_TIMEOUT,
+        'user_role': user_role(user) if user is not None else 'anonymous',
+    }
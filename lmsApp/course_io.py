@@ -0,0 +1,289 @@
+"""
+Streaming import/export of courses as JSON lines.
+
+Each line of a course file is one JSON object with a "type" key. A file may
+hold any number of courses; every "course" record starts a new course and the
+records that follow it (until the next "course" record) belong to it:
+
+    {"type": "course", "slug": "intro-to-devops", "title": "...", "description": "...",
+     "instructor": "jdoe", "price": "49.00", "is_published": true, "thumbnail": null}
+    {"type": "module", "order": 1, "title": "...", "description": "..."}
+    {"type": "lesson", "module": 1, "order": 1, "title": "...", "description": "..."}
+    {"type": "content", "module": 1, "lesson": 1, "order": 1, "title": "...",
+     "content_type": "pdf", "file": "lms_content/intro.pdf", "text_content": null, "video_url": null}
+    {"type": "quiz", "module": 1, "lesson": 1, "title": "...", "description": "...",
+     "duration_minutes": 0, "pass_percentage": 70}
+    {"type": "question", "module": 1, "lesson": 1, "order": 1, "text": "..."}
+    {"type": "option", "module": 1, "lesson": 1, "question": 1, "text": "...", "is_correct": false}
+
+Rows refer to their parents by natural key (the "order" of the module, lesson
+and question they belong to), so files can be moved between databases.
+Uploaded files are referenced by their storage name and are not embedded;
+the media directory has to be synced separately.
+"""
+import json
+from collections import defaultdict, namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Course, Module, Lesson, Content, Quiz, Question, Option, User
+from .queries import invalidate_course
+
+
+COURSE_FIELDS = ('title', 'description', 'price', 'is_published', 'thumbnail')
+
+# One entry per level of the course tree, in dependency order.
+#   key:    record keys forming the natural key of a row
+#   parent: record keys forming the natural key of the parent row
+#   course: ORM path from the model to its Course
+#   lookup: ORM path for every key, used to read existing rows
+#   fields: plain data fields copied between record and model
+Level = namedtuple('Level', 'type model key parent parent_attname course lookup fields')
+
+LEVELS = (
+    Level('module', Module, ('order',), (), 'course_id', 'course',
+          {'order': 'order'}, ('title', 'description')),
+    Level('lesson', Lesson, ('module', 'order'), ('module',), 'module_id', 'module__course',
+          {'module': 'module__order', 'order': 'order'}, ('title', 'description')),
+    Level('content', Content, ('module', 'lesson', 'order'), ('module', 'lesson'), 'lesson_id', 'lesson__module__course',
+          {'module': 'lesson__module__order', 'lesson': 'lesson__order', 'order': 'order'},
+          ('title', 'content_type', 'file', 'text_content', 'video_url')),
+    Level('quiz', Quiz, ('module', 'lesson'), ('module', 'lesson'), 'lesson_id', 'lesson__module__course',
+          {'module': 'lesson__module__order', 'lesson': 'lesson__order'},
+          ('title', 'description', 'duration_minutes', 'pass_percentage')),
+    Level('question', Question, ('module', 'lesson', 'order'), ('module', 'lesson'), 'quiz_id', 'quiz__lesson__module__course',
+          {'module': 'quiz__lesson__module__order', 'lesson': 'quiz__lesson__order', 'order': 'order'},
+          ('text',)),
+    Level('option', Option, ('module', 'lesson', 'question', 'text'), ('module', 'lesson', 'question'), 'question_id',
+          'question__quiz__lesson__module__course',
+          {'module': 'question__quiz__lesson__module__order', 'lesson': 'question__quiz__lesson__order',
+           'question': 'question__order', 'text': 'text'},
+          ('is_correct',)),
+)
+
+# Parent level of each level (the course itself for modules).
+PARENT_LEVEL = {'lesson': 'module', 'content': 'lesson', 'quiz': 'lesson', 'question': 'quiz', 'option': 'question'}
+
+CONTENT_TYPES = {choice for choice, _ in Content.CONTENT_TYPES}
+
+
+class CourseFormatError(Exception):
+    """Raised when a course file does not follow the documented format."""
+
+
+# --- Export ---
+
+def iter_course_records(course):
+    """
+    Yields the JSON-serialisable records describing `course`, streaming each
+    level from the database with iterator() so memory stays flat.
+    """
+    yield {
+        'type': 'course',
+        'slug': course.slug,
+        'instructor': course.instructor.username,
+        **{field: getattr(course, field) for field in COURSE_FIELDS},
+    }
+    for level in LEVELS:
+        paths = [level.lookup[k] for k in level.key]
+        rows = (
+            level.model.objects.filter(**{level.course: course})
+            .order_by(*paths)
+            .values_list(*paths, *level.fields)
+        )
+        for row in rows.iterator(chunk_size=2000):
+            record = {'type': level.type}
+            record.update(zip(level.key, row[:len(paths)]))
+            record.update(zip(level.fields, row[len(paths):]))
+            yield record
+
+
+def export_courses(courses, stream):
+    """Writes every course in `courses` to `stream` as JSON lines."""
+    count = 0
+    for course in courses.select_related('instructor').iterator():
+        for record in iter_course_records(course):
+            stream.write(json.dumps(record, cls=DjangoJSONEncoder))
+            stream.write('\n')
+        count += 1
+    return count
+
+
+# --- Import ---
+
+def iter_course_blocks(lines):
+    """
+    Groups the records of a course file into one (course_record, records_by_type)
+    pair per course. Only one course is held in memory at a time.
+    """
+    course_record = None
+    records = defaultdict(list)
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise CourseFormatError(f"Line {line_no}: invalid JSON ({e}).")
+        if not isinstance(record, dict):
+            raise CourseFormatError(f"Line {line_no}: expected a JSON object.")
+        record['_line'] = line_no
+
+        record_type = record.get('type')
+        if record_type == 'course':
+            if course_record is not None:
+                yield course_record, records
+            course_record, records = record, defaultdict(list)
+        elif record_type in PARENT_LEVEL or record_type == 'module':
+            if course_record is None:
+                raise CourseFormatError(f"Line {line_no}: '{record_type}' record before any 'course' record.")
+            records[record_type].append(record)
+        else:
+            raise CourseFormatError(f"Line {line_no}: unknown record type {record_type!r}.")
+
+    if course_record is not None:
+        yield course_record, records
+
+
+# JSON types of the record keys and fields; any other key holds a string.
+INTEGER_KEYS = {'module', 'lesson', 'question', 'order', 'duration_minutes', 'pass_percentage'}
+BOOLEAN_KEYS = {'is_correct'}
+NULLABLE_KEYS = {'description', 'file', 'text_content', 'video_url'}
+
+
+def _validate(level, record):
+    line = record['_line']
+    for name in level.key + level.fields:
+        if name not in record:
+            raise CourseFormatError(f"Line {line}: '{level.type}' record is missing '{name}'.")
+        value = record[name]
+        if name in INTEGER_KEYS:
+            # bool is a subclass of int, but `true` is no order.
+            if type(value) is not int or value < 0:
+                raise CourseFormatError(f"Line {line}: '{name}' must be a non-negative integer, not {value!r}.")
+        elif name in BOOLEAN_KEYS:
+            if not isinstance(value, bool):
+                raise CourseFormatError(f"Line {line}: '{name}' must be true or false, not {value!r}.")
+        elif not isinstance(value, str) and not (value is None and name in NULLABLE_KEYS):
+            raise CourseFormatError(f"Line {line}: '{name}' must be a string, not {value!r}.")
+    if level.type == 'content' and record['content_type'] not in CONTENT_TYPES:
+        raise CourseFormatError(f"Line {line}: unknown content_type {record['content_type']!r}.")
+
+
+class CourseImporter:
+    """
+    Imports course blocks produced by iter_course_blocks().
+
+    New courses are inserted level by level with bulk_create. With
+    update=True, an existing course with the same slug is diffed against the
+    file instead: changed rows are bulk-updated, new rows created and rows
+    missing from the file deleted.
+    """
+
+    def __init__(self, update=False, instructor=None, batch_size=1000):
+        self.update = update
+        self.instructor = instructor
+        self.batch_size = batch_size
+        self.stats = defaultdict(int)
+
+    def import_lines(self, lines):
+        with transaction.atomic():
+            for course_record, records in iter_course_blocks(lines):
+                self.import_course(course_record, records)
+        return self.stats
+
+    def import_course(self, course_record, records):
+        course, created = self._save_course(course_record)
+        self.stats['courses_created' if created else 'courses_updated'] += 1
+
+        key_maps = {'course': {(): course.pk}}
+        for level in LEVELS:
+            parent_map = key_maps[PARENT_LEVEL.get(level.type, 'course')]
+            existing = {} if created else self._existing_rows(level, course)
+            key_maps[level.type] = self._sync_level(level, records[level.type], parent_map, existing)
+
+        # Bulk writes send no model signals, so invalidate the cached outline
+        # of the course explicitly.
+        invalidate_course(course.pk)
+        return course
+
+    def _save_course(self, record):
+        line = record['_line']
+        for name in ('slug', 'title', 'description'):
+            if not record.get(name):
+                raise CourseFormatError(f"Line {line}: 'course' record is missing '{name}'.")
+
+        instructor = self.instructor
+        if instructor is None:
+            instructor = User.objects.filter(username=record.get('instructor'), is_instructor=True).first()
+            if instructor is None:
+                raise CourseFormatError(f"Line {line}: unknown instructor {record.get('instructor')!r}.")
+
+        values = {field: record.get(field) for field in COURSE_FIELDS}
+        values['is_published'] = bool(values['is_published'])
+        if values['price'] is not None:
+            try:
+                values['price'] = Decimal(str(values['price']))
+            except InvalidOperation:
+                raise CourseFormatError(f"Line {line}: invalid price {values['price']!r}.")
+
+        course = Course.objects.filter(slug=record['slug']).first()
+        if course is not None and not self.update:
+            raise CourseFormatError(f"Line {line}: course '{record['slug']}' already exists (use --update).")
+        created = course is None
+        if created:
+            course = Course(slug=record['slug'])
+        for field, value in values.items():
+            setattr(course, field, value)
+        course.instructor = instructor
+        course.save()
+        return course, created
+
+    def _existing_rows(self, level, course):
+        paths = [level.lookup[k] for k in level.key]
+        rows = level.model.objects.filter(**{level.course: course}).values_list('pk', *paths, *level.fields)
+        width = len(paths)
+        return {row[1:1 + width]: (row[0], row[1 + width:]) for row in rows.iterator(chunk_size=2000)}
+
+    def _sync_level(self, level, records, parent_map, existing):
+        model = level.model
+        own_keys = [k for k in level.key if k not in level.parent]
+        key_map = {}
+        to_create, to_update = [], []
+
+        for record in records:
+            _validate(level, record)
+            key = tuple(record[k] for k in level.key)
+            if key in key_map:
+                raise CourseFormatError(f"Line {record['_line']}: duplicate '{level.type}' {key}.")
+            parent_key = tuple(record[k] for k in level.parent)
+            if parent_key not in parent_map:
+                raise CourseFormatError(f"Line {record['_line']}: '{level.type}' refers to a missing parent {parent_key}.")
+
+            values = tuple(record[f] for f in level.fields)
+            if key in existing:
+                pk, current = existing.pop(key)
+                key_map[key] = pk
+                if current != values:
+                    to_update.append(model(pk=pk, **dict(zip(level.fields, values))))
+            else:
+                obj = model(**{k: record[k] for k in own_keys}, **dict(zip(level.fields, values)))
+                setattr(obj, level.parent_attname, parent_map[parent_key])
+                to_create.append((key, obj))
+
+        # Whatever is left in `existing` is no longer part of the course.
+        if existing:
+            model.objects.filter(pk__in=[pk for pk, _ in existing.values()]).delete()
+        if to_create:
+            model.objects.bulk_create([obj for _, obj in to_create], batch_size=self.batch_size)
+            key_map.update((key, obj.pk) for key, obj in to_create)
+        if to_update:
+            model.objects.bulk_update(to_update, level.fields, batch_size=self.batch_size)
+
+        self.stats[f'{level.type}_created'] += len(to_create)
+        self.stats[f'{level.type}_updated'] += len(to_update)
+        self.stats[f'{level.type}_deleted'] += len(existing)
+        return key_map
@@ -0,0 +1,144 @@
+"""
+CSV exports of a course's enrollments, content progress and quiz attempts
+for instructors, produced as generators of lines for a StreamingHttpResponse.
+
+Nothing is built in memory for the whole cohort. The gradebook walks the
+enrollments in keyset-paginated chunks and joins each chunk's progress
+counts, best quiz scores and certificates with one grouped query each; the
+progress and quiz attempt exports stream a single query with
+QuerySet.iterator(), which uses a server-side cursor where the database
+supports it. Only the course outline (module, lesson and content titles) is
+loaded up front, and its size doesn't depend on the number of students.
+"""
+import csv
+
+from django.db.models import Count, Max
+
+from .models import Certificate, Content, Enrollment, Quiz, StudentContentProgress, StudentQuizAttempt
+
+
+CHUNK_SIZE = 1000
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    # Spreadsheet apps run cells starting with these characters as formulas.
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def _full_name(first_name, last_name):
+    return f"{first_name} {last_name}".strip()
+
+
+def _course_quizzes(course):
+    return list(
+        Quiz.objects.filter(lesson__module__course=course)
+        .order_by('lesson__module__order', 'lesson__order', 'id').values_list('id', 'title')
+    )
+
+
+def gradebook_rows(course, chunk_size=CHUNK_SIZE):
+    """One row per enrollment: progress, certificate, and the best score of every quiz of the course."""
+    quizzes = _course_quizzes(course)
+    total_contents = Content.objects.filter(lesson__module__course=course).count()
+    yield [
+        'username', 'email', 'name', 'enrolled_at', 'completed', 'completed_contents', 'total_contents',
+        'progress_percentage', 'certificate_issued', *(f'best score: {title}' for _, title in quizzes),
+    ]
+
+    last_id = 0
+    while True:
+        chunk = list(
+            Enrollment.objects.filter(course=course, id__gt=last_id).order_by('id').values_list(
+                'id', 'student_id', 'student__username', 'student__email', 'student__first_name',
+                'student__last_name', 'enrolled_at', 'completed',
+            )[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        student_ids = [row[1] for row in chunk]
+
+        completed_by_student = dict(
+            StudentContentProgress.objects.filter(
+                student_id__in=student_ids, content__lesson__module__course=course, completed=True,
+            ).values_list('student_id').annotate(completed=Count('id')).order_by()
+        )
+        best_scores = {
+            (student_id, quiz_id): score
+            for student_id, quiz_id, score in StudentQuizAttempt.objects.filter(
+                student_id__in=student_ids, quiz__lesson__module__course=course,
+            ).values_list('student_id', 'quiz_id').annotate(best=Max('score')).order_by()
+        }
+        certified = set(
+            Certificate.objects.filter(course=course, student_id__in=student_ids).values_list('student_id', flat=True)
+        )
+
+        for _, student_id, username, email, first_name, last_name, enrolled_at, completed in chunk:
+            done = completed_by_student.get(student_id, 0)
+            yield [
+                username, email, _full_name(first_name, last_name), enrolled_at.isoformat(), completed,
+                done, total_contents, int(done / total_contents * 100) if total_contents else 0,
+                student_id in certified,
+                *(best_scores.get((student_id, quiz_id), '') for quiz_id, _ in quizzes),
+            ]
+
+
+def progress_rows(course, chunk_size=CHUNK_SIZE):
+    """One row per student and content item they have progress on."""
+    outline = {
+        content_id: (module, lesson, title, content_type)
+        for content_id, module, lesson, title, content_type in Content.objects.filter(lesson__module__course=course)
+        .values_list('id', 'lesson__module__title', 'lesson__title', 'title', 'content_type')
+    }
+    yield ['username', 'email', 'module', 'lesson', 'content', 'content_type', 'completed', 'completed_at']
+
+    progress = (
+        StudentContentProgress.objects.filter(content__lesson__module__course=course)
+        .order_by('student_id', 'content_id')
+        .values_list('student__username', 'student__email', 'content_id', 'completed', 'completed_at')
+    )
+    for username, email, content_id, completed, completed_at in progress.iterator(chunk_size=chunk_size):
+        module, lesson, title, content_type = outline[content_id]
+        yield [username, email, module, lesson, title, content_type, completed,
+               completed_at.isoformat() if completed_at else '']
+
+
+def quiz_attempt_rows(course, chunk_size=CHUNK_SIZE):
+    """One row per quiz attempt."""
+    quiz_titles = dict(_course_quizzes(course))
+    yield ['username', 'email', 'quiz', 'attempt_date', 'score', 'passed']
+
+    attempts = (
+        StudentQuizAttempt.objects.filter(quiz_id__in=quiz_titles)
+        .order_by('student_id', 'quiz_id', 'attempt_date')
+        .values_list('student__username', 'student__email', 'quiz_id', 'attempt_date', 'score', 'passed')
+    )
+    for username, email, quiz_id, attempt_date, score, passed in attempts.iterator(chunk_size=chunk_size):
+        yield [username, email, quiz_titles[quiz_id], attempt_date.isoformat(), score, passed]
+
+
+EXPORTS = {
+    'gradebook': gradebook_rows,
+    'progress': progress_rows,
+    'quiz-attempts': quiz_attempt_rows,
+}
+
+
+def export_lines(kind, course):
+    """The CSV lines of one of the EXPORTS, as a generator."""
+    return _csv_lines(EXPORTS[kind](course))
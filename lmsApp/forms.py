@@ -187,6 +187,29 @@ class CourseForm(forms.ModelForm):
             Submit('submit', 'Save Course', css_class='w-full bg-indigo-600 text-white py-2 px-4 rounded-md hover:bg-indigo-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500 mt-4')
         )
 
+class CourseDuplicateForm(forms.Form):
+    """
+    Form for duplicating an existing course (e.g. to re-run it next term).
+    """
+    title = forms.CharField(max_length=200, help_text="Title of the new copy. The copy is created as a draft.")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.layout = Layout(
+            Field('title', css_class='rounded-md shadow-sm border-gray-300 focus:border-indigo-300 focus:ring focus:ring-indigo-200 focus:ring-opacity-50'),
+        )
+
+class BulkEnrollmentForm(forms.Form):
+    """
+    Admin form for enrolling the students listed in a CSV file into a course.
+    """
+    csv_file = forms.FileField(
+        label="CSV file",
+        help_text="Header row with an 'email' column; 'username', 'first_name', 'last_name' and 'password' are optional.",
+    )
+    send_emails = forms.BooleanField(required=False, initial=True, label="Send enrollment confirmation emails")
+
 class ModuleForm(forms.ModelForm):
     """
     Form for creating and updating Module objects.
@@ -233,7 +256,11 @@ class ContentForm(forms.ModelForm):
     """
     Form for creating and updating Content objects.
     Handles conditional display of fields based on content_type.
+    Large files arrive through a chunked upload (lmsApp.uploads) instead of
+    `file`; `upload` then carries the id of the user's finished UploadSession.
     """
+    upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Content
         fields = ['title', 'content_type', 'file', 'text_content', 'video_url', 'order']
@@ -241,8 +268,9 @@ class ContentForm(forms.ModelForm):
             'text_content': forms.Textarea(attrs={'rows': 5}),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.user = user
         self.helper = FormHelper()
         self.helper.layout = Layout(
             Field('title', css_class='rounded-md shadow-sm border-gray-300 focus:border-indigo-300 focus:ring focus:ring-indigo-200 focus:ring-opacity-50'),
@@ -252,9 +280,20 @@ class ContentForm(forms.ModelForm):
             Field('text_content', css_class='rounded-md shadow-sm border-gray-300 focus:border-indigo-300 focus:ring focus:ring-indigo-200 focus:ring-opacity-50'),
             Field('video_url', css_class='rounded-md shadow-sm border-gray-300 focus:border-indigo-300 focus:ring focus:ring-indigo-200 focus:ring-opacity-50'),
             Field('order', css_class='rounded-md shadow-sm border-gray-300 focus:border-indigo-300 focus:ring focus:ring-indigo-200 focus:ring-opacity-50'),
+            Field('upload'),
             Submit('submit', 'Save Content', css_class='w-full bg-indigo-600 text-white py-2 px-4 rounded-md hover:bg-indigo-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500 mt-4')
         )
 
+    def clean_upload(self):
+        """The UploadSession for `upload`, which must belong to the user and be fully received."""
+        upload_id = self.cleaned_data.get('upload')
+        if not upload_id:
+            return None
+        session = UploadSession.objects.filter(pk=upload_id, user=self.user, completed_at__isnull=True).first() if self.user else None
+        if session is None or not session.received:
+            raise ValidationError("The uploaded file is missing or incomplete; please upload it again.")
+        return session
+
     def clean(self):
         """
         Custom cleaning to ensure only relevant content fields are populated
@@ -262,7 +301,7 @@ class ContentForm(forms.ModelForm):
         """
         cleaned_data = super().clean()
         content_type = cleaned_data.get('content_type')
-        file = cleaned_data.get('file')
+        file = cleaned_data.get('file') or cleaned_data.get('upload')
         text_content = cleaned_data.get('text_content')
         video_url = cleaned_data.get('video_url')
 
@@ -282,9 +321,11 @@ class ContentForm(forms.ModelForm):
                 raise ValidationError("For text content, the text field cannot be empty.")
             # Clear other fields
             cleaned_data['file'] = None
+            cleaned_data['upload'] = None
             cleaned_data['video_url'] = None
         elif content_type == 'quiz' or content_type == 'assignment':
             cleaned_data['file'] = None
+            cleaned_data['upload'] = None
             cleaned_data['text_content'] = None
             cleaned_data['video_url'] = None
         
@@ -355,12 +396,17 @@ class QuizForm(forms.Form):
     """
     def __init__(self, *args, **kwargs):
         self.quiz = kwargs.pop('quiz', None)
+        # Optional: questions with options already loaded (see views.quiz_questions)
+        questions = kwargs.pop('questions', None)
         super().__init__(*args, **kwargs)
 
         if not self.quiz:
             raise ValueError("Quiz instance must be provided to QuizForm.")
 
-        for question in self.quiz.questions.all().order_by('order'):
+        if questions is None:
+            questions = self.quiz.questions.all().order_by('order').prefetch_related('options')
+
+        for question in questions:
             # Create a list of (value, label) tuples for choices
             choices = [(option.id, option.text) for option in question.options.all()]
             
@@ -0,0 +1,114 @@
+"""
+Per-request performance metrics: SQL query count and time, the slowest
+query, repeated queries (the usual sign of an N+1), template render time
+and total time. Collected by RequestMetricsMiddleware.
+"""
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+
+# The metrics of the request being handled, if it was sampled. A mutable
+# object is stored so sync views running in a thread under ASGI report into
+# the same instance.
+_current_metrics = ContextVar('lms_request_metrics', default=None)
+
+
+def current_metrics():
+    return _current_metrics.get()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_time = 0.0
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest_query_time = 0.0
+        self.slowest_query = None
+        self.template_time = 0.0
+        self.query_counts = Counter()
+
+    def activate(self):
+        return _current_metrics.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_metrics.reset(token)
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Used with connection.execute_wrapper() to time every query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.query_count += 1
+            self.db_time += duration
+            # Parameters are kept out of the SQL, so an N+1 shows up as the same
+            # statement over and over.
+            self.query_counts[sql] += 1
+            if duration > self.slowest_query_time:
+                self.slowest_query_time = duration
+                self.slowest_query = sql
+
+    def most_repeated_query(self):
+        """(sql, count) for the statement run most often, or (None, 0)."""
+        if not self.query_counts:
+            return None, 0
+        return self.query_counts.most_common(1)[0]
+
+    def server_timing(self):
+        """The value of a Server-Timing header (durations in milliseconds)."""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f};desc="templates"',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+    def as_dict(self):
+        sql, repeats = self.most_repeated_query()
+        return {
+            'queries': self.query_count,
+            'db_ms': round(self.db_time * 1000, 2),
+            'slowest_query_ms': round(self.slowest_query_time * 1000, 2),
+            'slowest_query': self.slowest_query,
+            'most_repeated_query': sql,
+            'most_repeated_query_count': repeats,
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+class TimedTemplate(Template):
+    """Adds its render time to the current request's metrics."""
+
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing every top-level render (render(),
+    render_to_string(), TemplateResponse). Includes and extends happen inside
+    that render and are not counted twice.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,277 @@
+"""
+Load-test journeys for the `loadtest` management command.
+
+Each virtual user walks through the whole student journey (register, enroll,
+read every content item and mark it completed, take the quiz, claim the
+certificate) using either Django's test client in-process or plain HTTP
+against a running server. Every request is timed and recorded under a label
+such as 'content_detail', so latency percentiles can be reported per endpoint,
+along with the bytes sent on the wire and how much compression saved.
+"""
+import gzip
+import http.cookiejar
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.test import Client
+from django.urls import reverse
+
+from .models import Content, Course, Lesson, Module, Option, Question, Quiz, User
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+LOADTEST_PREFIX = 'loadtest'
+DEFAULT_ACCEPT_ENCODING = 'br, gzip'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def decoded_length(body, coding):
+    """Size of a response body once its Content-Encoding is undone."""
+    if coding == 'gzip':
+        return len(gzip.decompress(body))
+    if coding == 'br' and brotli is not None:
+        return len(brotli.decompress(body))
+    return len(body)
+
+
+def savings(wire, uncompressed):
+    return round((1 - wire / uncompressed) * 100, 1) if uncompressed else 0.0
+
+
+class LatencyRecorder:
+    """Collects (label, seconds, ok, bytes) samples from many threads."""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.sizes = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds, ok, wire_bytes=0, body_bytes=0):
+        with self._lock:
+            self.samples.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+            sizes = self.sizes.setdefault(label, [0, 0])
+            sizes[0] += wire_bytes
+            sizes[1] += body_bytes
+
+    def summary(self, duration):
+        endpoints = {}
+        for label, values in self.samples.items():
+            values = sorted(values)
+            endpoints[label] = {
+                'requests': len(values),
+                'errors': self.errors.get(label, 0),
+                'throughput_rps': round(len(values) / duration, 2) if duration else 0.0,
+                'mean_ms': round(sum(values) / len(values) * 1000, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+                **self.size_summary(*self.sizes.get(label, (0, 0))),
+            }
+        all_values = sorted(v for values in self.samples.values() for v in values)
+        total = {
+            'requests': len(all_values),
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(len(all_values) / duration, 2) if duration else 0.0,
+            'p50_ms': round(percentile(all_values, 50) * 1000, 2),
+            'p95_ms': round(percentile(all_values, 95) * 1000, 2),
+            'p99_ms': round(percentile(all_values, 99) * 1000, 2),
+            'max_ms': round(all_values[-1] * 1000, 2) if all_values else 0.0,
+            **self.size_summary(
+                sum(wire for wire, _ in self.sizes.values()), sum(body for _, body in self.sizes.values()),
+            ),
+        }
+        return endpoints, total
+
+    def size_summary(self, wire, uncompressed):
+        return {'bytes_on_wire': wire, 'bytes_uncompressed': uncompressed, 'savings_pct': savings(wire, uncompressed)}
+
+
+class InProcessClient:
+    """
+    Drives the app through Django's test client (no server, no CSRF checks).
+    request() returns the status, the Location header, and the body's size as
+    sent and once decompressed.
+    """
+
+    def __init__(self, accept_encoding=DEFAULT_ACCEPT_ENCODING):
+        self.client = Client()
+        self.accept_encoding = accept_encoding
+
+    def request(self, method, path, data=None, ajax=False):
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else {}
+        if self.accept_encoding:
+            headers['Accept-Encoding'] = self.accept_encoding
+        if method == 'POST':
+            response = self.client.post(path, data or {}, headers=headers)
+        else:
+            response = self.client.get(path, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return (
+            response.status_code, response.get('Location'),
+            len(body), decoded_length(body, response.get('Content-Encoding')),
+        )
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Drives a running server over HTTP, with its own cookies and CSRF token."""
+
+    def __init__(self, base_url, timeout=30, accept_encoding=DEFAULT_ACCEPT_ENCODING):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.accept_encoding = accept_encoding
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def _csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, method, path, data=None, ajax=False):
+        headers = {'Referer': self.base_url + path}
+        if self.accept_encoding:
+            headers['Accept-Encoding'] = self.accept_encoding
+        if ajax:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+        body = None
+        if method == 'POST':
+            token = self._csrf_token()
+            headers['X-CSRFToken'] = token
+            body = urllib.parse.urlencode({**(data or {}), 'csrfmiddlewaretoken': token}, doseq=True).encode()
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            # urllib doesn't decode Content-Encoding, so this is what was on the wire.
+            with self.opener.open(request, timeout=self.timeout) as response:
+                body = response.read()
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as error:
+            body = error.read()
+            status, headers = error.code, error.headers
+        return status, headers.get('Location'), len(body), decoded_length(body, headers.get('Content-Encoding'))
+
+
+class CoursePlan:
+    """
+    The ids a journey needs for one course, read once up front: every content
+    item in order, and for the quiz, the correct option of each question.
+    """
+
+    def __init__(self, course):
+        self.course = course
+        self.contents = [
+            (content.lesson.module_id, content.lesson_id, content.id, content.content_type)
+            for content in Content.objects.filter(lesson__module__course=course)
+            .select_related('lesson').order_by('lesson__module__order', 'lesson__order', 'order')
+        ]
+        self.quiz_content = next((c for c in self.contents if c[3] == 'quiz'), None)
+        self.answers = {}
+        if self.quiz_content:
+            quiz = Quiz.objects.get(lesson_id=self.quiz_content[1])
+            self.answers = {
+                f'question_{question_id}': option_id
+                for question_id, option_id in Option.objects.filter(question__quiz=quiz, is_correct=True)
+                .values_list('question_id', 'id')
+            }
+
+
+def ensure_loadtest_course(contents=18, questions=10):
+    """
+    Returns the published course the journeys run against, creating it (with
+    a quiz as its last content item) on first use.
+    """
+    slug = f'{LOADTEST_PREFIX}-course'
+    course = Course.objects.filter(slug=slug).first()
+    if course is not None:
+        return course
+
+    instructor, _ = User.objects.get_or_create(
+        username=f'{LOADTEST_PREFIX}_instructor', defaults={'is_instructor': True, 'is_student': False}
+    )
+    course = Course.objects.create(
+        slug=slug, title='Load Test Course', description='Seeded by the loadtest command.',
+        instructor=instructor, is_published=True,
+    )
+    lessons = []
+    for m in range(1, 4):
+        module = Module.objects.create(course=course, title=f'Module {m}', order=m)
+        lessons += Lesson.objects.bulk_create([Lesson(module=module, title=f'Lesson {m}.{l}', order=l) for l in (1, 2)])
+    Content.objects.bulk_create([
+        Content(lesson=lessons[i % len(lessons)], title=f'Content {i + 1}', content_type='text',
+                text_content='Lorem ipsum dolor sit amet. ' * 40, order=i // len(lessons) + 1)
+        for i in range(contents)
+    ])
+
+    quiz_lesson = lessons[-1]
+    Content.objects.create(lesson=quiz_lesson, title='Final Quiz', content_type='quiz', order=contents + 1)
+    quiz = Quiz.objects.create(lesson=quiz_lesson, title='Final Quiz', pass_percentage=50)
+    created = Question.objects.bulk_create([Question(quiz=quiz, text=f'Question {q}?', order=q) for q in range(1, questions + 1)])
+    Option.objects.bulk_create([
+        Option(question=question, text=f'Answer {o}', is_correct=(o == 1))
+        for question in created for o in range(1, 5)
+    ])
+    return course
+
+
+def run_journey(client, plan, username, recorder, claim_certificate=True):
+    """One student's trip through the course. Returns False if any step failed."""
+    course = plan.course
+    ok = True
+
+    def step(label, method, path, data=None, ajax=False, expect=(200,)):
+        nonlocal ok
+        started = time.perf_counter()
+        try:
+            status, location, wire_bytes, body_bytes = client.request(method, path, data, ajax)
+        except Exception:
+            status, location, wire_bytes, body_bytes = None, None, 0, 0
+        success = status in expect
+        recorder.record(label, time.perf_counter() - started, success, wire_bytes, body_bytes)
+        ok = ok and success
+        return location
+
+    step('register_form', 'GET', reverse('register'))
+    step('register', 'POST', reverse('register'), {
+        'username': username, 'email': f'{username}@example.com', 'first_name': 'Load', 'last_name': 'Test',
+        'password': 'loadtest-Pa55word', 'password2': 'loadtest-Pa55word',
+    }, expect=(302,))
+    step('dashboard', 'GET', reverse('dashboard'))
+    step('course_detail', 'GET', course.get_absolute_url())
+    step('enroll_course', 'POST', reverse('enroll_course', kwargs={'slug': course.slug}), ajax=True)
+
+    for module_id, lesson_id, content_id, content_type in plan.contents:
+        kwargs = {'course_slug': course.slug, 'module_id': module_id, 'lesson_id': lesson_id, 'content_id': content_id}
+        step('content_detail', 'GET', reverse('content_detail', kwargs=kwargs))
+        if content_type == 'quiz':
+            step('quiz_take', 'GET', reverse('quiz_take', kwargs=kwargs))
+            result_url = step('quiz_submit', 'POST', reverse('quiz_submit', kwargs=kwargs), plan.answers, expect=(302,))
+            if result_url:
+                step('quiz_result', 'GET', result_url)
+        step('mark_content_completed', 'POST', reverse('mark_content_completed', kwargs=kwargs), ajax=True)
+
+    # The dashboard marks the enrollment completed once progress reaches 100%.
+    step('dashboard', 'GET', reverse('dashboard'))
+    if claim_certificate:
+        step('issue_certificate', 'POST', reverse('issue_certificate', kwargs={'course_slug': course.slug}), expect=(302,))
+    return ok
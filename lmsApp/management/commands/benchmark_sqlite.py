@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+SCHEMA = """
+CREATE TABLE progress (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INTEGER NOT NULL,
+    content_id INTEGER NOT NULL,
+    completed BOOLEAN NOT NULL,
+    completed_at TEXT,
+    UNIQUE (student_id, content_id)
+)
+"""
+
+
+def _connect(path, profile):
+    """Opens a connection configured like Django does for the given profile."""
+    if profile == 'default':
+        # Django's previous settings: rollback journal, deferred transactions
+        # and Python's default 5 second busy timeout.
+        return sqlite3.connect(path, timeout=5, isolation_level=None)
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    conn = sqlite3.connect(path, timeout=options.get('timeout', 5), isolation_level=None)
+    conn.executescript(options.get('init_command', ''))
+    return conn
+
+
+def _worker(args):
+    """
+    Marks `writes` content items as completed for one student, one transaction
+    per write, the same read-then-write pattern as mark_content_completed.
+    """
+    path, profile, student_id, writes = args
+    conn = _connect(path, profile)
+    begin = 'BEGIN' if profile == 'default' else 'BEGIN IMMEDIATE'
+    ok = errors = 0
+    for content_id in range(writes):
+        try:
+            conn.execute(begin)
+            row = conn.execute(
+                'SELECT id, completed FROM progress WHERE student_id = ? AND content_id = ?',
+                (student_id, content_id % 50),
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO progress (student_id, content_id, completed, completed_at) VALUES (?, ?, 1, datetime('now'))",
+                    (student_id, content_id % 50),
+                )
+            else:
+                conn.execute(
+                    "UPDATE progress SET completed = ?, completed_at = datetime('now') WHERE id = ?",
+                    (not row[1], row[0]),
+                )
+            conn.execute('COMMIT')
+            ok += 1
+        except sqlite3.OperationalError:
+            # "database is locked": the write is lost, as it would be for a user.
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            errors += 1
+    conn.close()
+    return ok, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures concurrent write throughput on a scratch SQLite database, comparing SQLite's "
+        "default configuration with the tuned configuration from settings.DATABASES."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent writer processes.")
+        parser.add_argument('--writes', type=int, default=500, help="Write transactions per worker.")
+        parser.add_argument('--profile', choices=('default', 'tuned', 'both'), default='both')
+
+    def handle(self, *args, **options):
+        profiles = ('default', 'tuned') if options['profile'] == 'both' else (options['profile'],)
+        for profile in profiles:
+            ok, errors, elapsed = self.run_profile(profile, options['workers'], options['writes'])
+            self.stdout.write(
+                f"{profile:>8}: {ok} writes in {elapsed:.2f}s ({ok / elapsed:.0f} writes/s), "
+                f"{errors} failed with 'database is locked'"
+            )
+
+    def run_profile(self, profile, workers, writes):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.sqlite3')
+            conn = _connect(path, profile)
+            conn.execute(SCHEMA)
+            conn.close()
+
+            jobs = [(path, profile, student_id, writes) for student_id in range(workers)]
+            started = time.monotonic()
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.map(_worker, jobs)
+            elapsed = time.monotonic() - started
+
+        return sum(r[0] for r in results), sum(r[1] for r in results), elapsed
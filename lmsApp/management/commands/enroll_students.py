@@ -0,0 +1,46 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lmsApp.enrollment_import import EnrollmentImporter, EnrollmentImportError
+from lmsApp.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Enrolls the students listed in a CSV file (header row with email and optionally username, "
+        "first_name, last_name, password) into a course, creating missing student accounts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help="Slug of the course to enroll the students in.")
+        parser.add_argument('path', help="CSV file to read from ('-' for stdin).")
+        parser.add_argument('--no-email', action='store_true', help="Don't send enrollment confirmation emails.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per transaction and bulk INSERT.")
+        parser.add_argument('--hash-workers', type=int, default=4, help="Threads hashing new students' passwords.")
+        parser.add_argument('--base-url', default=settings.SITE_URL, help="Site URL used for links in the emails.")
+
+    def handle(self, *args, **options):
+        course = Course.objects.select_related('instructor').filter(slug=options['course']).first()
+        if course is None:
+            raise CommandError(f"Unknown course '{options['course']}'.")
+
+        importer = EnrollmentImporter(
+            course, options['base_url'], send_emails=not options['no_email'],
+            batch_size=options['batch_size'], hash_workers=options['hash_workers'],
+        )
+        try:
+            if options['path'] == '-':
+                stats = importer.import_csv(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                    stats = importer.import_csv(stream)
+        except EnrollmentImportError as e:
+            raise CommandError(str(e))
+
+        for line, message in importer.errors:
+            self.stderr.write(self.style.WARNING(f"line {line}: {message}"))
+        for name, value in stats.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS(f"Import into '{course.slug}' finished."))
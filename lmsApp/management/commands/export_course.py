@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lmsApp.course_io import export_courses
+from lmsApp.models import Course
+
+
+class Command(BaseCommand):
+    help = "Exports one or more courses (with modules, lessons, content and quizzes) as JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help="Slugs of the courses to export.")
+        parser.add_argument('--all', action='store_true', help="Export every course.")
+        parser.add_argument('--instructor', help="Only export courses taught by this username.")
+        parser.add_argument('-o', '--output', help="File to write to (defaults to stdout).")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('pk')
+        if options['instructor']:
+            courses = courses.filter(instructor__username=options['instructor'])
+        if options['slugs']:
+            courses = courses.filter(slug__in=options['slugs'])
+            missing = set(options['slugs']) - set(courses.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f"Unknown course slug(s): {', '.join(sorted(missing))}")
+        elif not options['all'] and not options['instructor']:
+            raise CommandError("Pass one or more course slugs, --instructor or --all.")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                count = export_courses(courses, stream)
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} course(s) to {options['output']}."))
+        else:
+            count = export_courses(courses, sys.stdout)
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} course(s)."))
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from lmsApp.storage import ContentAddressedStorage, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes uploaded files (content files, certificates) that no row references any more. "
+        "Files younger than MEDIA_GC_GRACE_HOURS are kept. Meant to run on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help="Keep files modified in the last N hours (default MEDIA_GC_GRACE_HOURS).")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage isn't lmsApp.storage.ContentAddressedStorage (MEDIA_CONTENT_ADDRESSED).")
+        grace_hours = settings.MEDIA_GC_GRACE_HOURS if options['grace_hours'] is None else options['grace_hours']
+        removed, freed = collect_garbage(default_storage, time.time() - grace_hours * 3600, dry_run=options['dry_run'])
+        verb = "Would remove" if options['dry_run'] else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} unreferenced file(s), {freed / 1024 ** 2:.1f} MB."))
@@ -0,0 +1,264 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from lmsApp.models import (
+    User, Course, Module, Lesson, Content, Enrollment, StudentContentProgress,
+    Quiz, Question, Option, StudentQuizAttempt, StudentAnswer,
+)
+
+
+CONTENT_TYPE_WEIGHTS = (('video', 5), ('text', 3), ('pdf', 2), ('slide', 1))
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a deterministic synthetic dataset for load testing: instructors, courses, "
+        "modules, lessons, contents, quizzes, students, enrollments, progress and quiz attempts. "
+        "Course popularity follows a Zipf distribution and learners drop off as they go through a course."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help="Random seed (same seed, same dataset).")
+        parser.add_argument('--prefix', default='synth', help="Prefix for generated usernames and course slugs.")
+        parser.add_argument('--instructors', type=int, default=20)
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--modules', type=int, default=5, help="Modules per course.")
+        parser.add_argument('--lessons', type=int, default=4, help="Lessons per module.")
+        parser.add_argument('--contents', type=int, default=5, help="Contents per lesson.")
+        parser.add_argument('--quiz-ratio', type=float, default=0.25, help="Share of lessons that end with a quiz.")
+        parser.add_argument('--questions', type=int, default=5, help="Questions per quiz.")
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--enrollments', type=float, default=3.0, help="Mean enrollments per student.")
+        parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent for course popularity.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Objects per bulk_create call.")
+        parser.add_argument('--fast', action='store_true',
+                            help="SQLite only: disable synchronous writes and keep the journal in memory while loading.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.counts = {}
+        prefix = options['prefix']
+
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users with prefix '{prefix}_' already exist; pick another --prefix.")
+
+        if options['fast']:
+            if connection.vendor != 'sqlite':
+                raise CommandError("--fast is only supported on SQLite.")
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA journal_mode = MEMORY')
+
+        started = time.monotonic()
+        with transaction.atomic():
+            instructors = self.create_users('instructor', options['instructors'], is_instructor=True, is_student=False)
+            courses = self.create_courses(instructors)
+            self.create_quizzes(courses)
+            students = self.create_users('student', options['students'], is_instructor=False, is_student=True)
+            self.create_activity(students, courses)
+
+        for name, count in self.counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated in {time.monotonic() - started:.1f}s."))
+
+    # --- helpers ---
+
+    def bulk_create(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.counts[model._meta.verbose_name_plural] = self.counts.get(model._meta.verbose_name_plural, 0) + len(objs)
+        return objs
+
+    def insert_rows(self, model, columns, rows):
+        """
+        Inserts an iterable of plain tuples in batches with executemany().
+
+        Used for the two largest tables (progress and answers) where building
+        model instances and compiling a multi-row INSERT per batch dominates the
+        load time. Values must already be adapted for the database.
+        """
+        ops = connection.ops
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            ops.quote_name(model._meta.db_table),
+            ', '.join(ops.quote_name(model._meta.get_field(name).column) for name in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        name = model._meta.verbose_name_plural
+        with connection.cursor() as cursor:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    self.counts[name] = self.counts.get(name, 0) + len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                self.counts[name] = self.counts.get(name, 0) + len(batch)
+
+    def create_users(self, role, count, **flags):
+        # Hashing is deliberately done once: every generated user shares the password "password".
+        password = make_password('password')
+        prefix = self.options['prefix']
+        return self.bulk_create(User, [
+            User(
+                username=f'{prefix}_{role}{n}',
+                email=f'{prefix}_{role}{n}@example.com',
+                first_name=role.title(),
+                last_name=str(n),
+                password=password,
+                **flags,
+            )
+            for n in range(count)
+        ])
+
+    def create_courses(self, instructors):
+        """Returns a list of (course, [content pks in course order]) pairs."""
+        rng, opts, prefix = self.rng, self.options, self.options['prefix']
+        courses = self.bulk_create(Course, [
+            Course(
+                title=f'Synthetic Course {n}',
+                slug=f'{prefix}-course-{n}',
+                description=f'Generated course number {n}.',
+                instructor=rng.choice(instructors),
+                price=None if rng.random() < 0.6 else Decimal(rng.choice((19, 29, 49, 99))),
+                is_published=rng.random() < 0.9,
+            )
+            for n in range(opts['courses'])
+        ])
+
+        modules = self.bulk_create(Module, [
+            Module(course=course, title=f'Module {m}', order=m)
+            for course in courses for m in range(1, opts['modules'] + 1)
+        ])
+        lessons = self.bulk_create(Lesson, [
+            Lesson(module=module, title=f'Lesson {l}', order=l)
+            for module in modules for l in range(1, opts['lessons'] + 1)
+        ])
+
+        types, weights = zip(*CONTENT_TYPE_WEIGHTS)
+        contents = []
+        self.quiz_lessons = []
+        for lesson in lessons:
+            has_quiz = rng.random() < opts['quiz_ratio']
+            for c in range(1, opts['contents'] + 1):
+                content_type = 'quiz' if has_quiz and c == opts['contents'] else rng.choices(types, weights)[0]
+                contents.append(Content(
+                    lesson=lesson,
+                    title=f'Content {c}',
+                    content_type=content_type,
+                    text_content='Lorem ipsum dolor sit amet. ' * 20 if content_type == 'text' else None,
+                    video_url='https://www.youtube.com/watch?v=dQw4w9WgXcQ' if content_type == 'video' else None,
+                    file=f'lms_content/synthetic_{content_type}.pdf' if content_type in ('pdf', 'slide') else None,
+                    order=c,
+                ))
+            if has_quiz:
+                self.quiz_lessons.append(lesson)
+        self.bulk_create(Content, contents)
+
+        # Contents were created course by course, module by module, lesson by lesson.
+        per_course = opts['modules'] * opts['lessons'] * opts['contents']
+        return [
+            (course, [content.pk for content in contents[i * per_course:(i + 1) * per_course]])
+            for i, course in enumerate(courses)
+        ]
+
+    def create_quizzes(self, courses):
+        rng, opts = self.rng, self.options
+        quizzes = self.bulk_create(Quiz, [
+            Quiz(lesson=lesson, title=f'{lesson.title} Quiz', pass_percentage=rng.choice((50, 60, 70, 80)))
+            for lesson in self.quiz_lessons
+        ])
+        questions = self.bulk_create(Question, [
+            Question(quiz=quiz, text=f'Question {q} of {quiz.title}?', order=q)
+            for quiz in quizzes for q in range(1, opts['questions'] + 1)
+        ])
+        options = self.bulk_create(Option, [
+            Option(question=question, text=f'Option {o}', is_correct=(o == 1))
+            for question in questions for o in range(1, 5)
+        ])
+
+        # quiz pk -> [(question pk, correct option pk, [wrong option pks])]
+        self.quiz_questions = {quiz.pk: [] for quiz in quizzes}
+        for i, question in enumerate(questions):
+            question_options = options[i * 4:(i + 1) * 4]
+            self.quiz_questions[question.quiz_id].append(
+                (question.pk, question_options[0].pk, [o.pk for o in question_options[1:]])
+            )
+        self.lesson_quiz = {quiz.lesson_id: quiz.pk for quiz in quizzes}
+        self.pass_percentage = {quiz.pk: quiz.pass_percentage for quiz in quizzes}
+        self.content_lesson = dict(
+            Content.objects.filter(content_type='quiz', lesson__in=self.quiz_lessons).values_list('pk', 'lesson_id')
+        )
+
+    def create_activity(self, students, courses):
+        rng, opts = self.rng, self.options
+        published = [entry for entry in courses if entry[0].is_published]
+        if not published:
+            return
+        # Zipf-distributed popularity: the first courses attract most of the learners.
+        popularity = [1 / (rank ** opts['zipf']) for rank in range(1, len(published) + 1)]
+        # A pool of pre-adapted timestamps spread over the last six months.
+        now = timezone.now()
+        timestamps = [
+            connection.ops.adapt_datetimefield_value(now - timedelta(minutes=rng.randint(1, 60 * 24 * 180)))
+            for _ in range(10000)
+        ]
+
+        enrollments = []
+        progress_plan = []
+        for student in students:
+            wanted = min(len(published), max(1, int(rng.expovariate(1 / opts['enrollments']))))
+            chosen = {}
+            while len(chosen) < wanted:
+                entry = rng.choices(published, popularity)[0]
+                chosen[entry[0].pk] = entry
+            for course, content_pks in chosen.values():
+                # Most learners drop off early; a minority finishes the course.
+                reached = len(content_pks) if rng.random() < 0.15 else int(len(content_pks) * rng.betavariate(1.2, 3))
+                enrollments.append(Enrollment(student=student, course=course, completed=(reached == len(content_pks))))
+                progress_plan.append((student.pk, content_pks[:reached]))
+        self.bulk_create(Enrollment, enrollments)
+
+        attempts_plan = []
+
+        def progress_rows():
+            for student_pk, content_pks in progress_plan:
+                for content_pk in content_pks:
+                    yield (student_pk, content_pk, True, rng.choice(timestamps))
+                    lesson_pk = self.content_lesson.get(content_pk)
+                    if lesson_pk is not None:
+                        attempts_plan.append((student_pk, self.lesson_quiz[lesson_pk]))
+
+        self.insert_rows(StudentContentProgress, ('student', 'content', 'completed', 'completed_at'), progress_rows())
+        self.create_attempts(attempts_plan)
+
+    def create_attempts(self, attempts_plan):
+        rng = self.rng
+        for start in range(0, len(attempts_plan), self.batch_size):
+            attempts, answers = [], []
+            for student_pk, quiz_pk in attempts_plan[start:start + self.batch_size]:
+                skill = rng.random()
+                questions = self.quiz_questions[quiz_pk]
+                chosen = [
+                    (question_pk, correct_pk if rng.random() < 0.4 + 0.6 * skill else rng.choice(wrong_pks))
+                    for question_pk, correct_pk, wrong_pks in questions
+                ]
+                correct = sum(1 for (question_pk, option_pk), q in zip(chosen, questions) if option_pk == q[1])
+                score = round(Decimal(correct * 100) / len(questions), 2) if questions else Decimal(0)
+                attempt = StudentQuizAttempt(student_id=student_pk, quiz_id=quiz_pk, score=score, passed=score >= self.pass_percentage[quiz_pk])
+                attempts.append(attempt)
+                answers.append((attempt, chosen))
+            self.bulk_create(StudentQuizAttempt, attempts)
+            self.insert_rows(StudentAnswer, ('attempt', 'question', 'chosen_option'), (
+                (attempt.pk, question_pk, option_pk)
+                for attempt, chosen in answers for question_pk, option_pk in chosen
+            ))
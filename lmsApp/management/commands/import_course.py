@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lmsApp.course_io import CourseImporter, CourseFormatError
+from lmsApp.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports courses from a JSON lines file produced by export_course. "
+        "The whole file is imported in a single transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read from ('-' for stdin).")
+        parser.add_argument('--update', action='store_true',
+                            help="Update courses that already exist (matched by slug) instead of failing.")
+        parser.add_argument('--instructor', help="Assign every imported course to this instructor username.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk INSERT/UPDATE.")
+
+    def handle(self, *args, **options):
+        instructor = None
+        if options['instructor']:
+            instructor = User.objects.filter(username=options['instructor'], is_instructor=True).first()
+            if instructor is None:
+                raise CommandError(f"Unknown instructor '{options['instructor']}'.")
+
+        importer = CourseImporter(update=options['update'], instructor=instructor, batch_size=options['batch_size'])
+        try:
+            if options['path'] == '-':
+                stats = importer.import_lines(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as stream:
+                    stats = importer.import_lines(stream)
+        except CourseFormatError as e:
+            raise CommandError(str(e))
+
+        for name, value in sorted(stats.items()):
+            if value:
+                self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Import finished."))
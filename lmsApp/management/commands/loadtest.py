@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+
+from lmsApp.loadtest import (
+    DEFAULT_ACCEPT_ENCODING, LOADTEST_PREFIX, CoursePlan, HttpClient, InProcessClient, LatencyRecorder, ensure_loadtest_course, run_journey,
+)
+from lmsApp.models import Certificate, Course, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent student journeys (register, enroll, view content, mark completed, take quiz, "
+        "claim certificate) in-process or against a running server, and reports throughput and "
+        "p50/p95/p99 latency and bytes on the wire per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Number of journeys (one new student each).")
+        parser.add_argument('--concurrency', type=int, default=4, help="Journeys running at the same time.")
+        parser.add_argument('--url', help="Base URL of a running server (e.g. http://127.0.0.1:8000). "
+                                          "Without it, requests go through Django's test client in this process.")
+        parser.add_argument('--course', help="Slug of the published course to use. Defaults to a seeded "
+                                             f"'{LOADTEST_PREFIX}-course', created on first use.")
+        parser.add_argument('--no-certificate', action='store_true', help="Skip the certificate (PDF) step.")
+        parser.add_argument('--fast-hashing', action='store_true',
+                            help="In-process only: hash passwords with MD5 so registration doesn't dominate.")
+        parser.add_argument('--accept-encoding', default=DEFAULT_ACCEPT_ENCODING,
+                            help="Accept-Encoding sent with every request; '' for uncompressed responses.")
+        parser.add_argument('--keep-users', action='store_true', help="Don't delete the students created by the run.")
+        parser.add_argument('-o', '--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="A previous JSON result to compare p50/p95 against.")
+
+    def handle(self, *args, **options):
+        if options['course']:
+            course = Course.objects.filter(slug=options['course'], is_published=True).first()
+            if course is None:
+                raise CommandError(f"No published course '{options['course']}'.")
+        else:
+            course = ensure_loadtest_course()
+        plan = CoursePlan(course)
+        if not plan.contents:
+            raise CommandError(f"Course '{course.slug}' has no content.")
+
+        run_id = datetime.now().strftime('%Y%m%d%H%M%S')
+        usernames = [f'{LOADTEST_PREFIX}_{run_id}_{i}' for i in range(options['users'])]
+        recorder = LatencyRecorder()
+
+        overrides = {}
+        if not options['url']:
+            # Keep enrollment/completion emails in memory and accept the test client's host.
+            overrides = {
+                'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+                'ALLOWED_HOSTS': ['testserver'],
+            }
+            if options['fast_hashing']:
+                overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        def journey(username):
+            if options['url']:
+                client = HttpClient(options['url'], accept_encoding=options['accept_encoding'])
+            else:
+                client = InProcessClient(accept_encoding=options['accept_encoding'])
+            try:
+                return run_journey(client, plan, username, recorder, claim_certificate=not options['no_certificate'])
+            finally:
+                # Each worker thread opens its own connections in-process.
+                connections.close_all()
+
+        self.stderr.write(
+            f"Running {len(usernames)} journeys on '{course.slug}' ({len(plan.contents)} contents), "
+            f"concurrency {options['concurrency']}, {'HTTP ' + options['url'] if options['url'] else 'in-process'}..."
+        )
+        started = time.perf_counter()
+        try:
+            with override_settings(**overrides), ThreadPoolExecutor(options['concurrency']) as pool:
+                results = list(pool.map(journey, usernames))
+        finally:
+            if not options['keep_users']:
+                self.cleanup(usernames)
+        duration = time.perf_counter() - started
+
+        endpoints, total = recorder.summary(duration)
+        report = {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'mode': 'http' if options['url'] else 'in-process',
+            'course': course.slug,
+            'users': len(usernames),
+            'concurrency': options['concurrency'],
+            'accept_encoding': options['accept_encoding'],
+            'failed_journeys': results.count(False),
+            'duration_s': round(duration, 3),
+            'total': total,
+            'endpoints': endpoints,
+        }
+        baseline = self.load_baseline(options['baseline'])
+        self.print_report(report, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def cleanup(self, usernames):
+        students = User.objects.filter(username__in=usernames)
+        pdf_files = list(Certificate.objects.filter(student__in=students).exclude(pdf_file='').values_list('pdf_file', flat=True))
+        students.delete()
+        # Once the rows are gone, so the storage sees the files as unreferenced.
+        for name in pdf_files:
+            default_storage.delete(name)
+
+    def load_baseline(self, path):
+        if not path:
+            return None
+        if not os.path.exists(path):
+            raise CommandError(f"Baseline file '{path}' does not exist.")
+        with open(path) as fh:
+            return json.load(fh)
+
+    def print_report(self, report, baseline):
+        header = f"{'endpoint':<24}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        header += f"{'KB/req':>9}{'saved':>8}"
+        if baseline:
+            header += f"{'p50 Δ':>9}{'p95 Δ':>9}"
+        self.stdout.write(header)
+        rows = sorted(report['endpoints'].items()) + [('TOTAL', report['total'])]
+        for label, stats in rows:
+            kb_per_request = stats['bytes_on_wire'] / stats['requests'] / 1024 if stats['requests'] else 0.0
+            line = (
+                f"{label:<24}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>9.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+                f"{kb_per_request:>9.1f}{stats['savings_pct']:>7.1f}%"
+            )
+            if baseline:
+                before = baseline['total'] if label == 'TOTAL' else baseline['endpoints'].get(label)
+                line += ''.join(self.delta(stats, before, key) for key in ('p50_ms', 'p95_ms'))
+            self.stdout.write(line)
+        total = report['total']
+        self.stdout.write(
+            f"{total['bytes_on_wire'] / 1024:.0f} KB on the wire for {total['bytes_uncompressed'] / 1024:.0f} KB "
+            f"of responses ({total['savings_pct']:.1f}% saved, Accept-Encoding: {report['accept_encoding'] or 'none'})."
+        )
+        self.stdout.write(
+            f"{report['users']} journeys in {report['duration_s']:.2f}s, {report['failed_journeys']} with failed steps."
+        )
+
+    def delta(self, stats, before, key):
+        if not before or not before.get(key):
+            return f"{'n/a':>9}"
+        return f"{(stats[key] - before[key]) / before[key] * 100:>+8.0f}%"
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from lmsApp.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes chunked uploads that haven't received a chunk in UPLOAD_SESSION_MAX_AGE_HOURS, "
+        "with their temporary files. Meant to run on a schedule."
+    )
+
+    def handle(self, *args, **options):
+        removed = purge_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} stale upload(s)."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from lmsApp.analytics import refresh_course_analytics, stale_course_ids
+from lmsApp.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the precomputed instructor analytics of courses with new activity since their last "
+        "refresh (or of all or the given courses). Meant to run on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('courses', nargs='*', metavar='course', help="Slugs of courses to refresh regardless of activity.")
+        parser.add_argument('--all', action='store_true', help="Refresh every course.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['courses']:
+            course_ids = list(Course.objects.filter(slug__in=options['courses']).values_list('id', flat=True))
+            if len(course_ids) != len(set(options['courses'])):
+                raise CommandError("Unknown course slug(s).")
+        elif options['all']:
+            course_ids = list(Course.objects.values_list('id', flat=True))
+        else:
+            course_ids = stale_course_ids(now)
+
+        for course_id in course_ids:
+            refresh_course_analytics(course_id, now)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed analytics of {len(course_ids)} course(s)."))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from lmsApp.models import SlowQuery
+
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'calls': '-calls',
+    'mean': '-mean_ms',
+    'recent': '-last_seen',
+}
+
+
+class Command(BaseCommand):
+    help = "Lists the worst statements in the slow query log, grouped by fingerprint and view."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(ORDERINGS), default='total', help="Order by (default: total time).")
+        parser.add_argument('--view', help="Only statements run by this URL name (e.g. dashboard).")
+        parser.add_argument('--limit', type=int, default=20, help="Number of statements to show.")
+        parser.add_argument('--full', action='store_true', help="Print whole fingerprints and a sample statement.")
+        parser.add_argument('--reset', action='store_true', help="Delete the recorded statements (after listing them).")
+
+    def handle(self, *args, **options):
+        queries = SlowQuery.objects.annotate(mean_ms=F('total_ms') / F('calls'))
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+
+        rows = list(queries.order_by(ORDERINGS[options['sort']])[:options['limit']])
+        if not rows:
+            self.stderr.write("No slow queries recorded.")
+        for query in rows:
+            self.stdout.write(
+                f"{query.total_ms:>10.1f} ms total  {query.calls:>6} calls  {query.mean_ms:>8.1f} ms mean  "
+                f"{query.max_ms:>8.1f} ms max  [{query.view}]"
+            )
+            fingerprint = query.fingerprint if options['full'] else query.fingerprint[:200]
+            self.stdout.write(f"    {fingerprint}")
+            if options['full']:
+                self.stdout.write(f"    e.g. {query.sample_sql}")
+
+        if options['reset']:
+            deleted, _ = queries.delete()
+            self.stderr.write(self.style.SUCCESS(f"Deleted {deleted} slow query record(s)."))
@@ -0,0 +1,68 @@
+"""
+Prometheus metrics, served in the text exposition format by the
+`metrics` view (/metrics/).
+
+With several worker processes (gunicorn, uWSGI), set the
+PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory that all
+workers share, before they start: each process then writes its samples to
+files there and the endpoint adds them up, whichever worker serves it. Clear
+the directory when the server restarts.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+
+REQUEST_LATENCY = Histogram(
+    'lms_request_duration_seconds', 'Time to produce a response, by URL name.',
+    ['view', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUEST_QUERIES = Histogram(
+    'lms_request_db_queries', 'SQL queries run per request, by URL name.',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 15, 20, 30, 50, 100, 200),
+)
+CACHE_REQUESTS = Counter(
+    'lms_cache_requests_total',
+    'cached_query lookups by result: hit, stale (served while another caller rebuilds), '
+    'refresh (rebuilt early, before expiry) or miss.',
+    ['namespace', 'result'],
+)
+ENROLLMENTS = Counter('lms_enrollments_total', 'Students enrolled in a course.')
+CONTENT_PROGRESS = Counter(
+    'lms_content_progress_total', 'Content items marked completed or incomplete.', ['completed'],
+)
+QUIZ_SUBMISSIONS = Counter('lms_quiz_submissions_total', 'Quiz attempts submitted.', ['passed'])
+CERTIFICATE_RENDER = Histogram(
+    'lms_certificate_render_seconds', 'Time to render a certificate PDF in issue_certificate.',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+EMAILS = Counter('lms_emails_total', 'Emails sent by send_templated_email, by outcome.', ['template', 'outcome'])
+
+
+@contextmanager
+def timed(histogram):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started)
+
+
+def status_class(status_code):
+    return f'{status_code // 100}xx'
+
+
+def render_latest():
+    """Returns (body, content type) of the current metrics of all processes."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,477 @@
+import io
+import logging
+import mimetypes
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.text import compress_sequence, compress_string
+from django.views.static import was_modified_since
+
+from . import metrics as prometheus
+from .instrumentation import RequestMetrics
+from .profiling import CProfileRecorder, SamplingRecorder, SQLLog
+from .routers import request_pinning
+from .slow_queries import SlowQueryCollector, record as record_slow_queries
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+metrics_logger = logging.getLogger('lmsApp.metrics')
+profiling_logger = logging.getLogger('lmsApp.profiling')
+
+# ManifestStaticFilesStorage names: "app.<12 hex digits>.css".
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+
+def accepted_encodings(request):
+    """The content codings named in Accept-Encoding, without those refused with q=0."""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q=') and q[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pins unsafe requests (POST, PUT, ...) to the primary from the start, and
+    keeps the same browser on the primary for REPLICA_PIN_SECONDS after a write
+    so the page it is redirected to doesn't read stale replica data.
+    """
+    cookie_name = 'lms_pin_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or self.cookie_name in request.COOKIES
+        with request_pinning(pinned) as state:
+            response = self.get_response(request)
+        if state.wrote and self.pin_seconds:
+            response.set_cookie(self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures a sample of requests (REQUEST_METRICS_SAMPLE_RATE): number of
+    queries, DB time, slowest query, template render time and total time.
+    Results are logged to the 'lmsApp.metrics' logger and, with
+    REQUEST_METRICS_SERVER_TIMING, sent back in a Server-Timing header.
+
+    A request is flagged (logged as a warning) when its view runs more
+    queries than its budget in REQUEST_METRICS_VIEW_BUDGETS (falling back to
+    REQUEST_METRICS_QUERY_BUDGET), or repeats one statement more than
+    REQUEST_METRICS_REPEATED_QUERY_THRESHOLD times, the usual sign of an N+1.
+
+    Should come early in MIDDLEWARE so the total covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+        self.server_timing = getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True)
+        self.query_budget = getattr(settings, 'REQUEST_METRICS_QUERY_BUDGET', 50)
+        self.view_budgets = getattr(settings, 'REQUEST_METRICS_VIEW_BUDGETS', {})
+        self.repeated_query_threshold = getattr(settings, 'REQUEST_METRICS_REPEATED_QUERY_THRESHOLD', 10)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = metrics.activate()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        metrics.finish()
+
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        self.log(request, response, metrics)
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def log(self, request, response, metrics):
+        view = self.view_name(request)
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }
+
+        problems = []
+        budget = self.view_budgets.get(view, self.query_budget)
+        if budget is not None and metrics.query_count > budget:
+            problems.append(f"{metrics.query_count} queries exceeds the budget of {budget}")
+        if data['most_repeated_query_count'] > self.repeated_query_threshold:
+            problems.append(f"one query repeated {data['most_repeated_query_count']} times (possible N+1)")
+        data['flags'] = problems
+
+        if problems:
+            metrics_logger.warning(
+                "%s %s (%s): %s", request.method, request.path, view, '; '.join(problems), extra={'metrics': data}
+            )
+        else:
+            metrics_logger.info(
+                "%s %s (%s): %d queries, %.1f ms db, %.1f ms templates, %.1f ms total",
+                request.method, request.path, view, metrics.query_count, data['db_ms'],
+                data['template_ms'], data['total_ms'], extra={'metrics': data},
+            )
+
+
+class PrometheusMiddleware:
+    """
+    Records every request's latency and query count in the Prometheus
+    histograms of lmsApp.metrics, labelled with the URL name. Near the top of
+    MIDDLEWARE so the latency covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        prometheus.REQUEST_LATENCY.labels(view, request.method, prometheus.status_class(response.status_code)).observe(duration)
+        prometheus.REQUEST_QUERIES.labels(view).observe(queries)
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Adds every statement slower than SLOW_QUERY_THRESHOLD_MS to the slow query
+    log (lmsApp.slow_queries), under the request's URL name. It must come
+    before PrometheusMiddleware and RequestMetricsMiddleware in MIDDLEWARE,
+    so the writes to the log aren't counted as the request's own queries.
+    Removed at startup when SLOW_QUERY_LOG_ENABLED is off.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+
+    def __call__(self, request):
+        collector = SlowQueryCollector(self.threshold)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(collector))
+            response = self.get_response(request)
+        if collector.slow:
+            match = getattr(request, 'resolver_match', None)
+            record_slow_queries(match.view_name if match else 'unresolved', collector.slow)
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles individual requests when REQUEST_PROFILING_ENABLED is set; when
+    it isn't, Django drops the middleware at startup (MiddlewareNotUsed).
+
+    A staff user profiles a request by adding ?profile=cprofile or
+    ?profile=sample (or an X-Profile header with the same value); with
+    REQUEST_PROFILING_SAMPLE_RATE, a fraction of all other requests is
+    profiled with the sampling profiler. The profile and the request's SQL
+    log are written to REQUEST_PROFILING_DIR, and the profile's file name is
+    returned to staff in an X-Profile header. Staff can add
+    ?profile_download=1 to get both back as a zip instead of the page.
+
+    Only one request per process is profiled at a time. Must come after
+    AuthenticationMiddleware.
+    """
+    recorders = {'cprofile': CProfileRecorder, 'sample': SamplingRecorder}
+    _lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.0)
+        self.directory = getattr(settings, 'REQUEST_PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        self.interval = getattr(settings, 'REQUEST_PROFILING_INTERVAL', 0.005)
+
+    def requested_mode(self, request):
+        mode = request.GET.get('profile') or request.headers.get('X-Profile')
+        if mode and request.user.is_authenticated and request.user.is_staff:
+            return mode if mode in self.recorders else 'cprofile'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        mode = self.requested_mode(request)
+        if mode is None or not self._lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            recorder = SamplingRecorder(self.interval) if mode == 'sample' else self.recorders[mode]()
+            sql_log = SQLLog()
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(sql_log))
+                recorder.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    recorder.stop()
+            profile_path, sql_path = self.save(request, mode, recorder, sql_log)
+        finally:
+            self._lock.release()
+
+        profiling_logger.info("Profiled %s %s (%s): %s", request.method, request.path, mode, profile_path)
+        if request.user.is_staff:
+            if request.GET.get('profile_download'):
+                return self.download(profile_path, sql_path)
+            response['X-Profile'] = os.path.basename(profile_path)
+        return response
+
+    def save(self, request, mode, recorder, sql_log):
+        os.makedirs(self.directory, exist_ok=True)
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else 'unresolved').replace(':', '-')
+        name = f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{mode}-{uuid.uuid4().hex[:8]}"
+        profile_path = os.path.join(self.directory, f"{name}.{recorder.extension}")
+        sql_path = os.path.join(self.directory, f"{name}.sql")
+        recorder.save(profile_path)
+        with open(sql_path, 'w') as fh:
+            fh.write(f"-- {request.method} {request.get_full_path()}\n")
+            fh.write(sql_log.render())
+        return profile_path, sql_path
+
+    def download(self, *paths):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path in paths:
+                archive.write(path, os.path.basename(path))
+        name = os.path.splitext(os.path.basename(paths[0]))[0]
+        response = HttpResponse(buffer.getvalue(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{name}.zip"'
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serves collected static files from STATIC_ROOT ahead of the rest of the
+    stack, picking the precompressed .br or .gz variant written by
+    lmsApp.storage when the client accepts it. Files with a content hash in
+    their name are cached for a year (`immutable`); others for
+    STATIC_MAX_AGE seconds. Answers If-None-Match / If-Modified-Since with a
+    304. Removed at startup when STATIC_SERVE is off, e.g. when a front-end
+    server serves STATIC_ROOT itself.
+    """
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        # Not when static files are on another host (a CDN STATIC_URL).
+        if not getattr(settings, 'STATIC_SERVE', False) or not settings.STATIC_ROOT or '://' in settings.STATIC_URL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = os.path.realpath(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        content_type, _ = mimetypes.guess_type(path)
+
+        encoding = None
+        accepted = accepted_encodings(request)
+        for coding, suffix in self.encodings:
+            if coding in accepted and os.path.isfile(path + suffix):
+                encoding, path = coding, path + suffix
+                break
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if HASHED_NAME_RE.search(name):
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = f'public, max-age={settings.STATIC_MAX_AGE}'
+
+        if request.headers.get('If-None-Match') == etag or (
+            'If-None-Match' not in request.headers
+            and not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+        ):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                open(path, 'rb'), content_type=content_type or 'application/octet-stream', filename=os.path.basename(name),
+            )
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = cache_control
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def is_compressible(content_type):
+    """Text-like types; images, video, audio, archives and PDFs are already compressed."""
+    mime = content_type.partition(';')[0].strip().lower()
+    return (
+        mime.startswith('text/')
+        or mime in ('application/json', 'application/javascript', 'application/xml')
+        or mime.endswith(('+json', '+xml'))
+    )
+
+
+def brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        # Flushed per chunk so a streamed page reaches the client as it is produced.
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def brotli_async_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    async for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses text responses (HTML pages, JSON such as the AJAX views'
+    form_html payloads, CSV exports) of at least RESPONSE_COMPRESSION_MIN_SIZE
+    bytes with brotli or gzip, whichever the client accepts, including
+    streaming responses. Media, PDFs and responses that already have a
+    Content-Encoding are passed through.
+
+    Pages that vary on Cookie may carry the CSRF token or other secrets next
+    to reflected input, so they are gzipped with Django's random-padding
+    mitigation against BREACH (as GZipMiddleware does) rather than brotli.
+    """
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        if not settings.RESPONSE_COMPRESSION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.min_size = settings.RESPONSE_COMPRESSION_MIN_SIZE
+        self.brotli_quality = settings.RESPONSE_COMPRESSION_BROTLI_QUALITY
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.has_header('Content-Encoding')
+            or response.status_code == 206
+            or not is_compressible(response.get('Content-Type', ''))
+            or 'no-transform' in response.get('Cache-Control', '')
+        ):
+            return response
+        if response.streaming:
+            length = response.get('Content-Length')
+            if length and int(length) < self.min_size:
+                return response
+        elif len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = self.choose_encoding(request, response)
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, coding)
+            # The compressed size isn't known until the stream is sent.
+            del response.headers['Content-Length']
+        else:
+            compressed = self.compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag describes the uncompressed bytes (RFC 9110 8.8.1).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
+
+    def choose_encoding(self, request, response):
+        accepted = accepted_encodings(request)
+        varies_on_cookie = 'cookie' in response.get('Vary', '').lower()
+        if brotli is not None and 'br' in accepted and not varies_on_cookie:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def compress(self, content, coding):
+        if coding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def compress_stream(self, response, coding):
+        # Captured before the caller replaces streaming_content with the result.
+        content = response.streaming_content
+        if coding == 'br':
+            if response.is_async:
+                return brotli_async_sequence(content, self.brotli_quality)
+            return brotli_sequence(content, self.brotli_quality)
+        if response.is_async:
+            async def gzip_async_sequence():
+                # One gzip member per chunk; clients decode the concatenation.
+                async for chunk in content:
+                    yield compress_string(chunk, max_random_bytes=self.max_random_bytes)
+            return gzip_async_sequence()
+        return compress_sequence(content, max_random_bytes=self.max_random_bytes)
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0005_certificate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint_hash', models.CharField(max_length=40)),
+                ('view', models.CharField(max_length=200)),
+                ('fingerprint', models.TextField()),
+                ('sample_sql', models.TextField(help_text='One occurrence of the statement, as sent to the database.')),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-total_ms'],
+                'unique_together': {('fingerprint_hash', 'view')},
+            },
+        ),
+    ]
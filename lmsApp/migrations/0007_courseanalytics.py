@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0006_slowquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseAnalytics',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics', serialize=False, to='lmsApp.course')),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+                ('active_learners', models.PositiveIntegerField(default=0, help_text='Enrolled students who completed content or attempted a quiz recently.')),
+                ('completions', models.PositiveIntegerField(default=0, help_text='Enrolled students who completed every content item.')),
+                ('total_contents', models.PositiveIntegerField(default=0)),
+                ('quiz_attempts', models.PositiveIntegerField(default=0)),
+                ('average_quiz_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('funnel', models.JSONField(default=list, help_text='Students who started and completed each module and lesson, in course order.')),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'course analytics',
+            },
+        ),
+    ]
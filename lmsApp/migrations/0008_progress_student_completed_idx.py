@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0007_courseanalytics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentcontentprogress',
+            index=models.Index(fields=['student', 'completed', 'content'], name='progress_student_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0009_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='certificate',
+            name='pdf_file',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='certificates/'),
+        ),
+        migrations.AlterField(
+            model_name='content',
+            name='file',
+            field=models.FileField(blank=True, db_index=True, help_text='Upload video, PDF, or other files.', null=True, upload_to='lms_content/'),
+        ),
+    ]
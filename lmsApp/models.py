@@ -110,7 +110,7 @@ class Content(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='contents')
     title = models.CharField(max_length=200)
     content_type = models.CharField(max_length=20, choices=CONTENT_TYPES)
-    file = models.FileField(upload_to='lms_content/', blank=True, null=True, help_text="Upload video, PDF, or other files.")
+    file = models.FileField(upload_to='lms_content/', blank=True, null=True, db_index=True, help_text="Upload video, PDF, or other files.")
     text_content = models.TextField(blank=True, null=True, help_text="For text-based content (e.g., notes).")
     video_url = models.URLField(max_length=500, blank=True, null=True, help_text="URL for external video (e.g., YouTube, Vimeo).")
     order = models.PositiveIntegerField(default=0, help_text="Order of the content within the lesson.")
@@ -150,6 +150,9 @@ class StudentContentProgress(models.Model):
 
     class Meta:
         unique_together = ('student', 'content')
+        # Covers "which content items did these students complete" (the
+        # gradebook) without reading the table itself.
+        indexes = [models.Index(fields=['student', 'completed', 'content'], name='progress_student_completed_idx')]
         verbose_name = "Student Content Progress"
         verbose_name_plural = "Student Content Progress"
 
@@ -260,7 +263,7 @@ class Certificate(models.Model):
     issue_date = models.DateField(auto_now_add=True)
     # Unique identifier for the certificate, useful for verification
     certificate_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
-    pdf_file = models.FileField(upload_to='certificates/', blank=True, null=True)
+    pdf_file = models.FileField(upload_to='certificates/', blank=True, null=True, db_index=True)
 
     class Meta:
         unique_together = ('student', 'course')
@@ -271,3 +274,95 @@ class Certificate(models.Model):
     
     def get_absolute_url(self):
         return reverse('view_certificate', kwargs={'certificate_id': self.certificate_id})
+
+
+class SlowQuery(models.Model):
+    """
+    Aggregated timings of one slow SQL statement (by fingerprint) in one view,
+    recorded by lmsApp.slow_queries.
+    """
+    fingerprint_hash = models.CharField(max_length=40)
+    view = models.CharField(max_length=200)
+    fingerprint = models.TextField()
+    sample_sql = models.TextField(help_text="One occurrence of the statement, as sent to the database.")
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('fingerprint_hash', 'view')
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.view}: {self.fingerprint[:80]}"
+
+
+class CourseAnalytics(models.Model):
+    """
+    Precomputed numbers for a course's instructor, written by
+    lmsApp.analytics.refresh_course_analytics so that dashboards don't scan
+    the progress tables.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='analytics')
+    enrollments = models.PositiveIntegerField(default=0)
+    active_learners = models.PositiveIntegerField(default=0, help_text="Enrolled students who completed content or attempted a quiz recently.")
+    completions = models.PositiveIntegerField(default=0, help_text="Enrolled students who completed every content item.")
+    total_contents = models.PositiveIntegerField(default=0)
+    quiz_attempts = models.PositiveIntegerField(default=0)
+    average_quiz_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    # [{'id', 'title', 'completed', 'lessons': [{'id', 'title', 'contents', 'started', 'completed'}]}]
+    funnel = models.JSONField(default=list, help_text="Students who started and completed each module and lesson, in course order.")
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'course analytics'
+
+    def __str__(self):
+        return f"Analytics for {self.course.title}"
+
+    @property
+    def completion_rate(self):
+        return int(self.completions / self.enrollments * 100) if self.enrollments else 0
+
+    @property
+    def drop_off(self):
+        """The lesson that loses the most students compared to the one before it (or to enrollment), or None."""
+        worst, worst_loss, previous = None, 0, self.enrollments
+        for module in self.funnel:
+            for lesson in module['lessons']:
+                if not lesson['contents']:
+                    continue
+                loss = previous - lesson['completed']
+                if loss > worst_loss:
+                    worst, worst_loss = {**lesson, 'module': module['title'], 'lost': loss}, loss
+                previous = lesson['completed']
+        return worst
+
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload of a large Content file (lmsApp.uploads).
+    Chunks are written to a temporary file until `offset` reaches `size`;
+    the file is then moved into place and attached to `content`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far; the next chunk starts here.")
+    content = models.ForeignKey(Content, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes) by {self.user.username}"
+
+    @property
+    def received(self):
+        return self.offset == self.size
@@ -0,0 +1,98 @@
+"""
+Profilers used by RequestProfilingMiddleware to profile a single request.
+
+CProfileRecorder wraps cProfile and writes a .prof file (open it with
+snakeviz, or `python -m pstats`). SamplingRecorder samples the request
+thread's stack from a background thread and writes collapsed stacks
+("frame;frame;frame count" per line), the input format of flamegraph.pl,
+speedscope and similar tools. Its overhead does not depend on how many
+function calls the request makes, so it distorts timings less than cProfile.
+"""
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SQLLog:
+    """Collects every query of the request, for connection.execute_wrapper()."""
+
+    def __init__(self):
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.entries.append((time.perf_counter() - started, context['connection'].alias, sql, params))
+
+    def render(self):
+        total = sum(duration for duration, *_ in self.entries)
+        lines = [f"-- {len(self.entries)} queries, {total * 1000:.1f} ms"]
+        for duration, alias, sql, params in self.entries:
+            lines.append(f"-- [{alias}] {duration * 1000:.2f} ms, params: {params!r}")
+            lines.append(f"{sql};")
+        return '\n'.join(lines) + '\n'
+
+
+class CProfileRecorder:
+    extension = 'prof'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class SamplingRecorder:
+    """Samples the stack of the thread that calls start() every `interval` seconds."""
+    extension = 'folded'
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, args=(target,), name='lms-request-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self, target):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            # The sampler's own frames live in another thread, so the stack is
+            # the request's alone; collapsed stacks list the root first.
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def render(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, path):
+        with open(path, 'w') as fh:
+            fh.write(self.render())
@@ -0,0 +1,121 @@
+"""
+Cached read models used by the views. Each function is invalidated through
+its version scope; the invalidate_* helpers are called from lmsApp.signals
+and from code that writes without sending model signals (bulk operations).
+
+Invalidation waits for the surrounding transaction to commit. Bumping
+earlier would let a concurrent request rebuild the entry from the
+not-yet-committed old data and cache it under the new version.
+
+The default cache is per process, and a bump only reaches the worker that
+made it, so these read models are for display. Access checks and grading
+read the database (see lmsApp.views.is_enrolled_in and quiz_questions).
+"""
+from django.db import transaction
+
+from .cache import bump_version, cached_query, get_versions
+from .models import Content, Course, Enrollment, Lesson, Module
+
+
+def course_scope(course_id):
+    return [('course', course_id)]
+
+
+def catalog_scope():
+    return [('catalog',)]
+
+
+def enrollments_scope(student_id):
+    return [('enrollments', student_id)]
+
+
+def _flush_bumps(connection):
+    scopes, connection.pending_cache_bumps = connection.pending_cache_bumps, set()
+    for scope in scopes:
+        bump_version(*scope)
+
+
+def _invalidate(*scope):
+    # The scopes of a transaction are collected into one set on its
+    # connection and bumped once each by whichever of its on_commit callbacks
+    # runs first, so saving or deleting many rows of a course bumps it once.
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        bump_version(*scope)
+        return
+    if not hasattr(connection, 'pending_cache_bumps'):
+        connection.pending_cache_bumps = set()
+    connection.pending_cache_bumps.add(scope)
+    transaction.on_commit(lambda: _flush_bumps(connection))
+
+
+def invalidate_course(course_id):
+    _invalidate('course', course_id)
+
+
+def invalidate_catalog():
+    _invalidate('catalog')
+
+
+def invalidate_enrollments(student_id):
+    _invalidate('enrollments', student_id)
+
+
+def attach_cache_versions(courses):
+    """
+    Sets `cache_version` on each course, for template fragments that vary on
+    it. Evaluates `courses` (a list or QuerySet) and reads every version in
+    one cache round trip.
+    """
+    courses = list(courses)
+    for course, version in zip(courses, get_versions([('course', c.pk) for c in courses])):
+        course.cache_version = version
+    return courses
+
+
+@cached_query('course_outline', depends_on=course_scope)
+def course_outline(course_id):
+    """The course's modules, with lessons and contents prefetched."""
+    return list(Module.objects.filter(course_id=course_id).prefetch_related('lessons__contents'))
+
+
+@cached_query('course_outline_data', depends_on=course_scope)
+def course_outline_data(course_id):
+    """
+    The course and its modules, lessons and contents as plain dicts (read
+    with values(), for the JSON API), in order.
+    """
+    course = Course.objects.filter(pk=course_id).values(
+        'id', 'slug', 'title', 'description', 'price', 'thumbnail', 'instructor__username', 'created_at', 'updated_at',
+    ).get()
+    course['instructor'] = course.pop('instructor__username')
+
+    modules = list(Module.objects.filter(course_id=course_id).values('id', 'title', 'description', 'order'))
+    lessons = list(
+        Lesson.objects.filter(module__course_id=course_id).values('id', 'module_id', 'title', 'description', 'order')
+    )
+    contents = list(
+        Content.objects.filter(lesson__module__course_id=course_id).values('id', 'lesson_id', 'title', 'content_type', 'order')
+    )
+    contents_by_lesson = {}
+    for content in contents:
+        contents_by_lesson.setdefault(content.pop('lesson_id'), []).append(content)
+    lessons_by_module = {}
+    for lesson in lessons:
+        lesson['contents'] = contents_by_lesson.get(lesson['id'], [])
+        lessons_by_module.setdefault(lesson.pop('module_id'), []).append(lesson)
+    for module in modules:
+        module['lessons'] = lessons_by_module.get(module['id'], [])
+    return {'course': course, 'modules': modules}
+
+
+@cached_query('published_courses', depends_on=catalog_scope)
+def published_courses():
+    """Every published course, newest first."""
+    return list(Course.objects.filter(is_published=True).select_related('instructor').order_by('-created_at'))
+
+
+@cached_query('enrolled_course_ids', depends_on=enrollments_scope)
+def enrolled_course_ids(student_id):
+    """The ids of the courses a student is enrolled in, for display (never for access checks)."""
+    return frozenset(Enrollment.objects.filter(student_id=student_id).values_list('course_id', flat=True))
@@ -0,0 +1,97 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Sessions (saved by SessionMiddleware on many GET requests) and database
+# cache entries are bookkeeping rather than data the request goes on to read:
+# they are always read from and written to the primary, and writing them
+# doesn't pin the request.
+PRIMARY_ONLY_APP_LABELS = {'sessions', 'django_cache'}
+
+
+class _PinState:
+    """Whether reads must go to the primary for the current request or thread."""
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Set by ReplicaPinningMiddleware for the duration of a request. A mutable
+# object is stored (rather than a bool) so a write made inside a sync view
+# running under ASGI is still visible to the middleware afterwards.
+_request_state = ContextVar('lms_replica_pin_state', default=None)
+
+# Outside of requests (management commands, shell) the state lives per thread
+# and is never reset: once a thread has written, it keeps reading the primary
+# for the rest of its life. Long-running workers should wrap each unit of work
+# in request_pinning() to start it unpinned.
+_thread_state = threading.local()
+
+
+def _current_state():
+    state = _request_state.get()
+    if state is None:
+        state = getattr(_thread_state, 'state', None)
+        if state is None:
+            state = _thread_state.state = _PinState()
+    return state
+
+
+def pin_to_primary():
+    """Sends every following read in this request (or thread) to the primary."""
+    _current_state().pinned = True
+
+
+@contextmanager
+def request_pinning(pinned=False):
+    """
+    Starts a fresh pinning state; used by ReplicaPinningMiddleware around each
+    request, and by anything else that should not inherit its thread's state.
+    """
+    state = _PinState(pinned)
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Routes reads to the 'replica' database and writes to 'default'.
+
+    Reads are kept on the primary when no replica is configured, inside a
+    transaction on the primary, and for the rest of the request once anything
+    has been written (read-your-writes). Outside a request, "the request" is
+    the thread (see _thread_state). Sessions and cache entries stay on the
+    primary without pinning anything (PRIMARY_ONLY_APP_LABELS).
+    """
+
+    def _replica_available(self):
+        return REPLICA_DB_ALIAS in connections.settings
+
+    def db_for_read(self, model, **hints):
+        if not self._replica_available() or model._meta.app_label in PRIMARY_ONLY_APP_LABELS:
+            return DEFAULT_DB_ALIAS
+        if _current_state().pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APP_LABELS:
+            state = _current_state()
+            state.pinned = True
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
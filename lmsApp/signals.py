@@ -0,0 +1,60 @@
+"""
+Cache invalidation: bumps the version scopes in lmsApp.queries whenever the
+data behind them is saved or deleted through the ORM. Bulk operations don't
+send these signals and must call the invalidate_* helpers themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Content, Course, Enrollment, Lesson, Module
+from .queries import invalidate_catalog, invalidate_course, invalidate_enrollments
+
+
+def _cascaded(sender, origin):
+    # A row deleted because its parent was: the parent's receiver already
+    # invalidates the same scope, so the child skips its lookup and bump.
+    return origin is not None and getattr(origin, 'model', type(origin)) is not sender
+
+
+def _course_id_for_lesson(lesson):
+    """The course of `lesson`, without a query when its module is already loaded."""
+    if Lesson.module.is_cached(lesson):
+        return lesson.module.course_id
+    return Module.objects.filter(pk=lesson.module_id).values_list('course_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_course(instance.pk)
+    invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=Module)
+def module_changed(sender, instance, **kwargs):
+    invalidate_course(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def lesson_changed(sender, instance, origin=None, **kwargs):
+    if _cascaded(sender, origin):
+        return
+    course_id = _course_id_for_lesson(instance)
+    if course_id is not None:
+        invalidate_course(course_id)
+
+
+@receiver([post_save, post_delete], sender=Content)
+def content_changed(sender, instance, origin=None, **kwargs):
+    if _cascaded(sender, origin):
+        return
+    if Content.lesson.is_cached(instance):
+        course_id = _course_id_for_lesson(instance.lesson)
+    else:
+        course_id = Module.objects.filter(lessons=instance.lesson_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        invalidate_course(course_id)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    invalidate_enrollments(instance.student_id)
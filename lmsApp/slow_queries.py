@@ -0,0 +1,99 @@
+"""
+Slow query log. SlowQueryMiddleware times every SQL statement of a request;
+statements slower than SLOW_QUERY_THRESHOLD_MS are reduced to a fingerprint
+(literals and placeholders replaced by '?', IN lists collapsed) and added to
+the SlowQuery row for that fingerprint and view, so the same query with
+different values is counted as one.
+"""
+import hashlib
+import logging
+import re
+import time
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SlowQuery
+
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    The statement with its literal values removed:
+    "... WHERE id IN (%s, %s, %s) LIMIT 21" -> "... WHERE id IN (?) LIMIT ?".
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (?)', sql)
+    sql = _VALUES_LIST.sub('VALUES (?)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class SlowQueryCollector:
+    """execute_wrapper that keeps the statements slower than `threshold` seconds."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.slow.append((sql, duration))
+
+
+def _add_to(queryset, calls, total_ms, max_ms, now):
+    return queryset.update(
+        calls=F('calls') + calls, total_ms=F('total_ms') + total_ms,
+        max_ms=Greatest(F('max_ms'), max_ms), last_seen=now,
+    )
+
+
+def record(view, statements):
+    """
+    Adds (sql, seconds) pairs to the SlowQuery aggregates of `view`. Errors are
+    logged rather than raised: the log must never break the request it measures.
+    """
+    aggregated = {}
+    for sql, duration in statements:
+        text = fingerprint(sql)
+        entry = aggregated.setdefault(text, {'calls': 0, 'total': 0.0, 'max': 0.0, 'sample': sql})
+        entry['calls'] += 1
+        entry['total'] += duration
+        entry['max'] = max(entry['max'], duration)
+
+    now = timezone.now()
+    for text, entry in aggregated.items():
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        rows = SlowQuery.objects.filter(fingerprint_hash=digest, view=view)
+        totals = (entry['calls'], entry['total'] * 1000, entry['max'] * 1000, now)
+        try:
+            if _add_to(rows, *totals):
+                continue
+            try:
+                with transaction.atomic():
+                    SlowQuery.objects.create(
+                        fingerprint_hash=digest, view=view, fingerprint=text, sample_sql=entry['sample'],
+                        calls=entry['calls'], total_ms=totals[1], max_ms=totals[2], last_seen=now,
+                    )
+            except IntegrityError:
+                # Another request created the row in the meantime.
+                _add_to(rows, *totals)
+        except DatabaseError:
+            logger.exception("Could not record a slow query for %s", view)
@@ -0,0 +1,269 @@
+// Function to get CSRF token from cookie
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            // Does this cookie string begin with the name we want?
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+const csrftoken = getCookie('csrftoken');
+
+// Modal functions
+const modal = document.getElementById('genericModal');
+const modalContent = document.getElementById('modalContent');
+const messagesContainer = document.getElementById('messages-container');
+
+function openModal() {
+    modal.classList.remove('hidden');
+    document.body.classList.add('modal-open'); // Prevent body scrolling
+}
+
+function closeModal() {
+    modal.classList.add('hidden');
+    document.body.classList.remove('modal-open'); // Restore body scrolling
+    modalContent.innerHTML = `
+        <div class="text-center text-gray-500 p-8">
+            <i class="fas fa-spinner fa-spin text-4xl text-indigo-500 mb-4"></i>
+            <p>Loading...</p>
+        </div>
+    `; // Reset content
+}
+
+// Function to display messages
+function displayMessage(type, text) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `p-3 rounded-md mb-2 flex items-center ${
+        type === 'success' ? 'bg-green-100 text-green-700' :
+        type === 'error' ? 'bg-red-100 text-red-700' :
+        'bg-blue-100 text-blue-700'
+    }`;
+    messageDiv.innerHTML = `
+        <i class="fas ${
+            type === 'success' ? 'fa-check-circle' :
+            type === 'error' ? 'fa-exclamation-circle' :
+            'fa-info-circle'
+        } mr-2"></i>
+        ${text}
+    `;
+    if (messagesContainer) {
+        messagesContainer.prepend(messageDiv);
+    } else {
+        // If messagesContainer doesn't exist, create it above main content
+        const main = document.querySelector('main');
+        const newMessagesContainer = document.createElement('div');
+        newMessagesContainer.id = 'messages-container';
+        newMessagesContainer.className = 'mb-4';
+        main.prepend(newMessagesContainer);
+        newMessagesContainer.prepend(messageDiv); // Prepend to the new container
+    }
+    // Auto-hide message after a few seconds
+    setTimeout(() => {
+        messageDiv.remove();
+    }, 5000);
+}
+
+
+// Function to load form into modal via AJAX
+async function loadModalForm(url) { // Removed 'title' as it's often in the snippet
+    openModal();
+    try {
+        const response = await fetch(url, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest' // Indicate AJAX request
+            }
+        });
+        if (response.ok) {
+            const html = await response.text();
+            modalContent.innerHTML = html;
+            // Re-attach form submission listener after content is loaded
+            const form = modalContent.querySelector('form');
+            if (form) {
+                form.addEventListener('submit', handleModalFormSubmission);
+            }
+            // Re-run content type toggle for content form if present
+            const contentTypeSelect = modalContent.querySelector('#id_content_type');
+            if (contentTypeSelect) {
+                // Manually trigger the toggle function from the snippet's script
+                // This assumes the snippet's script is loaded/executed with the HTML
+                // A more robust way would be to define toggleContentFields globally or pass it.
+                // For now, we'll rely on the snippet's DOMContentLoaded to run it.
+                // If issues arise, we might need to expose a global function or re-evaluate.
+                // For now, let's just make sure the select exists and trigger change.
+                const event = new Event('change');
+                contentTypeSelect.dispatchEvent(event);
+            }
+        } else {
+            displayMessage('error', 'Failed to load form. Please try again.');
+            closeModal();
+        }
+    } catch (error) {
+        console.error('Error loading modal form:', error);
+        displayMessage('error', 'An error occurred while loading the form.');
+        closeModal();
+    }
+}
+
+// Files bigger than this go up in resumable chunks (see lmsApp/uploads.py)
+const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+
+async function sha256Hex(blob) {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Uploads a file chunk by chunk, resuming after failures; returns the upload's id
+async function uploadInChunks(file, url, onProgress) {
+    const body = new FormData();
+    body.append('filename', file.name);
+    body.append('size', file.size);
+    let response = await fetch(url, {
+        method: 'POST',
+        headers: { 'X-CSRFToken': csrftoken, 'X-Requested-With': 'XMLHttpRequest' },
+        body: body
+    });
+    let state = await response.json();
+    if (!response.ok) {
+        throw new Error(state.error || 'Could not start the upload.');
+    }
+    const chunkSize = state.chunk_size;
+    let failures = 0;
+    while (!state.received) {
+        onProgress(state.offset / state.size);
+        try {
+            const chunk = file.slice(state.offset, state.offset + chunkSize);
+            response = await fetch(state.url, {
+                method: 'PUT',
+                headers: {
+                    'X-CSRFToken': csrftoken,
+                    'Content-Type': 'application/octet-stream',
+                    'Upload-Offset': String(state.offset),
+                    'Upload-Checksum': 'sha256 ' + await sha256Hex(chunk)
+                },
+                body: chunk
+            });
+            const result = await response.json();
+            // A 409 carries the offset the server expects next
+            if (!response.ok && response.status !== 409) {
+                throw new Error(result.error);
+            }
+            state = { ...state, ...result };
+            failures = 0;
+        } catch (error) {
+            if (++failures > 5) {
+                throw new Error('The upload failed. Please try again.');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            // Ask the server how much it has before resuming
+            response = await fetch(state.url);
+            if (response.ok) {
+                state = { ...state, ...(await response.json()) };
+            }
+        }
+    }
+    onProgress(1);
+    return state.id;
+}
+
+// Function to handle form submission via AJAX
+async function handleModalFormSubmission(event) {
+    event.preventDefault(); // Prevent default form submission
+
+    const form = event.target;
+    const formData = new FormData(form);
+
+    // Large content files are uploaded in chunks first; the form then sends the upload's id
+    const fileInput = form.querySelector('input[type="file"][name="file"]');
+    if (form.dataset.uploadUrl && fileInput && fileInput.files.length && fileInput.files[0].size > CHUNKED_UPLOAD_THRESHOLD) {
+        const submitButton = form.querySelector('button[type="submit"]');
+        const buttonHtml = submitButton.innerHTML;
+        submitButton.disabled = true;
+        try {
+            const uploadId = await uploadInChunks(fileInput.files[0], form.dataset.uploadUrl, fraction => {
+                submitButton.textContent = `Uploading... ${Math.floor(fraction * 100)}%`;
+            });
+            formData.delete('file');
+            formData.set('upload', uploadId);
+        } catch (error) {
+            displayMessage('error', error.message);
+            return;
+        } finally {
+            submitButton.disabled = false;
+            submitButton.innerHTML = buttonHtml;
+        }
+    }
+
+    // Add CSRF token to form data
+    formData.append('csrfmiddlewaretoken', csrftoken);
+
+    try {
+        const response = await fetch(form.action, {
+            method: form.method,
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest' // Indicate AJAX request
+            },
+            body: formData
+        });
+
+        const result = await response.json(); // Expect JSON response from Django view
+
+        if (response.ok) {
+            // Form submitted successfully
+            displayMessage('success', result.message || 'Operation successful!');
+            closeModal();
+            // Redirect if a redirect_url is provided (e.g., after course creation or instructor deletion)
+            if (result.redirect_url) {
+                window.location.href = result.redirect_url;
+            } else {
+                // Otherwise, reload the current page to reflect changes
+                window.location.reload();
+            }
+        } else {
+            // Form submission failed (e.g., validation errors)
+            if (result.form_html) {
+                modalContent.innerHTML = result.form_html; // Display form with errors
+                const updatedForm = modalContent.querySelector('form');
+                if (updatedForm) {
+                    updatedForm.addEventListener('submit', handleModalFormSubmission);
+                }
+                // Re-run content type toggle for content form if present after errors
+                const contentTypeSelect = modalContent.querySelector('#id_content_type');
+                if (contentTypeSelect) {
+                    const event = new Event('change');
+                    contentTypeSelect.dispatchEvent(event);
+                }
+            } else if (result.error) {
+                displayMessage('error', result.error);
+                closeModal();
+            } else {
+                displayMessage('error', 'An unknown error occurred.');
+                closeModal();
+            }
+        }
+    } catch (error) {
+        console.error('Error submitting modal form:', error);
+        displayMessage('error', 'An error occurred during form submission.');
+        closeModal();
+    }
+}
+
+// Event listener for modal backdrop click to close modal
+modal.addEventListener('click', function(event) {
+    if (event.target === modal) {
+        closeModal();
+    }
+});
+
+// Event listener for ESC key to close modal
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape' && !modal.classList.contains('hidden')) {
+        closeModal();
+    }
+});
@@ -0,0 +1,249 @@
+"""
+File storages.
+
+Static files, for production: ManifestStaticFilesStorage (content-hashed
+file names, so they can be cached forever) that also writes precompressed
+gzip and brotli variants of each hashed text file during collectstatic.
+The variants sit next to the file as `<name>.gz` and `<name>.br` and are
+picked by lmsApp.middleware.StaticFilesMiddleware (or a front-end server
+configured for precompressed files) according to Accept-Encoding. Brotli
+variants are only written when the `brotli` package is installed.
+
+Uploaded media: ContentAddressedStorage keeps one copy of each distinct file,
+named after its SHA-256 digest in the field's upload directory
+(`lms_content/3f/3f9a...e1.mp4`), so the same PDF uploaded to several courses
+or shared by a cloned course is stored once, and a file's URL never changes
+while its bytes don't. The digest is computed while the upload streams in
+(HashingMemoryFileUploadHandler / HashingTemporaryFileUploadHandler) or
+while the file is spooled to disk, and a file already on disk is renamed
+into place rather than copied.
+
+A stored file is referenced by the rows whose FileFields hold its name
+(Content.file, Certificate.pdf_file); reference_count() counts them, using
+the index on those columns. delete() only removes a file nobody references
+any more, and collect_garbage() (`manage.py gc_media`) sweeps the files
+whose last reference went away.
+"""
+import gzip
+import hashlib
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import models
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.eot'}
+MIN_SIZE = 256  # Smaller files aren't worth a variant.
+
+
+def compress_file(path):
+    """
+    Writes path.gz and path.br (if brotli is available) when they are
+    meaningfully smaller than the file. Returns the variants written.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=settings.STATIC_BROTLI_QUALITY)))
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        names = [
+            name for name in set(self.hashed_files.values())
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+            and self.exists(name) and self.size(name) >= MIN_SIZE
+        ]
+        # zlib and brotli release the GIL, so threads compress in parallel.
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            for name, written in zip(names, pool.map(compress_file, [self.path(name) for name in names])):
+                for path in written:
+                    yield name, os.path.relpath(path, self.location), True
+
+
+class HashingUploadHandlerMixin:
+    """Hashes the chunks this handler keeps and leaves the digest on the uploaded file as `sha256`."""
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            self.digest.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def file_fields(storage):
+    """(model, field) for every FileField whose files live in `storage`'s location."""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and getattr(field.storage, 'location', None) == storage.location
+    ]
+
+
+def reference_count(storage, name):
+    """How many rows refer to the stored file `name`."""
+    return sum(
+        model._default_manager.filter(**{field.name: name}).count()
+        for model, field in file_fields(storage)
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    spool_directory = '.incoming'
+
+    def get_available_name(self, name, max_length=None):
+        # The stored name comes from the content, in _save().
+        return name
+
+    def blob_name(self, name, digest):
+        extension = os.path.splitext(name)[1].lower()
+        if not extension[1:].isalnum() or len(extension) > 10:
+            extension = ''
+        return posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if digest is not None and self._touch(self.blob_name(name, digest)):
+            return self.blob_name(name, digest)
+
+        if hasattr(content, 'temporary_file_path'):
+            source, spooled = content.temporary_file_path(), False
+            digest = digest or file_digest(source)
+        else:
+            source, digest = self._spool(content)
+            spooled = True
+
+        name = self.blob_name(name, digest)
+        path = self.path(name)
+        try:
+            if not self._touch(name):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                file_move_safe(source, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except FileExistsError:
+            # The same bytes were stored concurrently.
+            self._touch(name)
+        finally:
+            if spooled and os.path.exists(source):
+                os.remove(source)
+        return name
+
+    def _touch(self, name):
+        """
+        Marks a stored blob as just saved and returns whether it exists. Its
+        new reference may not be committed yet, so collect_garbage's grace
+        period has to start over.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _spool(self, content):
+        """Writes `content` to a temporary file beside the stored files, hashing it on the way."""
+        directory = self.path(self.spool_directory)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, digest.hexdigest()
+
+    def delete(self, name):
+        # Other rows may still share the file; gc_media removes it once they don't.
+        if not reference_count(self, name):
+            super().delete(name)
+
+
+def collect_garbage(storage, older_than, dry_run=False):
+    """
+    Deletes the files in the upload directories of `storage`'s file fields
+    that no row refers to. Files modified after `older_than` (a timestamp)
+    are kept, since the row of a file that was just saved may not be
+    committed yet. Returns the number of files and bytes removed.
+    """
+    referenced = set()
+    directories = {storage.spool_directory}
+    for model, field in file_fields(storage):
+        referenced.update(
+            model._default_manager.exclude(**{f'{field.name}__isnull': True}).exclude(**{field.name: ''})
+            .values_list(field.name, flat=True).iterator()
+        )
+        if not callable(field.upload_to):
+            directories.add(str(field.upload_to).strip('/'))
+
+    removed = freed = 0
+    for directory in sorted(directories):
+        for root, _, files in os.walk(storage.path(directory)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > older_than:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+                removed += 1
+                freed += stat.st_size
+    return removed, freed
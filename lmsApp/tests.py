@@ -1,3 +1,1579 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from decouple import Config, RepositoryEmpty
+from prometheus_client import REGISTRY
+
+from LMS.settings import postgres_database
+
+from .admin_tools import EstimatedCountPaginator, estimated_row_count
+from .analytics import refresh_course_analytics
+from .cache import bump_version, cached_query, make_key, _Entry
+from .cloning import duplicate_course
+from .course_io import CourseFormatError, CourseImporter, export_courses
+from .enrollment_import import EnrollmentImporter, EnrollmentImportError
+from .exports import gradebook_rows
+from .gradebook import Gradebook
+from .loadtest import CoursePlan, InProcessClient, LatencyRecorder, ensure_loadtest_course, percentile, run_journey
+from .metrics import render_latest
+from .middleware import (
+    CompressionMiddleware, ReplicaPinningMiddleware, RequestProfilingMiddleware, StaticFilesMiddleware, brotli,
+)
+from .models import (
+    User, Course, Module, Lesson, Content, Enrollment, StudentContentProgress, Quiz, Question, Option,
+    StudentQuizAttempt, StudentAnswer, Certificate, SlowQuery, CourseAnalytics, UploadSession,
+)
+from .queries import course_outline
+from .routers import PrimaryReplicaRouter, REPLICA_DB_ALIAS, request_pinning
+from .slow_queries import fingerprint
+from .storage import reference_count
+from .uploads import UploadConflict, UploadError, partial_path, purge_stale_uploads, write_chunk
+
+
+class CourseFixtureMixin:
+    """
+    setUpTestData for an instructor's published course with one module and
+    lesson, as cls.instructor, cls.course, cls.module and cls.lesson. Test
+    classes add their own rows by extending setUpTestData.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.instructor = User.objects.create_user(username='teacher', password='pw', is_instructor=True, is_student=False)
+        cls.course = Course.objects.create(title='Course', description='d', instructor=cls.instructor, is_published=True)
+        cls.module = Module.objects.create(course=cls.course, title='Module 1', order=1)
+        cls.lesson = Lesson.objects.create(module=cls.module, title='Lesson 1', order=1)
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+
+    def build(self, **env):
+        with mock.patch.dict(os.environ, env, clear=True):
+            return postgres_database(Config(RepositoryEmpty()))
+
+    def test_pooled_by_default(self):
+        database = self.build(DATABASE_CONN_MAX_AGE='300')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['OPTIONS'], {'pool': {'min_size': 2, 'max_size': 20, 'timeout': 10}})
+        # The pool replaces persistent connections.
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertIs(database['CONN_HEALTH_CHECKS'], True)
+        self.assertIs(database['DISABLE_SERVER_SIDE_CURSORS'], False)
+
+    def test_pool_sizes(self):
+        database = self.build(DATABASE_POOL_MIN_SIZE='4', DATABASE_POOL_MAX_SIZE='40', DATABASE_POOL_TIMEOUT='3')
+        self.assertEqual(database['OPTIONS'], {'pool': {'min_size': 4, 'max_size': 40, 'timeout': 3}})
+
+    def test_persistent_connections_without_the_pool(self):
+        database = self.build(
+            DATABASE_POOL='False', DATABASE_CONN_MAX_AGE='300', DATABASE_CONN_HEALTH_CHECKS='False',
+            DATABASE_DISABLE_SERVER_SIDE_CURSORS='True', DATABASE_HOST='pgbouncer', DATABASE_PORT='6432',
+        )
+        self.assertEqual(database['OPTIONS'], {})
+        self.assertEqual(database['CONN_MAX_AGE'], 300)
+        self.assertIs(database['CONN_HEALTH_CHECKS'], False)
+        self.assertIs(database['DISABLE_SERVER_SIDE_CURSORS'], True)
+        self.assertEqual((database['HOST'], database['PORT']), ('pgbouncer', '6432'))
+
+
+@skipUnless(connection.vendor == 'sqlite', "The replica is a second SQLite file.")
+class PrimaryReplicaRouterTests(TransactionTestCase):
+    """
+    Runs the router against two SQLite files: the test database as the
+    primary and a temporary file registered as the 'replica' alias. A course
+    that only exists on the replica shows where each read was routed.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        connections.settings[REPLICA_DB_ALIAS] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(cls.tmpdir, 'replica.sqlite3'),
+            'TEST': {'MIRROR': None},
+        }
+        # Declared here rather than on the class: the alias only exists while
+        # these tests run, so the test runner must not see it up front.
+        cls.databases = {'default', REPLICA_DB_ALIAS}
+        super().setUpClass()
+        with connections[REPLICA_DB_ALIAS].schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Course)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        instructor = User.objects.using(REPLICA_DB_ALIAS).create(username='replica_instructor', is_instructor=True)
+        Course.objects.using(REPLICA_DB_ALIAS).create(
+            title='Replica Only', slug='replica-only', description='d', instructor=instructor
+        )
+
+    def tearDown(self):
+        # flush skips the replica (nothing is migrated there), so clean it by hand.
+        with connections[REPLICA_DB_ALIAS].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Course._meta.db_table}')
+            cursor.execute(f'DELETE FROM {User._meta.db_table}')
+
+    def replica_course_visible(self):
+        return Course.objects.filter(slug='replica-only').exists()
+
+    def test_reads_go_to_replica(self):
+        with request_pinning():
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Course), REPLICA_DB_ALIAS)
+            self.assertTrue(self.replica_course_visible())
+
+    def test_writes_go_to_primary_and_pin_following_reads(self):
+        with request_pinning():
+            user = User.objects.create(username='primary_user')
+            self.assertEqual(user._state.db, 'default')
+            self.assertFalse(self.replica_course_visible())
+
+    def test_reads_inside_transaction_stay_on_primary(self):
+        with request_pinning(), transaction.atomic():
+            self.assertFalse(self.replica_course_visible())
+
+    def test_reads_use_primary_without_replica(self):
+        replica_settings = connections.settings.pop(REPLICA_DB_ALIAS)
+        try:
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Course), 'default')
+        finally:
+            connections.settings[REPLICA_DB_ALIAS] = replica_settings
+
+    def test_middleware_pins_unsafe_requests(self):
+        seen = {}
+
+        def view(request):
+            seen[request.method] = self.replica_course_visible()
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        middleware(RequestFactory().get('/'))
+        middleware(RequestFactory().post('/'))
+        self.assertEqual(seen, {'GET': True, 'POST': False})
+
+    def test_middleware_pins_browser_after_write(self):
+        def view(request):
+            User.objects.create(username='writer')
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn(ReplicaPinningMiddleware.cookie_name, response.cookies)
+
+        seen = []
+        request = RequestFactory().get('/')
+        request.COOKIES[ReplicaPinningMiddleware.cookie_name] = '1'
+        ReplicaPinningMiddleware(lambda r: seen.append(self.replica_course_visible()) or HttpResponse())(request)
+        self.assertEqual(seen, [False])
+
+    def test_session_writes_do_not_pin(self):
+        def view(request):
+            request.session['seen'] = True
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(SessionMiddleware(view))(RequestFactory().get('/'))
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertNotIn(ReplicaPinningMiddleware.cookie_name, response.cookies)
+        with request_pinning():
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Session), 'default')
+
+
+class CachedQueryTests(CourseFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def test_cached_until_scope_is_bumped(self):
+        @cached_query('test_double', depends_on=lambda n: [('test', n)])
+        def double(n):
+            self.calls.append(n)
+            return n * 2
+
+        self.assertEqual([double(2), double(2), double(3)], [4, 4, 6])
+        self.assertEqual(self.calls, [2, 3])
+
+        bump_version('test', 2)
+        double(2)
+        double(3)
+        self.assertEqual(self.calls, [2, 3, 2])
+
+    def test_stale_value_served_while_another_caller_rebuilds(self):
+        @cached_query('test_stale', depends_on=lambda: [('test_stale',)])
+        def build():
+            self.calls.append(1)
+            return len(self.calls)
+
+        self.assertEqual(build(), 1)
+        bump_version('test_stale')
+        cache.add(make_key('lock', make_key('test_stale')), 1)  # a rebuild is in progress elsewhere
+        self.assertEqual(build(), 1)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_concurrent_misses_rebuild_once(self):
+        @cached_query('test_single_flight', depends_on=lambda: [('test_single_flight',)])
+        def slow_build():
+            self.calls.append(1)
+            time.sleep(0.2)
+            return 'built'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow_build())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['built'] * 8)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_early_refresh_near_expiry(self):
+        now = time.time()
+        self.assertFalse(_Entry('v', (), now + 3600, build_time=0.01).should_refresh(now))
+        self.assertTrue(_Entry('v', (), now, build_time=0.01).should_refresh(now))
+        self.assertFalse(_Entry('v', (), None, build_time=10).should_refresh(now))
+
+    def test_course_outline_invalidated_by_model_signals(self):
+        with self.assertNumQueries(3):
+            course_outline(self.course.pk)
+        with self.assertNumQueries(0):
+            course_outline(self.course.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Content.objects.create(lesson=self.lesson, title='C1', content_type='text', text_content='x', order=1)
+
+        outline = course_outline(self.course.pk)
+        self.assertEqual([c.title for c in outline[0].lessons.all()[0].contents.all()], ['C1'])
+
+    def test_deleting_a_course_bumps_once_without_per_row_lookups(self):
+        def seed(title, contents):
+            course = Course.objects.create(title=title, description='d', instructor=self.instructor)
+            module = Module.objects.create(course=course, title='M1', order=1)
+            lesson = Lesson.objects.create(module=module, title='L1', order=1)
+            Content.objects.bulk_create(
+                Content(lesson=lesson, title=f'C{i}', content_type='text', text_content='x', order=i)
+                for i in range(contents)
+            )
+            return course
+
+        small, large = seed('Small', 1), seed('Large', 30)
+        large_pk = large.pk
+        with CaptureQueriesContext(connection) as small_queries:
+            small.delete()
+        with mock.patch('lmsApp.queries.bump_version') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as large_queries:
+                    large.delete()
+
+        self.assertEqual(len(large_queries), len(small_queries))
+        self.assertEqual(bump.call_args_list.count(mock.call('course', large_pk)), 1)
+        self.assertEqual(bump.call_args_list.count(mock.call('catalog')), 1)
+
+    def test_direct_content_delete_invalidates_its_course(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            content = Content.objects.create(lesson=self.lesson, title='C1', content_type='text', text_content='x', order=1)
+
+        with mock.patch('lmsApp.queries.bump_version') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(4):
+                    Content.objects.select_related('lesson__module').get(pk=content.pk).delete()
+        self.assertEqual(bump.call_args_list, [mock.call('course', self.course.pk)])
+
+
+class TemplateFragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='teacher', password='pw', is_instructor=True, is_student=False)
+        self.course = Course.objects.create(title='Original Title', description='d', instructor=self.instructor)
+        self.client.force_login(self.instructor)
+
+    def test_course_card_refreshed_when_course_changes(self):
+        self.assertContains(self.client.get('/'), 'Original Title')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Renamed Title'
+            self.course.save()
+        response = self.client.get('/')
+        self.assertContains(response, 'Renamed Title')
+        self.assertNotContains(response, 'Original Title')
+
+    def test_outline_refreshed_when_module_added(self):
+        url = self.course.get_absolute_url()
+        self.assertContains(self.client.get(url), 'No modules or lessons added')
+        with self.captureOnCommitCallbacks(execute=True):
+            Module.objects.create(course=self.course, title='Getting Started', order=1)
+        self.assertContains(self.client.get(url), 'Getting Started')
+
+    def test_enrolled_students_outline_is_not_shared(self):
+        self.course.is_published = False
+        self.course.save()
+        module = Module.objects.create(course=self.course, title='Getting Started', order=1)
+        Lesson.objects.create(module=module, title='Welcome', order=1)
+        enrolled = User.objects.create_user(username='early', password='pw')
+        Enrollment.objects.create(student=enrolled, course=self.course)
+        self.client.force_login(enrolled)
+        self.assertNotContains(self.client.get(self.course.get_absolute_url()), 'Enroll to view content')
+
+        # Published on another worker, whose version bump this process never sees.
+        with mock.patch('lmsApp.queries.bump_version'):
+            self.course.is_published = True
+            self.course.save()
+        self.client.force_login(User.objects.create_user(username='late', password='pw'))
+        self.assertContains(self.client.get(self.course.get_absolute_url()), 'Enroll to view content')
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='learner', password='pw')
+        self.client.force_login(self.student)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+;desc="templates", total;dur=[\d.]+$')
+
+    @override_settings(REQUEST_METRICS_VIEW_BUDGETS={'dashboard': 1})
+    def test_query_budget_exceeded_is_flagged(self):
+        with self.assertLogs('lmsApp.metrics', 'WARNING') as logs:
+            self.client.get('/')
+        metrics = logs.records[0].metrics
+        self.assertEqual(metrics['view'], 'dashboard')
+        self.assertGreater(metrics['queries'], 1)
+        self.assertGreater(metrics['template_ms'], 0)
+        self.assertIn('exceeds the budget of 1', metrics['flags'][0])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        self.assertNotIn('Server-Timing', self.client.get('/'))
+
+
+class RequestProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        self.settings_override = override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_DIR=self.profile_dir)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.staff = User.objects.create_user(username='ops', password='pw', is_staff=True)
+
+    def test_staff_request_is_profiled_with_sql_log(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs('lmsApp.profiling', 'INFO'):
+            response = self.client.get('/?profile=cprofile')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Profile'].endswith('.prof'))
+        path = os.path.join(self.profile_dir, response['X-Profile'])
+        self.assertTrue(os.path.exists(path))
+        with open(path[:-len('.prof')] + '.sql') as fh:
+            self.assertIn('SELECT', fh.read())
+
+    def test_sampling_profile_download(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs('lmsApp.profiling', 'INFO'):
+            response = self.client.get('/?profile=sample&profile_download=1')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            self.assertEqual(sorted(os.path.splitext(name)[1] for name in archive.namelist()), ['.folded', '.sql'])
+
+    def test_non_staff_cannot_profile(self):
+        self.client.force_login(User.objects.create_user(username='learner', password='pw'))
+        self.assertNotIn('X-Profile', self.client.get('/?profile=cprofile'))
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_sampled_request_is_profiled(self):
+        with override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0), self.assertLogs('lmsApp.profiling', 'INFO'):
+            response = self.client.get(reverse('login'))
+        # The profile is written, but its name isn't handed to anonymous users.
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(sorted(os.path.splitext(name)[1] for name in os.listdir(self.profile_dir)), ['.folded', '.sql'])
+
+    def test_disabled_middleware_is_not_used(self):
+        with override_settings(REQUEST_PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(lambda request: HttpResponse())
+
+
+class PrometheusMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='learner', password='pw')
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_latency_and_cache_results_are_exported(self):
+        self.client.force_login(self.student)
+        before = self.sample('lms_request_duration_seconds_count', view='dashboard', method='GET', status='2xx')
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(
+            self.sample('lms_request_duration_seconds_count', view='dashboard', method='GET', status='2xx'), before + 2
+        )
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('lms_request_db_queries_bucket{le="5.0",view="dashboard"}', body)
+        self.assertIn('lms_cache_requests_total{namespace="published_courses",result="hit"}', body)
+
+    def test_endpoint_is_not_served_to_remote_clients(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_needs_configured_access(self):
+        # By default not even local clients (such as a reverse proxy) are let in.
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with self.settings(METRICS_BEARER_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer wrong'}).status_code, 404)
+            self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'}).status_code, 200)
+        self.client.force_login(User.objects.create_user(username='admin', password='pw', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_counters_from_several_processes_are_added_up(self):
+        multiproc_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, multiproc_dir)
+        env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': multiproc_dir}
+        for _ in range(2):
+            subprocess.run(
+                [sys.executable, '-c', 'from lmsApp import metrics; metrics.ENROLLMENTS.inc()'],
+                cwd=settings.BASE_DIR, env=env, check=True,
+            )
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': multiproc_dir}):
+            body, _ = render_latest()
+        self.assertIn(b'lms_enrollments_total 2.0', body)
+
+
+class SlowQueryLogTests(TestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='learner', password='pw')
+
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x''y'  AND n > 10 LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (?) AND name = ? AND n > ? LIMIT ?",
+        )
+        self.assertEqual(fingerprint('SELECT "t1"."col2" FROM "t1"'), 'SELECT "t1"."col2" FROM "t1"')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_statements_are_aggregated_per_fingerprint_and_view(self):
+        self.client.force_login(self.student)
+        # Cleared before each request, so cached reads run both times.
+        cache.clear()
+        self.client.get(reverse('dashboard'))
+        recorded = {row.fingerprint: row.calls for row in SlowQuery.objects.filter(view='dashboard')}
+        self.assertTrue(recorded)
+        cache.clear()
+        self.client.get(reverse('dashboard'))
+        for row in SlowQuery.objects.filter(view='dashboard', fingerprint__in=recorded):
+            self.assertEqual(row.calls, recorded[row.fingerprint] * 2)
+            self.assertGreaterEqual(row.total_ms, row.max_ms)
+
+    def test_staff_page_and_command_list_the_worst_statements(self):
+        SlowQuery.objects.create(
+            fingerprint_hash='a' * 40, view='dashboard', fingerprint='SELECT ? FROM "lmsApp_content"',
+            sample_sql='SELECT 1 FROM "lmsApp_content"', calls=4, total_ms=900, max_ms=400,
+        )
+        self.client.force_login(User.objects.create_user(username='ops', password='pw', is_staff=True))
+        response = self.client.get(reverse('slow_query_list'), {'sort': 'mean', 'view': 'dashboard'})
+        self.assertContains(response, 'SELECT ? FROM &quot;lmsApp_content&quot;')
+        self.assertEqual(response.context['queries'][0].mean_ms, 225)
+
+        out = io.StringIO()
+        call_command('slow_queries', '--view', 'dashboard', stdout=out, stderr=io.StringIO())
+        self.assertIn('900.0 ms total', out.getvalue())
+
+    def test_students_cannot_see_the_log(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('slow_query_list')).status_code, 302)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every page runs a fixed number of queries, however much data is behind
+    it. The seeded data is deliberately large (a 100-content course, a
+    30-question quiz, several enrollments) so a per-row query shows up as a
+    budget many times over. Caches are cleared first: budgets are for a
+    cold cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(username='teacher', password='pw', is_instructor=True, is_student=False)
+        cls.student = User.objects.create_user(username='learner', password='pw', email='learner@example.com')
+
+        cls.courses = [
+            Course.objects.create(title=f'Course {i}', description='d', instructor=cls.instructor, is_published=True)
+            for i in range(6)
+        ]
+        cls.course = cls.courses[0]
+
+        # 100 contents in course 0 (4 modules x 5 lessons x 5 contents), 5 in each other course.
+        for course in cls.courses:
+            module_count, lesson_count, content_count = (4, 5, 5) if course is cls.course else (1, 1, 5)
+            for m in range(1, module_count + 1):
+                module = Module.objects.create(course=course, title=f'Module {m}', order=m)
+                lessons = Lesson.objects.bulk_create(
+                    [Lesson(module=module, title=f'Lesson {l}', order=l) for l in range(1, lesson_count + 1)]
+                )
+                Content.objects.bulk_create([
+                    Content(lesson=lesson, title=f'Content {c}', content_type='text', text_content='x', order=c)
+                    for lesson in lessons for c in range(1, content_count + 1)
+                ])
+
+        cls.lesson = Lesson.objects.filter(module__course=cls.course).first()
+        cls.module = cls.lesson.module
+        cls.quiz_content = Content.objects.create(lesson=cls.lesson, title='Quiz', content_type='quiz', order=99)
+        cls.quiz = Quiz.objects.create(lesson=cls.lesson, title='Big Quiz', pass_percentage=50)
+        questions = Question.objects.bulk_create(
+            [Question(quiz=cls.quiz, text=f'Question {q}?', order=q) for q in range(1, 31)]
+        )
+        Option.objects.bulk_create([
+            Option(question=question, text=f'Option {o}', is_correct=(o == 1))
+            for question in questions for o in range(1, 5)
+        ])
+
+        for course in cls.courses[:5]:
+            Enrollment.objects.create(student=cls.student, course=course)
+        # Course 1 is fully completed with a certificate; course 0 is half done.
+        completed = list(Content.objects.filter(lesson__module__course=cls.courses[1]))
+        completed += list(Content.objects.filter(lesson__module__course=cls.course)[:50])
+        StudentContentProgress.objects.bulk_create([
+            StudentContentProgress(student=cls.student, content=content, completed=True) for content in completed
+        ])
+        Enrollment.objects.filter(student=cls.student, course=cls.courses[1]).update(completed=True)
+        Certificate.objects.create(student=cls.student, course=cls.courses[1])
+
+        cls.attempt = StudentQuizAttempt.objects.create(student=cls.student, quiz=cls.quiz, score=50, passed=True)
+        StudentAnswer.objects.bulk_create([
+            StudentAnswer(attempt=cls.attempt, question=question, chosen_option=question.options.first())
+            for question in questions
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def quiz_url(self, name, **kwargs):
+        return reverse(name, kwargs={
+            'course_slug': self.course.slug, 'module_id': self.module.id, 'lesson_id': self.lesson.id,
+            'content_id': self.quiz_content.id, **kwargs,
+        })
+
+    # Each request below also spends 2 queries on the session and the user.
+
+    def test_student_dashboard(self):
+        self.client.force_login(self.student)
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['enrolled_courses']), 5)
+
+    def test_instructor_dashboard(self):
+        self.client.force_login(self.instructor)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['courses']), 6)
+
+    def test_course_detail_for_student(self):
+        self.client.force_login(self.student)
+        with self.assertNumQueries(8):
+            response = self.client.get(self.course.get_absolute_url())
+        self.assertTrue(response.context['can_access_content'])
+
+    def test_course_detail_for_instructor(self):
+        self.client.force_login(self.instructor)
+        with self.assertNumQueries(6):
+            self.client.get(self.course.get_absolute_url())
+
+    def test_content_detail(self):
+        self.client.force_login(self.student)
+        url = reverse('content_detail', kwargs={
+            'course_slug': self.course.slug, 'module_id': self.module.id, 'lesson_id': self.lesson.id,
+            'content_id': self.quiz_content.id,
+        })
+        with self.assertNumQueries(12):
+            self.client.get(url)
+
+    def test_quiz_take(self):
+        self.client.force_login(self.student)
+        with self.assertNumQueries(10):
+            response = self.client.get(self.quiz_url('quiz_take'))
+        self.assertEqual(len(response.context['form'].fields), 30)
+
+    def test_quiz_submit(self):
+        self.client.force_login(self.student)
+        answers = {
+            f'question_{question.id}': question.options.all()[0].id
+            for question in self.quiz.questions.prefetch_related('options')
+        }
+        with self.assertNumQueries(15):
+            response = self.client.post(self.quiz_url('quiz_submit'), answers)
+        attempt = StudentQuizAttempt.objects.exclude(pk=self.attempt.pk).get()
+        self.assertRedirects(response, self.quiz_url('quiz_result', attempt_id=attempt.id), fetch_redirect_response=False)
+        self.assertEqual(attempt.score, 100)
+
+    def test_quiz_result(self):
+        self.client.force_login(self.student)
+        with self.assertNumQueries(12):
+            response = self.client.get(self.quiz_url('quiz_result', attempt_id=self.attempt.id))
+        self.assertEqual(len(response.context['questions_with_answers']), 30)
+
+    def test_access_and_grading_ignore_stale_cache_entries(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('dashboard'))
+        question = self.quiz.questions.order_by('order').first()
+        wrong = question.options.filter(is_correct=False).first()
+        # Changes made on another worker: this process' cache is never bumped.
+        with mock.patch('lmsApp.queries.bump_version'), self.captureOnCommitCallbacks(execute=True):
+            question.options.update(is_correct=False)
+            Option.objects.filter(pk=wrong.pk).update(is_correct=True)
+            answers = {
+                f'question_{q.id}': wrong.id if q == question else q.options.all()[0].id
+                for q in self.quiz.questions.prefetch_related('options')
+            }
+            self.client.post(self.quiz_url('quiz_submit'), answers)
+            Enrollment.objects.filter(student=self.student, course=self.course).delete()
+
+        attempt = StudentQuizAttempt.objects.exclude(pk=self.attempt.pk).get()
+        self.assertEqual(attempt.answers.get(question=question).chosen_option, wrong)
+        correct = Option.objects.filter(pk__in=[int(pk) for pk in answers.values()], is_correct=True).count()
+        self.assertEqual(float(attempt.score), round(correct * 100 / 30, 2))
+        self.assertTrue(attempt.answers.filter(question=question, chosen_option__is_correct=True).exists())
+        response = self.client.get(self.quiz_url('quiz_take'))
+        self.assertRedirects(response, self.course.get_absolute_url(), fetch_redirect_response=False)
+
+    def test_dashboard_budget_does_not_grow_with_enrollments(self):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('dashboard'))
+        Enrollment.objects.create(student=self.student, course=self.courses[5])
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(reverse('dashboard'))
+        self.assertEqual(len(before), len(after))
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class LoadTestJourneyTests(TransactionTestCase):
+    # Outside a test transaction, so cache invalidation (transaction.on_commit)
+    # runs between the journey's requests as it does in production.
+
+    def setUp(self):
+        cache.clear()
+
+    def test_journey_completes_the_seeded_course(self):
+        plan = CoursePlan(ensure_loadtest_course(contents=4, questions=3))
+        recorder = LatencyRecorder()
+        self.assertTrue(run_journey(InProcessClient(), plan, 'loadtest_journey', recorder, claim_certificate=False))
+
+        enrollment = Enrollment.objects.get(student__username='loadtest_journey', course=plan.course)
+        self.assertTrue(enrollment.completed)
+        self.assertEqual(StudentQuizAttempt.objects.get(student=enrollment.student).score, 100)
+        endpoints, total = recorder.summary(duration=1.0)
+        self.assertEqual(endpoints['content_detail']['requests'], 5)
+        self.assertEqual(total['errors'], 0)
+        self.assertGreater(endpoints['course_detail']['savings_pct'], 50)
+        self.assertLess(total['bytes_on_wire'], total['bytes_uncompressed'])
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class DuplicateCourseTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        second = Lesson.objects.create(module=cls.module, title='Lesson 2', order=2)
+        cls.contents = [
+            Content.objects.create(lesson=cls.lesson, title='Notes', content_type='text', text_content='x', order=1),
+            Content.objects.create(lesson=second, title='Slides', content_type='pdf', file='lms_content/slides.pdf', order=1),
+        ]
+        cls.quiz = Quiz.objects.create(lesson=second, title='Quiz')
+        for q in range(2):
+            question = Question.objects.create(quiz=cls.quiz, text=f'Q{q}?', order=q)
+            Option.objects.bulk_create([Option(question=question, text=t, is_correct=t == 'A') for t in 'ABC'])
+
+    def test_copies_the_tree_with_remapped_keys(self):
+        other = User.objects.create_user(username='other', password='pw', is_instructor=True, is_student=False)
+        # The slug check, then one INSERT for the course and a SELECT and a
+        # bulk INSERT per level, inside the savepoint.
+        with self.assertNumQueries(16):
+            clone = duplicate_course(self.course, instructor=other)
+
+        self.assertNotEqual(clone.pk, self.course.pk)
+        self.assertEqual((clone.title, clone.instructor, clone.is_published), ('Course (Copy)', other, False))
+
+        lessons = Lesson.objects.filter(module__course=clone).select_related('module__course').order_by('order')
+        self.assertEqual([lesson.title for lesson in lessons], ['Lesson 1', 'Lesson 2'])
+        for lesson in lessons:
+            self.assertEqual(lesson.module.course, clone)
+            self.assertNotIn(lesson.pk, [self.lesson.pk, self.quiz.lesson_id])
+
+        contents = Content.objects.filter(lesson__module__course=clone).order_by('lesson__order')
+        self.assertTrue(set(contents.values_list('pk', flat=True)).isdisjoint(c.pk for c in self.contents))
+        self.assertEqual([c.file.name for c in contents], ['', 'lms_content/slides.pdf'])
+
+        quiz = Quiz.objects.get(lesson__module__course=clone)
+        self.assertNotEqual(quiz.pk, self.quiz.pk)
+        self.assertEqual(quiz.lesson, lessons[1])
+        questions = list(quiz.questions.all())
+        self.assertEqual([q.text for q in questions], ['Q0?', 'Q1?'])
+        for question in questions:
+            self.assertEqual(sorted(question.options.values_list('text', 'is_correct')), [('A', True), ('B', False), ('C', False)])
+        self.assertEqual(Option.objects.filter(question__quiz=self.quiz).count(), 6)
+
+
+class CourseImportExportTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.contents = [
+            Content.objects.create(lesson=cls.lesson, title='Notes', content_type='text', text_content='x', order=1),
+            Content.objects.create(lesson=cls.lesson, title='Slides', content_type='pdf', file='lms_content/slides.pdf', order=2),
+        ]
+        quiz = Quiz.objects.create(lesson=cls.lesson, title='Quiz', pass_percentage=60)
+        question = Question.objects.create(quiz=quiz, text='Q?', order=1)
+        Option.objects.bulk_create([Option(question=question, text=t, is_correct=t == 'A') for t in 'AB'])
+
+    def export(self):
+        stream = io.StringIO()
+        export_courses(Course.objects.filter(pk=self.course.pk), stream)
+        return stream.getvalue().splitlines()
+
+    def test_export_then_import_round_trips(self):
+        lines = self.export()
+        self.course.delete()
+        stats = CourseImporter().import_lines(lines)
+        self.assertEqual((stats['courses_created'], stats['content_created'], stats['option_created']), (1, 2, 2))
+        self.course = Course.objects.get(slug='course')
+        self.assertEqual(self.export(), lines)
+
+    def test_update_changes_and_removes_rows(self):
+        records = [json.loads(line) for line in self.export()]
+        for record in records:
+            if record['type'] == 'lesson':
+                record['title'] = 'Renamed'
+        records = [r for r in records if not (r['type'] == 'content' and r['order'] == 2)]
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.writelines(json.dumps(r) + '\n' for r in records)
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command('import_course', f.name, '--update', stdout=out)
+        self.assertEqual(
+            out.getvalue().splitlines()[:-1], ['content_deleted: 1', 'courses_updated: 1', 'lesson_updated: 1'],
+        )
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.title, 'Renamed')
+        self.assertEqual(list(Content.objects.filter(lesson=self.lesson).values_list('pk', flat=True)), [self.contents[0].pk])
+
+    def test_malformed_lines_are_reported_by_number(self):
+        lines = self.export()
+        self.course.delete()
+        for field, value, message in [
+            ('order', '1', "Line 4: 'order' must be a non-negative integer, not '1'."),
+            ('order', True, "Line 4: 'order' must be a non-negative integer, not True."),
+            ('content_type', 'podcast', "Line 4: unknown content_type 'podcast'."),
+            ('title', None, "Line 4: 'title' must be a string, not None."),
+        ]:
+            record = json.loads(lines[3])
+            self.assertEqual(record['type'], 'content')
+            record[field] = value
+            with self.subTest(field=field, value=value):
+                with self.assertRaisesMessage(CourseFormatError, message):
+                    CourseImporter().import_lines(lines[:3] + [json.dumps(record)] + lines[4:])
+        self.assertFalse(Course.objects.filter(slug='course').exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GenerateDatasetTests(TestCase):
+
+    def generate(self, prefix):
+        out = io.StringIO()
+        call_command(
+            'generate_dataset', seed=7, prefix=prefix, instructors=2, courses=4, modules=2, lessons=2, contents=3,
+            quiz_ratio=0.5, questions=2, students=30, enrollments=2, stdout=out,
+        )
+        # Everything but the timing line, with the prefix taken out of the natural keys.
+        strip = lambda value: value[len(prefix) + 1:]
+        return {
+            'counts': out.getvalue().splitlines()[:-1],
+            'courses': [
+                (strip(slug), strip(instructor), price, published)
+                for slug, instructor, price, published in Course.objects.filter(slug__startswith=f'{prefix}-')
+                .order_by('slug').values_list('slug', 'instructor__username', 'price', 'is_published')
+            ],
+            'enrollments': sorted(
+                (strip(student), strip(course), completed)
+                for student, course, completed in Enrollment.objects.filter(student__username__startswith=f'{prefix}_')
+                .values_list('student__username', 'course__slug', 'completed')
+            ),
+            'attempts': sorted(
+                (strip(student), strip(course), module, lesson, score, passed)
+                for student, course, module, lesson, score, passed in StudentQuizAttempt.objects
+                .filter(student__username__startswith=f'{prefix}_')
+                .values_list('student__username', 'quiz__lesson__module__course__slug', 'quiz__lesson__module__order',
+                             'quiz__lesson__order', 'score', 'passed')
+            ),
+        }
+
+    def test_same_seed_same_dataset(self):
+        first, second = self.generate('one'), self.generate('two')
+        self.assertIn('users: 32', first['counts'])
+        self.assertTrue(first['enrollments'] and first['attempts'])
+        self.assertEqual(first, second)
+
+
+class APITests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(username='teacher', password='pw', is_instructor=True, is_student=False)
+        cls.student = User.objects.create_user(username='learner', password='pw')
+        cls.courses = [
+            Course.objects.create(title=f'Course {i}', description='d', instructor=cls.instructor, is_published=True)
+            for i in range(5)
+        ]
+        cls.draft = Course.objects.create(title='Draft', description='d', instructor=cls.instructor)
+        cls.course = cls.courses[0]
+        module = Module.objects.create(course=cls.course, title='Module 1', order=1)
+        lesson = Lesson.objects.create(module=module, title='Lesson 1', order=1)
+        cls.contents = Content.objects.bulk_create([
+            Content(lesson=lesson, title=f'Content {c}', content_type='text', order=c) for c in range(1, 5)
+        ])
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+        StudentContentProgress.objects.create(student=cls.student, content=cls.contents[0], completed=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def test_catalog_cursor_pagination_with_sparse_fields(self):
+        url = reverse('api_course_list') + '?limit=2&fields[course]=id,title'
+        seen = []
+        while url:
+            body = self.client.get(url).json()
+            self.assertLessEqual(len(body['data']), 2)
+            seen += body['data']
+            url = body['next']
+        self.assertEqual([row['id'] for row in seen], [c.pk for c in sorted(self.courses, key=lambda c: (c.created_at, c.pk), reverse=True)])
+        self.assertEqual(set(seen[0]), {'id', 'title'})
+
+    def test_catalog_etag_changes_with_the_catalog(self):
+        url = reverse('api_course_list')
+        etag = self.client.get(url)['ETag']
+        # Only the session and user are read.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Renamed'
+            self.course.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [row['title'] for row in response.json()['data']])
+
+    def test_course_outline(self):
+        url = reverse('api_course_outline', kwargs={'slug': self.course.slug})
+        params = {'fields[course]': 'title', 'fields[content]': 'id,content_type'}
+        response = self.client.get(url, params)
+        data = response.json()['data']
+        self.assertEqual(data['title'], 'Course 0')
+        self.assertEqual(data['modules'][0]['lessons'][0]['contents'][0], {'id': self.contents[0].pk, 'content_type': 'text'})
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unpublished_course_is_only_visible_to_its_instructor(self):
+        url = reverse('api_course_outline', kwargs={'slug': self.draft.slug})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.instructor)
+        response = self.client.get(url)
+        self.assertEqual(response.json()['data']['title'], 'Draft')
+        # Replaying the instructor's ETag doesn't reveal the draft either.
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 404)
+
+    def test_my_progress(self):
+        data = self.client.get(reverse('api_my_progress')).json()['data']
+        self.assertEqual(data, [{
+            'course_id': self.course.pk, 'course_slug': self.course.slug, 'course_title': 'Course 0',
+            'enrolled_at': data[0]['enrolled_at'], 'completed': False,
+            'total_contents': 4, 'completed_contents': 1, 'progress_percentage': 25,
+        }])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(reverse('api_course_list'), {'fields[course]': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_course_list'), {'cursor': 'nonsense'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_my_progress')).status_code, 401)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class BulkEnrollmentTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.existing = User.objects.create_user(username='ada', email='ada@example.com', password='pw')
+        Enrollment.objects.create(student=cls.existing, course=cls.course)
+
+    def import_csv(self, text, **kwargs):
+        importer = EnrollmentImporter(self.course, 'https://lms.example.com', batch_size=2, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = importer.import_csv(io.StringIO(text))
+        return importer, stats
+
+    def test_import_creates_students_and_enrollments(self):
+        importer, stats = self.import_csv(
+            "email,username,first_name,last_name,password\n"
+            "ada@example.com,ada,Ada,Lovelace,\n"
+            "alan@example.com,,Alan,Turing,s3cret-Pa55\n"
+            "grace@example.com,grace,Grace,Hopper,\n"
+            "not-an-email,bad,,,\n"
+            "grace2@example.com,grace,Grace,Again,\n"
+            "teacher@example.com,teacher,,,\n"
+        )
+        self.assertEqual(stats['rows'], 6)
+        self.assertEqual(stats['users_created'], 2)
+        self.assertEqual(stats['enrolled'], 2)
+        self.assertEqual(stats['already_enrolled'], 1)
+        self.assertEqual([line for line, _ in importer.errors], [5, 6, 7])
+
+        alan = User.objects.get(username='alan@example.com')
+        self.assertTrue(alan.check_password('s3cret-Pa55'))
+        self.assertFalse(User.objects.get(username='grace').has_usable_password())
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 3)
+
+        self.assertEqual(stats['emails_sent'], 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['alan@example.com', 'grace@example.com'])
+        self.assertIn('https://lms.example.com' + self.course.get_absolute_url(), mail.outbox[0].body)
+
+    def test_reimport_is_harmless(self):
+        text = "email\nnew@example.com\n"
+        self.import_csv(text)
+        _, stats = self.import_csv(text, send_emails=False)
+        self.assertEqual((stats['users_created'], stats['enrolled'], stats['already_enrolled']), (0, 0, 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_file_without_email_column_is_rejected(self):
+        with self.assertRaises(EnrollmentImportError):
+            self.import_csv("username\nada\n")
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create_superuser(username='root', password='pw', email='root@example.com')
+        self.client.force_login(admin_user)
+        url = reverse('admin:lmsApp_course_bulk_enroll', args=[self.course.pk])
+        upload = SimpleUploadedFile('students.csv', b'email\nbob@example.com\n', content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'csv_file': upload, 'send_emails': 'on'})
+        self.assertEqual(response.context['stats']['enrolled'], 1)
+        self.assertTrue(Enrollment.objects.filter(student__username='bob@example.com', course=self.course).exists())
+
+
+class CourseExportTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.contents = [
+            Content.objects.create(lesson=cls.lesson, title=f'Item {i}', content_type='text', text_content='x', order=i)
+            for i in range(2)
+        ]
+        cls.quiz = Quiz.objects.create(lesson=cls.lesson, title='Quiz', pass_percentage=50)
+        cls.students = [
+            User.objects.create_user(username=f'student{i}', email=f's{i}@example.com', password='pw',
+                                     first_name='=cmd' if i == 0 else 'Stu')
+            for i in range(3)
+        ]
+        for student in cls.students:
+            Enrollment.objects.create(student=student, course=cls.course)
+        StudentContentProgress.objects.create(student=cls.students[0], content=cls.contents[0], completed=True)
+        StudentContentProgress.objects.create(student=cls.students[0], content=cls.contents[1], completed=True)
+        StudentContentProgress.objects.create(student=cls.students[1], content=cls.contents[0], completed=True)
+        StudentQuizAttempt.objects.create(student=cls.students[0], quiz=cls.quiz, score=40, passed=False)
+        StudentQuizAttempt.objects.create(student=cls.students[0], quiz=cls.quiz, score=90, passed=True)
+
+    def export(self, kind, user=None):
+        self.client.force_login(user or self.instructor)
+        return self.client.get(reverse('course_export', args=[self.course.slug, kind]))
+
+    def rows(self, response):
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_gradebook(self):
+        response = self.export('gradebook')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        header, *rows = self.rows(response)
+        self.assertEqual(header[-1], 'best score: Quiz')
+        self.assertEqual(len(rows), 3)
+        first = dict(zip(header, rows[0]))
+        self.assertEqual(first['name'], "'=cmd")
+        self.assertEqual((first['completed_contents'], first['progress_percentage']), ('2', '100'))
+        self.assertEqual(float(first['best score: Quiz']), 90)
+        self.assertEqual(dict(zip(header, rows[2]))['best score: Quiz'], '')
+
+    def test_gradebook_queries_per_chunk(self):
+        with self.assertNumQueries(2 + 2 * 4 + 1):  # quizzes and total, two full chunks and an empty one
+            rows = list(gradebook_rows(self.course, chunk_size=2))
+        self.assertEqual(len(rows), 4)
+
+    def test_progress_and_quiz_attempts(self):
+        self.assertEqual(len(self.rows(self.export('progress'))), 1 + 3)
+        header, *rows = self.rows(self.export('quiz-attempts'))
+        self.assertEqual([row[header.index('score')] for row in rows], ['40.00', '90.00'])
+
+    def test_only_the_instructor_or_admin_can_export(self):
+        other = User.objects.create_user(username='other', password='pw', is_instructor=True, is_student=False)
+        self.assertEqual(self.export('gradebook', other).status_code, 404)
+        self.assertEqual(self.export('gradebook', self.students[0]).status_code, 404)
+        self.assertEqual(self.export('unknown').status_code, 404)
+        admin_user = User.objects.create_superuser(username='root', password='pw', email='root@example.com')
+        self.assertEqual(self.export('progress', admin_user).status_code, 200)
+
+
+class CourseAnalyticsTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        second = Module.objects.create(course=cls.course, title='Module 2', order=2)
+        cls.contents = []
+        for m, lesson in enumerate([cls.lesson, Lesson.objects.create(module=second, title='Lesson 2', order=1)]):
+            cls.contents += [
+                Content.objects.create(lesson=lesson, title=f'Item {m}.{i}', content_type='text', text_content='x', order=i)
+                for i in range(2)
+            ]
+        cls.quiz = Quiz.objects.create(lesson=lesson, title='Quiz')
+        cls.students = [User.objects.create_user(username=f'student{i}', password='pw') for i in range(4)]
+        for student in cls.students:
+            Enrollment.objects.create(student=student, course=cls.course)
+        # student0 finishes everything, student1 the first lesson, student2 one item.
+        for content in cls.contents:
+            cls.complete(cls.students[0], content)
+        cls.complete(cls.students[1], cls.contents[0])
+        cls.complete(cls.students[1], cls.contents[1])
+        cls.complete(cls.students[2], cls.contents[0])
+        StudentQuizAttempt.objects.create(student=cls.students[0], quiz=cls.quiz, score=80, passed=True)
+        StudentQuizAttempt.objects.create(student=cls.students[1], quiz=cls.quiz, score=60, passed=False)
+
+    @staticmethod
+    def complete(student, content):
+        StudentContentProgress.objects.create(student=student, content=content, completed=True, completed_at=timezone.now())
+
+    def test_refresh(self):
+        analytics = refresh_course_analytics(self.course.pk)
+        self.assertEqual((analytics.enrollments, analytics.active_learners, analytics.completions), (4, 3, 1))
+        self.assertEqual(analytics.completion_rate, 25)
+        self.assertEqual((analytics.quiz_attempts, analytics.average_quiz_score), (2, 70))
+        lessons = [lesson for module in analytics.funnel for lesson in module['lessons']]
+        self.assertEqual([(lesson['started'], lesson['completed']) for lesson in lessons], [(3, 2), (1, 1)])
+        self.assertEqual([module['completed'] for module in analytics.funnel], [2, 1])
+        self.assertEqual(analytics.drop_off['title'], 'Lesson 1')
+
+    def test_queries_do_not_grow_with_students(self):
+        refresh_course_analytics(self.course.pk)
+        with CaptureQueriesContext(connection) as before:
+            refresh_course_analytics(self.course.pk)
+        for i in range(5):
+            student = User.objects.create_user(username=f'more{i}', password='pw')
+            Enrollment.objects.create(student=student, course=self.course)
+            self.complete(student, self.contents[0])
+        with CaptureQueriesContext(connection) as after:
+            refresh_course_analytics(self.course.pk)
+        self.assertEqual(len(after), len(before))
+
+    def test_queries_do_not_grow_with_the_outline(self):
+        refresh_course_analytics(self.course.pk)
+        with CaptureQueriesContext(connection) as before:
+            refresh_course_analytics(self.course.pk)
+        for m in range(3, 6):
+            module = Module.objects.create(course=self.course, title=f'Module {m}', order=m)
+            lesson = Lesson.objects.create(module=module, title=f'Lesson {m}', order=1)
+            content = Content.objects.create(lesson=lesson, title=f'Item {m}', content_type='text', text_content='x', order=1)
+            self.complete(self.students[0], content)
+        with CaptureQueriesContext(connection) as after:
+            analytics = refresh_course_analytics(self.course.pk)
+        self.assertEqual(len(after), len(before))
+        self.assertEqual([module['completed'] for module in analytics.funnel], [2, 1, 1, 1, 1])
+
+    def test_command_refreshes_only_stale_courses(self):
+        out = io.StringIO()
+        call_command('refresh_analytics', stdout=out)
+        self.assertIn('1 course(s)', out.getvalue())
+        call_command('refresh_analytics', stdout=out)
+        self.assertIn('0 course(s)', out.getvalue())
+
+        student = User.objects.create_user(username='late', password='pw')
+        Enrollment.objects.create(student=student, course=self.course)
+        call_command('refresh_analytics', stdout=out)
+        self.assertTrue(out.getvalue().endswith('Refreshed analytics of 1 course(s).\n'))
+        self.assertEqual(CourseAnalytics.objects.get(course=self.course).enrollments, 5)
+
+    def test_dashboard_and_page_read_precomputed_numbers(self):
+        call_command('refresh_analytics', stdout=io.StringIO())
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, reverse('course_analytics', args=[self.course.slug]))
+        self.assertContains(response, '25%')
+        response = self.client.get(reverse('course_analytics', args=[self.course.slug]))
+        self.assertContains(response, 'Biggest drop-off')
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(reverse('course_analytics', args=[self.course.slug])).status_code, 404)
+
+
+class GradebookTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.contents = [
+            Content.objects.create(lesson=cls.lesson, title=f'Item {i}', content_type='text', text_content='x', order=i)
+            for i in range(3)
+        ]
+        cls.quiz = Quiz.objects.create(lesson=cls.lesson, title='Quiz')
+        cls.students = [User.objects.create_user(username=f'student{i}', password='pw') for i in range(3)]
+        for student in cls.students:
+            Enrollment.objects.create(student=student, course=cls.course)
+        StudentContentProgress.objects.create(student=cls.students[0], content=cls.contents[0], completed=True)
+        StudentContentProgress.objects.create(student=cls.students[0], content=cls.contents[2], completed=True)
+        StudentContentProgress.objects.create(student=cls.students[1], content=cls.contents[0], completed=False)
+        StudentQuizAttempt.objects.create(student=cls.students[1], quiz=cls.quiz, score=50, passed=False)
+        StudentQuizAttempt.objects.create(student=cls.students[1], quiz=cls.quiz, score=75, passed=True)
+        # Progress of a student who is no longer enrolled is ignored.
+        dropped = User.objects.create_user(username='dropped', password='pw')
+        StudentContentProgress.objects.create(student=dropped, content=cls.contents[1], completed=True)
+
+    def test_matrix_and_rates(self):
+        gradebook = Gradebook(self.course.pk)
+        self.assertEqual(gradebook.completed.tolist(), [[True, False, True], [False, False, False], [False, False, False]])
+        self.assertEqual(gradebook.student_completion().round(2).tolist(), [0.67, 0, 0])
+        self.assertEqual(gradebook.content_completion().round(2).tolist(), [0.33, 0, 0.33])
+        self.assertEqual(gradebook.quiz_averages().tolist(), [75])
+        rows = list(gradebook.rows(1, 10))
+        self.assertEqual([row['username'] for row in rows], ['student1', 'student2'])
+        self.assertEqual([row['scores'] for row in rows], [[75], [None]])
+
+    @mock.patch('lmsApp.views.GRADEBOOK_PAGE_SIZE', 2)
+    def test_view_is_paginated_by_students(self):
+        self.client.force_login(self.instructor)
+        url = reverse('course_gradebook', args=[self.course.slug])
+        response = self.client.get(url)
+        self.assertEqual([row['username'] for row in response.context['rows']], ['student0', 'student1'])
+        self.assertEqual([content['completion'] for content in response.context['contents']], [33, 0, 33])
+        self.assertEqual(len(self.client.get(url, {'page': 2}).context['rows']), 1)
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class LargeTableAdminTests(CourseFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin_user = User.objects.create_superuser(username='root', password='pw', email='root@example.com')
+        cls.content = Content.objects.create(lesson=cls.lesson, title='Item', content_type='text', text_content='x', order=1)
+        cls.quiz = Quiz.objects.create(lesson=cls.lesson, title='Quiz')
+        question = Question.objects.create(quiz=cls.quiz, text='Q?', order=1)
+        cls.option = Option.objects.create(question=question, text='A', is_correct=True)
+        cls.question = question
+        cls.add_students(3)
+
+    @classmethod
+    def add_students(cls, count):
+        start = User.objects.filter(is_student=True).count()
+        for i in range(start, start + count):
+            student = User.objects.create_user(username=f'student{i}', password='pw')
+            Enrollment.objects.create(student=student, course=cls.course)
+            StudentContentProgress.objects.create(student=student, content=cls.content, completed=True)
+            attempt = StudentQuizAttempt.objects.create(student=student, quiz=cls.quiz, score=100, passed=True)
+            StudentAnswer.objects.create(attempt=attempt, question=cls.question, chosen_option=cls.option)
+            Certificate.objects.create(student=student, course=cls.course)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.client.force_login(self.admin_user)
+        urls = [reverse(f'admin:lmsApp_{model}_changelist') for model in
+                ('enrollment', 'studentcontentprogress', 'studentquizattempt', 'studentanswer', 'certificate')]
+        before = [self.changelist_queries(url) for url in urls]
+        self.add_students(4)
+        self.assertEqual([self.changelist_queries(url) for url in urls], before)
+
+    def test_input_filters(self):
+        self.client.force_login(self.admin_user)
+        url = reverse('admin:lmsApp_studentcontentprogress_changelist')
+        response = self.client.get(url, {'student': 'student1', 'course': self.course.slug})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'value="student1"')
+        self.assertNotContains(response, '?student__id__exact=')
+        response = self.client.get(url, {'course': 'no-such-course'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+        response = self.client.get(reverse('admin:lmsApp_certificate_changelist'), {'q': 'student1'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    @override_settings(ADMIN_COUNT_LIMIT=2)
+    def test_paginator_estimates_unfiltered_counts(self):
+        if connection.vendor == 'postgresql':
+            # reltuples stays at -1 until the table has been analyzed.
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(StudentContentProgress._meta.db_table)}')
+        estimate = estimated_row_count(StudentContentProgress)
+        self.assertGreaterEqual(estimate, 3)
+        self.assertEqual(EstimatedCountPaginator(StudentContentProgress.objects.order_by('pk'), 10).count, estimate)
+        self.assertEqual(EstimatedCountPaginator(StudentContentProgress.objects.filter(completed=True).order_by('pk'), 10).count, 2)
+
+
+class StaticPipelineTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    @override_settings(
+        STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'lmsApp.storage.CompressedManifestStaticFilesStorage'}},
+        STATIC_BROTLI_QUALITY=4,
+    )
+    def test_collectstatic_writes_hashed_and_precompressed_files(self):
+        with self.settings(STATIC_ROOT=self.root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, 'staticfiles.json')) as f:
+            hashed = json.load(f)['paths']['lmsApp/js/lms.js']
+        path = os.path.join(self.root, hashed)
+        with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), original.read())
+        self.assertTrue(os.path.exists(path + '.br'))
+
+    def middleware(self):
+        with override_settings(STATIC_SERVE=True, STATIC_ROOT=self.root, STATIC_URL='/static/', STATIC_MAX_AGE=60):
+            return StaticFilesMiddleware(lambda request: HttpResponse('app', status=404))
+
+    def get(self, path, **headers):
+        response = self.middleware()(RequestFactory().get(path, headers=headers))
+        response.body = b''.join(response) if response.status_code == 200 else response.content
+        return response
+
+    def test_serves_precompressed_variant_by_accept_encoding(self):
+        name = os.path.join(self.root, 'app.0123456789ab.css')
+        for suffix, data in (('', b'plain'), ('.gz', b'gzipped'), ('.br', b'brotli')):
+            with open(name + suffix, 'wb') as f:
+                f.write(data)
+
+        response = self.get('/static/app.0123456789ab.css', accept_encoding='gzip, deflate, br')
+        self.assertEqual((response['Content-Encoding'], response.body), ('br', b'brotli'))
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response = self.get('/static/app.0123456789ab.css', accept_encoding='gzip, br;q=0')
+        self.assertEqual((response['Content-Encoding'], response.body), ('gzip', b'gzipped'))
+        response = self.get('/static/app.0123456789ab.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.body, b'plain')
+
+        revalidated = self.get('/static/app.0123456789ab.css', if_none_match=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_unhashed_and_missing_files(self):
+        with open(os.path.join(self.root, 'robots.txt'), 'w') as f:
+            f.write('User-agent: *')
+        self.assertEqual(self.get('/static/robots.txt')['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.get('/static/missing.css').content, b'app')
+        self.assertEqual(self.get('/static/../../etc/passwd').content, b'app')
+
+
+class ResponseCompressionTests(TestCase):
+    page = ('<p>' + 'Lorem ipsum dolor sit amet. ' * 100 + '</p>').encode()
+
+    def compress(self, response, **headers):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/', headers=headers))
+
+    def test_large_html_is_gzipped(self):
+        response = self.compress(HttpResponse(self.page), accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.page)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_brotli_only_for_responses_that_dont_vary_on_cookie(self):
+        if brotli is None:
+            self.skipTest("brotli is not installed")
+        response = self.compress(HttpResponse(self.page), accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.page)
+
+        private = HttpResponse(self.page)
+        private['Vary'] = 'Cookie'
+        self.assertEqual(self.compress(private, accept_encoding='gzip, br')['Content-Encoding'], 'gzip')
+
+    def test_small_media_and_unaccepted_responses_are_left_alone(self):
+        small = self.compress(HttpResponse(b'<p>short</p>'), accept_encoding='gzip')
+        pdf = self.compress(HttpResponse(self.page, content_type='application/pdf'), accept_encoding='gzip')
+        identity = self.compress(HttpResponse(self.page), accept_encoding='gzip;q=0')
+        for response in (small, pdf, identity):
+            self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(identity.content, self.page)
+        self.assertIn('Accept-Encoding', identity['Vary'])
+
+    def test_streaming_responses_are_compressed_chunk_by_chunk(self):
+        rows = [f'{i},student_{i},{i % 100}\n'.encode() for i in range(2000)]
+        response = self.compress(StreamingHttpResponse(iter(rows), content_type='text/csv'), accept_encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(rows))
+
+        if brotli is not None:
+            response = self.compress(StreamingHttpResponse(iter(rows), content_type='text/csv'), accept_encoding='br')
+            self.assertEqual(brotli.decompress(b''.join(response.streaming_content)), b''.join(rows))
+
+    def test_pages_are_compressed_end_to_end(self):
+        instructor = User.objects.create_user(username='teacher', password='pw', is_instructor=True, is_student=False)
+        course = Course.objects.create(title='Course', description='d ' * 500, instructor=instructor, is_published=True)
+        self.client.force_login(User.objects.create_user(username='learner', password='pw'))
+
+        response = self.client.get(course.get_absolute_url(), headers={'Accept-Encoding': 'br, gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'Course', gzip.decompress(response.content))
+
+    @override_settings(RESPONSE_COMPRESSION=False)
+    def test_can_be_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            CompressionMiddleware(lambda request: HttpResponse())
+
+
+class ChunkedUploadTests(CourseFixtureMixin, TestCase):
+    data = os.urandom(25000)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.content = Content.objects.create(lesson=cls.lesson, title='Lecture', content_type='video', video_url='https://example.com/v', order=1)
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = self.settings(
+            MEDIA_ROOT=media, UPLOAD_SESSION_DIR=os.path.join(media, 'upload_sessions'), UPLOAD_CHUNK_SIZE=10000,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.instructor)
+
+    def start(self, data=None):
+        response = self.client.post(reverse('upload_create'), {'filename': '../lecture 1.mp4', 'size': len(data or self.data)})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, url, offset, chunk, checksum=None):
+        return self.client.put(url, chunk, content_type='application/octet-stream', headers={
+            'Upload-Offset': str(offset), 'Upload-Checksum': f'sha256 {checksum or hashlib.sha256(chunk).hexdigest()}',
+        })
+
+    def upload(self):
+        state = self.start()
+        for offset in range(0, len(self.data), state['chunk_size']):
+            self.put(state['url'], offset, self.data[offset:offset + state['chunk_size']])
+        return UploadSession.objects.get(pk=state['id'])
+
+    def test_chunks_are_assembled_and_renamed_into_place(self):
+        session = self.upload()
+        self.assertEqual(session.filename, 'lecture_1.mp4')
+        self.assertTrue(session.received)
+        inode = os.stat(partial_path(session)).st_ino
+
+        response = self.client.post(reverse('upload_complete', kwargs={'upload_id': session.pk}), {'content': self.content.pk})
+        self.assertEqual(response.status_code, 200)
+        self.content.refresh_from_db()
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(self.content.file.name, f'lms_content/{digest[:2]}/{digest}.mp4')
+        self.assertEqual(os.stat(self.content.file.path).st_ino, inode)
+        with self.content.file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(os.path.exists(partial_path(session)))
+
+        again = self.client.post(reverse('upload_complete', kwargs={'upload_id': session.pk}), {'content': self.content.pk})
+        self.assertEqual(again.status_code, 409)
+
+    def test_misplaced_and_corrupt_chunks_are_refused(self):
+        state = self.start()
+        self.assertEqual(self.put(state['url'], 0, self.data[:10000]).json()['offset'], 10000)
+
+        skipped = self.put(state['url'], 20000, self.data[20000:])
+        self.assertEqual(skipped.status_code, 409)
+        self.assertEqual(skipped.json()['offset'], 10000)
+
+        corrupt = self.put(state['url'], 10000, self.data[10000:20000], checksum='0' * 64)
+        self.assertEqual(corrupt.status_code, 400)
+        session = UploadSession.objects.get(pk=state['id'])
+        self.assertEqual(session.offset, 10000)
+        self.assertEqual(os.path.getsize(partial_path(session)), 10000)
+
+        self.assertEqual(self.client.get(state['url']).json()['offset'], 10000)
+        self.assertEqual(self.put(state['url'], 10000, self.data[10000:20000]).json()['offset'], 20000)
+
+    def test_late_resends_leave_accepted_chunks_alone(self):
+        state = self.start()
+        self.put(state['url'], 0, self.data[:10000])
+        # Requests that read the session before a retry of their chunk was
+        # accepted, and finish after it.
+        late, later = UploadSession.objects.get(pk=state['id']), UploadSession.objects.get(pk=state['id'])
+        self.put(state['url'], 10000, self.data[10000:20000])
+        chunk, checksum = self.data[10000:20000], hashlib.sha256(self.data[10000:20000]).hexdigest()
+
+        with self.assertRaises(UploadError):
+            write_chunk(late, 10000, len(chunk), io.BytesIO(chunk[:5000]), checksum)
+        with open(partial_path(late), 'rb') as f:
+            self.assertEqual(f.read(), self.data[:20000])
+        with self.assertRaises(UploadConflict):
+            write_chunk(later, 10000, len(chunk), io.BytesIO(chunk), checksum)
+        self.assertEqual(later.offset, 20000)
+        self.assertEqual(os.listdir(settings.UPLOAD_SESSION_DIR), [os.path.basename(partial_path(later))])
+
+    def test_failed_attach_can_be_retried(self):
+        session = self.upload()
+        url = reverse('upload_complete', kwargs={'upload_id': session.pk})
+        with mock.patch.object(Content, 'save', side_effect=OSError('database went away')):
+            with self.assertRaises(OSError):
+                self.client.post(url, {'content': self.content.pk})
+        session.refresh_from_db()
+        self.assertIsNone(session.completed_at)
+        with open(partial_path(session), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertFalse(default_storage.exists(f'lms_content/{digest[:2]}/{digest}.mp4'))
+
+        self.assertEqual(self.client.post(url, {'content': self.content.pk}).status_code, 200)
+        self.content.refresh_from_db()
+        with self.content.file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_content_form_accepts_a_received_upload(self):
+        session = self.upload()
+        url = reverse('content_create', kwargs={'course_slug': self.course.slug, 'module_id': self.module.pk, 'lesson_id': self.lesson.pk})
+        response = self.client.post(url, {'title': 'Slides', 'content_type': 'pdf', 'order': 2, 'upload': session.pk}, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertTrue(response.json()['success'])
+        content = Content.objects.get(title='Slides')
+        self.assertEqual(content.file.size, len(self.data))
+
+        other = User.objects.create_user(username='other', password='pw', is_instructor=True, is_student=False)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('upload_detail', kwargs={'upload_id': session.pk})).status_code, 404)
+
+    def test_stale_uploads_are_purged(self):
+        state = self.start()
+        session = UploadSession.objects.get(pk=state['id'])
+        self.assertEqual(purge_stale_uploads(), 0)
+        self.assertEqual(purge_stale_uploads(timezone.now() + timedelta(hours=49)), 1)
+        self.assertFalse(os.path.exists(partial_path(session)))
+
+
+class ContentAddressedStorageTests(CourseFixtureMixin, TestCase):
+    pdf = b'%PDF-1.4 ' + os.urandom(5000)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = self.settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media)
+            for root, _, names in os.walk(self.media) for name in names
+        )
+
+    def test_identical_uploads_are_stored_once_under_their_digest(self):
+        self.client.force_login(self.instructor)
+        url = reverse('content_create', kwargs={'course_slug': self.course.slug, 'module_id': self.module.pk, 'lesson_id': self.lesson.pk})
+        for title, filename in (('Week 1', 'notes.PDF'), ('Week 1 again', 'copy of notes.pdf')):
+            self.client.post(url, {'title': title, 'content_type': 'pdf', 'order': 1, 'file': SimpleUploadedFile(filename, self.pdf)})
+
+        digest = hashlib.sha256(self.pdf).hexdigest()
+        names = set(Content.objects.values_list('file', flat=True))
+        self.assertEqual(names, {f'lms_content/{digest[:2]}/{digest}.pdf'})
+        self.assertEqual(self.stored_files(), [f'lms_content/{digest[:2]}/{digest}.pdf'])
+        self.assertEqual(reference_count(default_storage, names.pop()), 2)
+
+    def test_saving_stored_bytes_again_restarts_the_grace_period(self):
+        name = default_storage.save('lms_content/slides.pdf', ContentFile(self.pdf))
+        path = default_storage.path(name)
+        os.utime(path, (0, 0))
+        self.assertEqual(default_storage.save('lms_content/copy.pdf', ContentFile(self.pdf)), name)
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+
+        os.utime(path, (0, 0))
+        with open(path, 'rb') as f:
+            upload = SimpleUploadedFile('again.pdf', f.read())
+        upload.sha256 = hashlib.sha256(self.pdf).hexdigest()
+        self.assertEqual(default_storage.save('lms_content/again.pdf', upload), name)
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+        call_command('gc_media', grace_hours=1, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_shared_files_survive_delete_and_orphans_are_collected(self):
+        name = default_storage.save('lms_content/slides.pdf', ContentFile(self.pdf))
+        self.assertEqual(default_storage.save('lms_content/other.pdf', ContentFile(self.pdf)), name)
+        first, second = Content.objects.bulk_create([
+            Content(lesson=self.lesson, title=f'Slides {i}', content_type='pdf', file=name, order=i) for i in (1, 2)
+        ])
+        orphan = default_storage.save('certificates/unused.pdf', ContentFile(b'%PDF-1.4 unused'))
+
+        first.file.delete()
+        self.assertTrue(default_storage.exists(name))
+
+        call_command('gc_media', grace_hours=1, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+        call_command('gc_media', grace_hours=0, stdout=io.StringIO())
+        self.assertEqual(self.stored_files(), [name])
+
+        second.delete()
+        call_command('gc_media', grace_hours=0, stdout=io.StringIO())
+        self.assertEqual(self.stored_files(), [])
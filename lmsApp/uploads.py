@@ -0,0 +1,207 @@
+"""
+Resumable, chunked uploads of large Content files (lecture videos, slide
+decks), so a multi-gigabyte file doesn't tie up a worker in one request and
+a dropped connection only costs the chunk in flight.
+
+The protocol, spoken by lms.js for big files in the content form:
+
+    POST /uploads/                 filename, size
+                                   -> 201 {id, offset, size, chunk_size, url}
+    GET  /uploads/<id>/            -> {offset, size, received}: where to resume
+    PUT  /uploads/<id>/            the chunk as the raw request body, with
+                                   Upload-Offset: where it starts, and
+                                   Upload-Checksum: sha256 <hex digest of the chunk>
+                                   -> {offset, size, received}
+    POST /uploads/<id>/complete/   content=<id>: attach the file to that Content
+
+A chunk is streamed from the request into a file of its own, hashed on the
+way. Once it is complete and matches its checksum, it is copied into the
+session's temporary file at its offset and flushed to disk while the session
+row is locked, and the offset moves past it in the same transaction. A chunk
+that starts anywhere but the current offset is refused with 409 and the
+offset to resume from; one that fails its checksum is refused with 400, so
+it can be sent again. Either way the session's file is left untouched, so a
+slow original request can't damage the bytes its retry already delivered.
+
+Once every byte is in, the temporary file is saved to the Content's storage
+as a file with a temporary_file_path(), which FileSystemStorage renames into
+lms_content/ instead of copying (when UPLOAD_SESSION_DIR and MEDIA_ROOT share
+a filesystem). ContentForm also accepts the id of a received upload in place
+of a file, and content_create / content_update attach it the same way.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import UploadSession
+
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class UploadConflict(UploadError):
+    """The chunk doesn't start at the session's current offset."""
+    status = 409
+
+
+class _ReceivedFile(File):
+    # Storages move a file with a temporary path instead of streaming it.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def partial_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_DIR, f'{session.pk}.part')
+
+
+def _backup_path(session):
+    return f'{partial_path(session)}.attaching'
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def start_upload(user, filename, size):
+    """Creates an UploadSession for a file of `size` bytes and its empty temporary file."""
+    try:
+        size = int(size)
+        filename = get_valid_filename(os.path.basename(filename or ''))
+    except (TypeError, ValueError, SuspiciousFileOperation):
+        raise UploadError("A file name and a size in bytes are required.")
+    if size <= 0:
+        raise UploadError("A file name and a size in bytes are required.")
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f"Files can be at most {settings.UPLOAD_MAX_SIZE} bytes.")
+
+    session = UploadSession.objects.create(user=user, filename=filename[:255], size=size)
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    open(partial_path(session), 'wb').close()
+    return session
+
+
+def parse_checksum(header):
+    """The hex digest from an `Upload-Checksum: sha256 <hex>` header."""
+    algorithm, _, digest = (header or '').strip().partition(' ')
+    if algorithm.lower() != 'sha256' or len(digest.strip()) != 64:
+        raise UploadError("Upload-Checksum must be 'sha256 <hex digest of the chunk>'.")
+    return digest.strip().lower()
+
+
+def write_chunk(session, offset, length, stream, checksum):
+    """
+    Writes `length` bytes read from `stream` at `offset` of the session's
+    temporary file and returns the new offset.
+    """
+    if session.completed_at is not None:
+        raise UploadConflict("This upload has already been completed.")
+    if offset != session.offset:
+        raise UploadConflict(f"Expected a chunk starting at byte {session.offset}.")
+    if not 0 < length <= settings.UPLOAD_CHUNK_SIZE:
+        raise UploadError(f"Chunks must be between 1 and {settings.UPLOAD_CHUNK_SIZE} bytes.")
+    if offset + length > session.size:
+        raise UploadError("The chunk runs past the end of the file.")
+
+    fd, chunk_path = tempfile.mkstemp(dir=settings.UPLOAD_SESSION_DIR, prefix=f'{session.pk}-', suffix='.chunk')
+    try:
+        with os.fdopen(fd, 'w+b') as chunk:
+            digest = hashlib.sha256()
+            remaining = length
+            while remaining:
+                block = stream.read(min(READ_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                chunk.write(block)
+                remaining -= len(block)
+            if remaining or digest.hexdigest() != checksum:
+                raise UploadError("The chunk was incomplete or didn't match its checksum; send it again.")
+
+            # Concurrent requests for the session queue up on its row; only
+            # the one that still finds the offset it started from writes.
+            with transaction.atomic():
+                current = UploadSession.objects.select_for_update().filter(pk=session.pk).values('offset', 'completed_at').get()
+                if current['completed_at'] is not None:
+                    raise UploadConflict("This upload has already been completed.")
+                if current['offset'] != offset:
+                    session.offset = current['offset']
+                    raise UploadConflict(f"Expected a chunk starting at byte {session.offset}.")
+                chunk.seek(0)
+                with open(partial_path(session), 'r+b') as f:
+                    f.seek(offset)
+                    shutil.copyfileobj(chunk, f, READ_SIZE)
+                    f.flush()
+                    os.fsync(f.fileno())
+                UploadSession.objects.filter(pk=session.pk).update(offset=offset + length, updated_at=timezone.now())
+    finally:
+        os.remove(chunk_path)
+    session.offset = offset + length
+    return session.offset
+
+
+def attach_upload(session, content):
+    """Moves a fully received upload into content.file's storage and saves the Content."""
+    # Claimed with a conditional update, so the file is only moved once.
+    claimed = UploadSession.objects.filter(
+        pk=session.pk, completed_at__isnull=True, offset=F('size'),
+    ).update(completed_at=timezone.now(), content=content)
+    if not claimed:
+        raise UploadConflict("This upload isn't complete, or has already been attached.")
+
+    path = partial_path(session)
+    # A second link to the received bytes, put back if the Content can't be
+    # saved so the upload can be attached again.
+    backup = _backup_path(session)
+    _remove(backup)
+    os.link(path, backup)
+    previous = content.file.name
+    try:
+        with open(path, 'rb') as f:
+            content.file.save(session.filename, _ReceivedFile(f, name=path), save=False)
+        content.save()
+    except Exception:
+        if content.file.name != previous:
+            content.file.delete(save=False)
+            content.file.name = previous
+        os.replace(backup, path)
+        UploadSession.objects.filter(pk=session.pk).update(completed_at=None, content=None)
+        raise
+    os.remove(backup)
+    # Storages that can't rename stream a copy instead.
+    _remove(path)
+    session.refresh_from_db()
+    return content
+
+
+def purge_stale_uploads(now=None):
+    """
+    Deletes uploads that haven't received a chunk in
+    UPLOAD_SESSION_MAX_AGE_HOURS, with the temporary files of those never
+    attached. Returns the number of sessions removed.
+    """
+    now = now or timezone.now()
+    stale = UploadSession.objects.filter(updated_at__lt=now - timedelta(hours=settings.UPLOAD_SESSION_MAX_AGE_HOURS))
+    removed = 0
+    for session in stale.iterator():
+        _remove(partial_path(session))
+        _remove(_backup_path(session))
+        session.delete()
+        removed += 1
+    return removed
@@ -1,23 +1,34 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('accounts/register/', views.student_register, name='register'),
     path('accounts/login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('', views.dashboard, name='dashboard'),
+    path('metrics/', views.metrics_endpoint, name='metrics'),
 
     # Admin Functionality
     path('create-instructor/', views.create_instructor, name='create_instructor'),
     path('instructors/', views.instructor_list, name='instructor_list'), 
     path('instructors/<int:pk>/edit/', views.instructor_update, name='instructor_update'),
     path('instructors/<int:pk>/delete/', views.instructor_delete, name='instructor_delete'), 
+    path('slow-queries/', views.slow_query_list, name='slow_query_list'),
+
+    # JSON API (read-only)
+    path('api/v1/courses/', api.course_list, name='api_course_list'),
+    path('api/v1/courses/<slug:slug>/', api.course_outline, name='api_course_outline'),
+    path('api/v1/me/progress/', api.my_progress, name='api_my_progress'),
 
     # Instructor Course Management
     path('courses/', views.course_list, name='course_list'),
     path('courses/create/', views.course_create, name='course_create'),
     path('courses/<slug:slug>/edit/', views.course_update, name='course_update'),
     path('courses/<slug:slug>/delete/', views.course_delete, name='course_delete'), 
+    path('courses/<slug:slug>/duplicate/', views.course_duplicate, name='course_duplicate'),
+    path('courses/<slug:slug>/export/<slug:kind>.csv', views.course_export, name='course_export'),
+    path('courses/<slug:slug>/analytics/', views.course_analytics, name='course_analytics'),
+    path('courses/<slug:slug>/gradebook/', views.course_gradebook, name='course_gradebook'),
 
     # Course Detail and Content Management
     path('courses/<slug:slug>/', views.course_detail, name='course_detail'),
@@ -45,6 +56,16 @@ urlpatterns = [
     path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/edit/', views.content_update, name='content_update'),
     path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/delete/', views.content_delete, name='content_delete'),
     path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/', views.content_detail, name='content_detail'),
+
+    # Resumable chunked uploads of content files
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<uuid:upload_id>/', views.upload_detail, name='upload_detail'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
+
+    # Quizzes (Nested under quiz content)
+    path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/quiz/', views.quiz_take, name='quiz_take'),
+    path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/quiz/submit/', views.quiz_submit, name='quiz_submit'),
+    path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/quiz/attempts/<int:attempt_id>/', views.quiz_result, name='quiz_result'),
 ]
 
 
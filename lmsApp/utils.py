@@ -1,10 +1,11 @@
 # core/utils.py
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.template.loader import render_to_string
 from django.conf import settings
 from datetime import datetime
+from . import metrics
 
-def send_templated_email(template_name, subject, recipient_list, context, attachments=None):
+def build_templated_email(template_name, subject, recipient_list, context, attachments=None):
 
     context['current_year'] = datetime.now().year
 
@@ -21,13 +22,39 @@ def send_templated_email(template_name, subject, recipient_list, context, attach
     if attachments:
         for filename, content, mimetype in attachments:
             email.attach(filename, content, mimetype)
-    
+    return email
+
+def send_templated_email(template_name, subject, recipient_list, context, attachments=None):
+    email = build_templated_email(template_name, subject, recipient_list, context, attachments)
     try:
         email.send()
+        metrics.EMAILS.labels(template_name, 'sent').inc()
         return True
     except Exception as e:
+        metrics.EMAILS.labels(template_name, 'failed').inc()
         # Log the error for debugging
         import traceback
         print(f"Error sending email: {e}\n{traceback.format_exc()}")
         return False
 
+def send_templated_emails(template_name, messages, batch_size=100):
+    """
+    Sends already built emails `batch_size` at a time, each batch over a
+    single connection to the mail server instead of one connection per
+    email. A failing batch is logged and skipped. Returns (sent, failed).
+    """
+    sent = failed = 0
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        try:
+            with get_connection() as connection:
+                count = connection.send_messages(batch) or 0
+        except Exception as e:
+            count = 0
+            import traceback
+            print(f"Error sending email batch: {e}\n{traceback.format_exc()}")
+        sent += count
+        failed += len(batch) - count
+    metrics.EMAILS.labels(template_name, 'sent').inc(sent)
+    metrics.EMAILS.labels(template_name, 'failed').inc(failed)
+    return sent, failed
@@ -4,17 +4,29 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db import transaction
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
 from django.template.loader import render_to_string, get_template
-from django.db.models import Q, Max
+from django.urls import reverse
+from django.core.paginator import Paginator
+from django.db.models import Q, Max, Count, F, Sum
 from .forms import *
 from .models import *
 from io import BytesIO
 from xhtml2pdf import pisa
 from django.conf import settings
+import hashlib
+import hmac
+import math
 import os
 import traceback
 from .utils import send_templated_email
+from .cloning import duplicate_course
+from .exports import EXPORTS, export_lines
+from .gradebook import Gradebook
+from .uploads import UploadError, attach_upload, parse_checksum, start_upload, write_chunk
+from .cache import get_version
+from .queries import attach_cache_versions, course_outline, enrolled_course_ids, published_courses
+from . import metrics
 
 # Helper functions for role-based access control
 def is_admin(user):
@@ -30,6 +42,16 @@ def is_ajax(request):
     """Helper to check if a request is an AJAX request."""
     return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
+# Access checks and grading read the database, never the query cache: with a
+# per-process cache, another worker's enrollment or quiz edit would only show
+# up here once the cached entry expires.
+def is_enrolled_in(course, user):
+    return Enrollment.objects.filter(student=user, course=course).exists()
+
+def quiz_questions(quiz):
+    """The quiz's questions in order, with their options in one prefetch query."""
+    return list(quiz.questions.order_by('order').prefetch_related('options'))
+
 # --- Authentication and Dashboard Views ---
 
 def student_register(request):
@@ -81,6 +103,21 @@ def user_logout(request):
     messages.info(request, "You have been logged out.")
     return redirect('login')
 
+def metrics_endpoint(request):
+    """
+    Prometheus metrics in the text exposition format. Only served to staff,
+    to requests bearing METRICS_BEARER_TOKEN and to the addresses in
+    METRICS_ALLOWED_IPS.
+    """
+    token = settings.METRICS_BEARER_TOKEN
+    allowed = (
+        bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    ) or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not allowed and not (request.user.is_authenticated and request.user.is_staff):
+        raise Http404
+    body, content_type = metrics.render_latest()
+    return HttpResponse(body, content_type=content_type)
+
 @login_required
 def dashboard(request):
     """
@@ -96,18 +133,36 @@ def dashboard(request):
     }
 
     if user.is_instructor:
-        context['courses'] = Course.objects.filter(instructor=user).order_by('-created_at')
+        context['courses'] = Course.objects.filter(instructor=user).select_related('instructor', 'analytics').order_by('-created_at')
+        attach_cache_versions(context['courses'])
     elif user.is_student:
-        context['enrolled_courses'] = Enrollment.objects.filter(student=user).select_related('course').order_by('-enrolled_at')
+        context['enrolled_courses'] = Enrollment.objects.filter(student=user).select_related('course__instructor').order_by('-enrolled_at')
         
-        # Calculate progress for each enrolled course and check certificate status
-        for enrollment in context['enrolled_courses']:
-            total_contents = Content.objects.filter(lesson__module__course=enrollment.course).count()
-            completed_contents = StudentContentProgress.objects.filter(
+        # Calculate progress for each enrolled course and check certificate status.
+        # Totals, completions and certificates are read for all courses at once,
+        # so the number of queries doesn't grow with the number of enrollments.
+        enrollments = list(context['enrolled_courses'])
+        course_ids = [enrollment.course_id for enrollment in enrollments]
+        total_by_course = dict(
+            Content.objects.filter(lesson__module__course__in=course_ids)
+            .values_list('lesson__module__course').annotate(total=Count('id'))
+        )
+        completed_by_course = dict(
+            StudentContentProgress.objects.filter(
                 student=user,
-                content__lesson__module__course=enrollment.course,
+                content__lesson__module__course__in=course_ids,
                 completed=True
-            ).count()
+            ).values_list('content__lesson__module__course').annotate(completed=Count('id'))
+        )
+        certificates_by_course = {
+            certificate.course_id: certificate
+            for certificate in Certificate.objects.filter(student=user, course__in=course_ids)
+        }
+
+        changed_enrollments = []
+        for enrollment in enrollments:
+            total_contents = total_by_course.get(enrollment.course_id, 0)
+            completed_contents = completed_by_course.get(enrollment.course_id, 0)
             
             enrollment.progress_percentage = 0
             if total_contents > 0:
@@ -116,23 +171,27 @@ def dashboard(request):
             # Update enrollment.completed based on 100% progress
             if enrollment.progress_percentage == 100 and not enrollment.completed:
                 enrollment.completed = True
-                enrollment.save(update_fields=['completed'])
+                changed_enrollments.append(enrollment)
             elif enrollment.progress_percentage < 100 and enrollment.completed:
                 # If progress drops below 100% (e.g., instructor adds new content), mark as incomplete
                 enrollment.completed = False
-                enrollment.save(update_fields=['completed'])
+                changed_enrollments.append(enrollment)
 
             # Check for certificate availability
             enrollment.has_certificate = False
             enrollment.certificate_obj = None
             if enrollment.completed:
-                certificate = Certificate.objects.filter(student=user, course=enrollment.course).first()
+                certificate = certificates_by_course.get(enrollment.course_id)
                 if certificate:
                     enrollment.has_certificate = True
                     enrollment.certificate_obj = certificate
                 else:
                     enrollment.can_claim_certificate = True # Can claim if completed but no certificate yet
 
+        if changed_enrollments:
+            Enrollment.objects.bulk_update(changed_enrollments, ['completed'])
+        context['enrolled_courses'] = enrollments
+
 
         # Course Search Logic for Students
         search_query = request.GET.get('q')
@@ -140,15 +199,20 @@ def dashboard(request):
             # Filter available courses by title or description
             context['available_courses'] = Course.objects.filter(
                 is_published=True
-            ).exclude(
+            ).select_related('instructor').exclude(
                 enrollments__student=user
             ).filter(
                 Q(title__icontains=search_query) | Q(description__icontains=search_query)
             ).order_by('-created_at')
             context['search_query'] = search_query # Pass query back to template for input field
         else:
-            context['available_courses'] = Course.objects.filter(is_published=True).exclude(enrollments__student=user).order_by('-created_at')[:5] # Show some available courses not yet enrolled
-    
+            # Show some available courses not yet enrolled, from the cached catalog
+            enrolled_ids = enrolled_course_ids(user.pk)
+            context['available_courses'] = [c for c in published_courses() if c.pk not in enrolled_ids][:5]
+
+        # Versions for the cached course card fragments, read in one round trip
+        attach_cache_versions([*context['available_courses'], *(e.course for e in enrollments)])
+
     return render(request, 'dashboard.html', context)
 
 # --- Admin Functionality ---
@@ -236,15 +300,102 @@ def instructor_delete(request, pk):
 
 # --- Instructor Course Management ---
 
+SLOW_QUERY_ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'calls': '-calls',
+    'mean': '-mean_ms',
+    'recent': '-last_seen',
+}
+
+@login_required
+@user_passes_test(is_admin)
+def slow_query_list(request):
+    """
+    Admin view listing the worst statements in the slow query log, optionally
+    for one view, with totals per view.
+    """
+    sort = request.GET.get('sort', 'total')
+    if sort not in SLOW_QUERY_ORDERINGS:
+        sort = 'total'
+    selected_view = request.GET.get('view', '')
+
+    queries = SlowQuery.objects.annotate(mean_ms=F('total_ms') / F('calls'))
+    if selected_view:
+        queries = queries.filter(view=selected_view)
+    queries = queries.order_by(SLOW_QUERY_ORDERINGS[sort])[:100]
+
+    views_summary = (
+        SlowQuery.objects.values('view')
+        .annotate(statements=Count('id'), calls=Sum('calls'), total_ms=Sum('total_ms'), max_ms=Max('max_ms'))
+        .order_by('-total_ms')
+    )
+    return render(request, 'admin/slow_query_list.html', {
+        'queries': queries,
+        'views_summary': views_summary,
+        'selected_view': selected_view,
+        'sort': sort,
+        'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+    })
+
 @login_required
 @user_passes_test(is_instructor)
 def course_list(request):
     """
     Lists courses managed by the logged-in instructor.
     """
-    courses = Course.objects.filter(instructor=request.user).order_by('-created_at')
+    courses = Course.objects.filter(instructor=request.user).select_related('instructor', 'analytics').order_by('-created_at')
     return render(request, 'instructor/course_list.html', {'courses': courses})
 
+GRADEBOOK_PAGE_SIZE = 50
+
+@login_required
+def course_gradebook(request, slug):
+    """
+    Students x content items completion grid with best quiz scores, paginated
+    by students, for the course's instructor or an admin. Completion rates
+    cover the whole cohort, not just the page.
+    """
+    course = get_object_or_404(Course, slug=slug)
+    if not (request.user.is_staff or (request.user.is_instructor and course.instructor_id == request.user.pk)):
+        raise Http404
+
+    gradebook = Gradebook(course.pk)
+    page = Paginator(gradebook.students, GRADEBOOK_PAGE_SIZE).get_page(request.GET.get('page'))
+    content_completion = gradebook.content_completion()
+    quiz_averages = gradebook.quiz_averages()
+    return render(request, 'instructor/course_gradebook.html', {
+        'course': course,
+        'page': page,
+        'rows': list(gradebook.rows(page.start_index() - 1, page.end_index())),
+        'contents': [
+            {**content, 'completion': round(rate * 100)}
+            for content, rate in zip(gradebook.contents, content_completion.tolist())
+        ],
+        'quizzes': [
+            {**quiz, 'average': None if math.isnan(average) else round(average, 2)}
+            for quiz, average in zip(gradebook.quizzes, quiz_averages.tolist())
+        ],
+        'overall_completion': round(gradebook.completed.mean() * 100) if gradebook.completed.size else 0,
+    })
+
+@login_required
+def course_analytics(request, slug):
+    """
+    Shows a course's precomputed analytics (see lmsApp.analytics) to its
+    instructor or an admin.
+    """
+    course = get_object_or_404(Course.objects.select_related('analytics'), slug=slug)
+    if not (request.user.is_staff or (request.user.is_instructor and course.instructor_id == request.user.pk)):
+        raise Http404
+    analytics = getattr(course, 'analytics', None)
+    return render(request, 'instructor/course_analytics.html', {
+        'course': course,
+        'analytics': analytics,
+        'drop_off': analytics.drop_off if analytics else None,
+        'active_days': settings.ANALYTICS_ACTIVE_DAYS,
+    })
+
 @login_required
 @user_passes_test(is_instructor)
 def course_create(request):
@@ -321,6 +472,50 @@ def course_delete(request, slug):
         return render(request, template_name, context)
     return render(request, template_name, context)
 
+@login_required
+@user_passes_test(is_instructor)
+def course_duplicate(request, slug):
+    """
+    Allows an instructor to duplicate one of their courses, including all
+    modules, lessons, content and quizzes. The copy is created as a draft.
+    """
+    course = get_object_or_404(Course, slug=slug, instructor=request.user)
+    template_name = 'instructor/_course_duplicate_form.html'
+
+    if request.method == 'POST':
+        form = CourseDuplicateForm(request.POST)
+        if form.is_valid():
+            new_course = duplicate_course(course, instructor=request.user, title=form.cleaned_data['title'])
+            messages.success(request, f'Course "{course.title}" duplicated as "{new_course.title}".')
+            if is_ajax(request):
+                return JsonResponse({'success': True, 'message': f'Course duplicated as "{new_course.title}"!', 'redirect_url': str(new_course.get_absolute_url())})
+            return redirect('course_detail', slug=new_course.slug)
+        else:
+            if is_ajax(request):
+                form_html = render_to_string(template_name, {'form': form, 'course': course, 'page_title': f'Duplicate Course: {course.title}'}, request=request)
+                return JsonResponse({'success': False, 'form_html': form_html, 'error': 'Validation failed.'})
+            messages.error(request, 'Failed to duplicate course. Please correct the errors.')
+    else:
+        form = CourseDuplicateForm(initial={'title': f"{course.title} (Copy)"})
+    return render(request, template_name, {'form': form, 'course': course, 'page_title': f'Duplicate Course: {course.title}'})
+
+
+@login_required
+def course_export(request, slug, kind):
+    """
+    Streams a CSV export (gradebook, progress or quiz attempts) of a course
+    to its instructor or an admin.
+    """
+    if kind not in EXPORTS:
+        raise Http404
+    course = get_object_or_404(Course, slug=slug)
+    if not (request.user.is_staff or (request.user.is_instructor and course.instructor_id == request.user.pk)):
+        raise Http404
+
+    response = StreamingHttpResponse(export_lines(kind, course), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{course.slug}-{kind}-{timezone.now():%Y%m%d}.csv"'
+    return response
+
 
 # --- Course Detail and Content Management Views ---
 
@@ -331,12 +526,12 @@ def course_detail(request, slug):
     Allows instructors to manage modules/lessons/content.
     Allows students to view published courses and enroll.
     """
-    course = get_object_or_404(Course, slug=slug)
+    course = get_object_or_404(Course.objects.select_related('instructor'), slug=slug)
     is_enrolled = False
-    modules = course.modules.prefetch_related('lessons__contents').all()
+    modules = course_outline(course.pk) # Cached; modules with lessons and contents prefetched
 
     if request.user.is_authenticated and request.user.is_student:
-        is_enrolled = Enrollment.objects.filter(student=request.user, course=course).exists()
+        is_enrolled = is_enrolled_in(course, request.user)
         
         student_progress_map = {
             p['content_id']: p['completed']
@@ -378,11 +573,27 @@ def course_detail(request, slug):
         messages.error(request, "This course is not yet published or you are not enrolled.")
         return redirect('dashboard')
 
+    # The cached outline fragment differs for the owner, enrolled students (by their progress or, on an
+    # unpublished course, by enrollment alone) and everyone else
+    if request.user.is_instructor and course.instructor == request.user:
+        outline_variant = 'owner'
+    elif can_access_content:
+        completed_ids = sorted(content_id for content_id, completed in student_progress_map.items() if completed)
+        outline_variant = 'enrolled:' + hashlib.md5(str(completed_ids).encode()).hexdigest()
+    elif request.user.is_student:
+        # Enrolled in a course that isn't published (any more): no content
+        # links, but no enroll prompt either.
+        outline_variant = 'student:enrolled' if is_enrolled else 'student'
+    else:
+        outline_variant = 'other'
+
     context = {
         'course': course,
         'is_enrolled': is_enrolled,
         'can_access_content': can_access_content,
         'modules': modules, # Pass the pre-fetched modules to the template
+        'course_version': get_version('course', course.pk),
+        'outline_variant': outline_variant,
     }
     return render(request, 'course_detail.html', context)
 
@@ -557,7 +768,7 @@ def content_create(request, course_slug, module_id, lesson_id):
     template_name = 'instructor/_content_form.html' if is_ajax(request) else 'instructor/_content_form.html'
 
     if request.method == 'POST':
-        form = ContentForm(request.POST, request.FILES)
+        form = ContentForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             content = form.save(commit=False)
             content.lesson = lesson
@@ -570,6 +781,8 @@ def content_create(request, course_slug, module_id, lesson_id):
             # --- END FIX ---
 
             content.save()
+            if form.cleaned_data.get('upload'):
+                attach_upload(form.cleaned_data['upload'], content)
             messages.success(request, f'Content "{content.title}" added successfully to lesson "{lesson.title}".')
             if is_ajax(request):
                 return JsonResponse({'success': True, 'message': f'Content "{content.title}" added successfully!'})
@@ -594,9 +807,11 @@ def content_update(request, course_slug, module_id, lesson_id, content_id):
     template_name = 'instructor/_content_form.html' if is_ajax(request) else 'instructor/content_form.html'
 
     if request.method == 'POST':
-        form = ContentForm(request.POST, request.FILES, instance=content)
+        form = ContentForm(request.POST, request.FILES, instance=content, user=request.user)
         if form.is_valid():
             form.save()
+            if form.cleaned_data.get('upload'):
+                attach_upload(form.cleaned_data['upload'], content)
             messages.success(request, f'Content "{content.title}" updated successfully.')
             if is_ajax(request):
                 return JsonResponse({'success': True, 'message': f'Content "{content.title}" updated successfully!'})
@@ -610,6 +825,66 @@ def content_update(request, course_slug, module_id, lesson_id, content_id):
         form = ContentForm(instance=content)
     return render(request, template_name, {'form': form, 'lesson': lesson, 'module': module, 'course': course, 'page_title': f'Edit Content: {content.title}'})
 
+def _upload_state(session):
+    return {
+        'id': str(session.pk), 'offset': session.offset, 'size': session.size, 'received': session.received,
+        'url': reverse('upload_detail', kwargs={'upload_id': session.pk}),
+    }
+
+
+@login_required
+@user_passes_test(is_instructor)
+def upload_create(request):
+    """Starts a resumable chunked upload (see lmsApp.uploads) of a file of `size` bytes."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request.'}, status=405)
+    try:
+        session = start_upload(request.user, request.POST.get('filename'), request.POST.get('size'))
+    except UploadError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=error.status)
+    return JsonResponse({'success': True, 'chunk_size': settings.UPLOAD_CHUNK_SIZE, **_upload_state(session)}, status=201)
+
+
+@login_required
+@user_passes_test(is_instructor)
+def upload_detail(request, upload_id):
+    """GET: how much of the upload has been received. PUT: the next chunk, as the request body."""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method == 'PUT':
+        try:
+            write_chunk(
+                session,
+                offset=int(request.headers.get('Upload-Offset', '')),
+                length=int(request.headers.get('Content-Length') or 0),
+                stream=request,
+                checksum=parse_checksum(request.headers.get('Upload-Checksum')),
+            )
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Upload-Offset is required.', **_upload_state(session)}, status=400)
+        except UploadError as error:
+            return JsonResponse({'success': False, 'error': str(error), **_upload_state(session)}, status=error.status)
+    elif request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request.'}, status=405)
+    return JsonResponse({'success': True, **_upload_state(session)})
+
+
+@login_required
+@user_passes_test(is_instructor)
+def upload_complete(request, upload_id):
+    """Attaches a fully received upload to one of the instructor's Content items as its file."""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request.'}, status=405)
+    content = get_object_or_404(
+        Content, pk=request.POST.get('content') or 0, lesson__module__course__instructor=request.user,
+    )
+    try:
+        attach_upload(session, content)
+    except UploadError as error:
+        return JsonResponse({'success': False, 'error': str(error), **_upload_state(session)}, status=error.status)
+    return JsonResponse({'success': True, 'message': f'File attached to "{content.title}".', 'file_url': content.file.url})
+
+
 @login_required
 @user_passes_test(is_instructor)
 def content_delete(request, course_slug, module_id, lesson_id, content_id):
@@ -661,7 +936,7 @@ def content_detail(request, course_slug, module_id, lesson_id, content_id):
     if request.user.is_authenticated:
         if request.user.is_instructor and course.instructor == request.user:
             can_view_content_page = True
-        elif request.user.is_student and course.is_published and Enrollment.objects.filter(student=request.user, course=course).exists():
+        elif request.user.is_student and course.is_published and is_enrolled_in(course, request.user):
             can_view_content_page = True
 
     if not can_view_content_page:
@@ -700,7 +975,7 @@ def enroll_course(request, slug):
         messages.error(request, 'Cannot enroll in an unpublished course.')
         return redirect('course_detail', slug=course.slug)
 
-    if Enrollment.objects.filter(student=student, course=course).exists():
+    if is_enrolled_in(course, student):
         if is_ajax(request):
             return JsonResponse({'success': False, 'error': 'You are already enrolled in this course.'}, status=400)
         messages.info(request, 'You are already enrolled in this course.')
@@ -709,6 +984,7 @@ def enroll_course(request, slug):
     try:
         with transaction.atomic():
             enrollment = Enrollment.objects.create(student=student, course=course)
+            transaction.on_commit(metrics.ENROLLMENTS.inc)
             messages.success(request, f'Successfully enrolled in "{course.title}"!')
 
             # --- Send Enrollment Confirmation Email ---
@@ -756,7 +1032,7 @@ def mark_content_completed(request, course_slug, module_id, lesson_id, content_i
     student = request.user
 
     # Ensure student is enrolled in the course to mark content complete
-    if not Enrollment.objects.filter(student=student, course=course).exists():
+    if not is_enrolled_in(course, student):
         return JsonResponse({'success': False, 'error': 'You must be enrolled in this course to mark content.'}, status=403)
 
     try:
@@ -773,7 +1049,8 @@ def mark_content_completed(request, course_slug, module_id, lesson_id, content_i
             else:
                 progress.completed_at = None
             progress.save()
-        
+        metrics.CONTENT_PROGRESS.labels(str(progress.completed).lower()).inc()
+
         status_message = "marked as complete." if progress.completed else "marked as incomplete."
         messages.success(request, f'Content "{content.title}" {status_message}')
         return JsonResponse({'success': True, 'completed': progress.completed, 'message': f'Content "{content.title}" {status_message}'})
@@ -795,16 +1072,17 @@ def quiz_take(request, course_slug, module_id, lesson_id, content_id):
     quiz = get_object_or_404(Quiz, lesson=lesson) # Assuming one quiz per lesson for now
 
     # Access control: Student must be enrolled and course published
-    if not Enrollment.objects.filter(student=request.user, course=course).exists() or not course.is_published:
+    if not is_enrolled_in(course, request.user) or not course.is_published:
         messages.error(request, "You are not authorized to take this quiz.")
         return redirect('course_detail', slug=course.slug)
 
     # Check if quiz has questions
-    if not quiz.questions.exists():
+    questions = quiz_questions(quiz)
+    if not questions:
         messages.info(request, "This quiz has no questions yet.")
         return redirect('content_detail', course_slug=course.slug, module_id=module.id, lesson_id=lesson.id, content_id=content.id)
 
-    form = QuizForm(quiz=quiz) # Initialize form with the quiz instance
+    form = QuizForm(quiz=quiz, questions=questions) # Initialize form with the quiz instance
 
     context = {
         'course': course,
@@ -829,14 +1107,15 @@ def quiz_submit(request, course_slug, module_id, lesson_id, content_id):
     quiz = get_object_or_404(Quiz, lesson=lesson)
 
     # Access control: Student must be enrolled and course published
-    if not Enrollment.objects.filter(student=request.user, course=course).exists() or not course.is_published:
+    if not is_enrolled_in(course, request.user) or not course.is_published:
         messages.error(request, "You are not authorized to submit this quiz.")
         return redirect('course_detail', slug=course.slug)
 
     if request.method == 'POST':
-        form = QuizForm(request.POST, quiz=quiz)
+        questions = quiz_questions(quiz)
+        form = QuizForm(request.POST, quiz=quiz, questions=questions)
         if form.is_valid():
-            total_questions = quiz.questions.count()
+            total_questions = len(questions)
             correct_answers_count = 0
             student_answers_to_save = []
 
@@ -849,13 +1128,16 @@ def quiz_submit(request, course_slug, module_id, lesson_id, content_id):
                     passed=False
                 )
 
-                for question in quiz.questions.all():
+                for question in questions:
                     field_name = f'question_{question.id}'
                     chosen_option_id = form.cleaned_data.get(field_name)
 
                     chosen_option = None
                     if chosen_option_id:
-                        chosen_option = get_object_or_404(Option, id=chosen_option_id, question=question)
+                        # Options are prefetched with the questions
+                        chosen_option = next((opt for opt in question.options.all() if str(opt.id) == str(chosen_option_id)), None)
+                        if chosen_option is None:
+                            raise Http404("Option not found.")
 
                     # Save student's answer
                     student_answers_to_save.append(
@@ -882,6 +1164,7 @@ def quiz_submit(request, course_slug, module_id, lesson_id, content_id):
                 attempt.score = round(score_percentage, 2)
                 attempt.passed = (score_percentage >= quiz.pass_percentage)
                 attempt.save()
+                metrics.QUIZ_SUBMISSIONS.labels(str(attempt.passed).lower()).inc()
 
                 messages.success(request, f'Quiz "{quiz.title}" submitted! Your score: {attempt.score:.2f}%')
                 return redirect('quiz_result', course_slug=course.slug, module_id=module.id, lesson_id=lesson.id, content_id=content.id, attempt_id=attempt.id)
@@ -915,23 +1198,23 @@ def quiz_result(request, course_slug, module_id, lesson_id, content_id, attempt_
     attempt = get_object_or_404(StudentQuizAttempt, id=attempt_id, student=request.user, quiz=quiz)
 
     # Access control: Student must be enrolled and course published
-    if not Enrollment.objects.filter(student=request.user, course=course).exists() or not course.is_published:
+    if not is_enrolled_in(course, request.user) or not course.is_published:
         messages.error(request, "You are not authorized to view this quiz result.")
         return redirect('course_detail', slug=course.slug)
 
-    # Fetch all questions and their options for the quiz
+    # Fetch all questions and their options for the quiz, and the attempt's answers in one query
+    chosen_option_ids = dict(attempt.answers.values_list('question_id', 'chosen_option_id'))
     questions_with_answers = []
-    for question in quiz.questions.all().order_by('order'):
+    for question in quiz_questions(quiz):
         options = list(question.options.all())
-        student_answer = StudentAnswer.objects.filter(attempt=attempt, question=question).first()
-        
-        chosen_option_id = student_answer.chosen_option.id if student_answer and student_answer.chosen_option else None
-        
+        chosen_option_id = chosen_option_ids.get(question.id)
+        chosen_option = next((opt for opt in options if opt.id == chosen_option_id), None)
+
         questions_with_answers.append({
             'question': question,
             'options': options,
             'chosen_option_id': chosen_option_id,
-            'is_correct': student_answer.chosen_option.is_correct if student_answer and student_answer.chosen_option else False,
+            'is_correct': chosen_option.is_correct if chosen_option else False,
             'correct_option': next((opt for opt in options if opt.is_correct), None)
         })
 
@@ -1013,11 +1296,12 @@ def issue_certificate(request, course_slug):
                     path = uri # Assume it's a direct path or external URL
                 return path
 
-            pisa_status = pisa.CreatePDF(
-                html,
-                dest=result_file,
-                link_callback=link_callback
-            )
+            with metrics.timed(metrics.CERTIFICATE_RENDER):
+                pisa_status = pisa.CreatePDF(
+                    html,
+                    dest=result_file,
+                    link_callback=link_callback
+                )
 
             if pisa_status.err:
                 raise Exception(f"PDF generation error: {pisa_status.err}")
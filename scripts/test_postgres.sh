@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+# Runs the test suite against a throwaway local PostgreSQL container, the same
+# way the "postgres" CI job does. Usage: scripts/test_postgres.sh [test labels...]
+set -euo pipefail
+
+CONTAINER=lms-test-postgres
+PORT=${DATABASE_PORT:-55432}
+
+docker run --rm -d --name "$CONTAINER" -p "$PORT:5432" \
+    -e POSTGRES_DB=lms -e POSTGRES_USER=lms -e POSTGRES_PASSWORD=lms \
+    postgres:16 >/dev/null
+trap 'docker stop "$CONTAINER" >/dev/null' EXIT
+
+until docker exec "$CONTAINER" pg_isready -U lms >/dev/null 2>&1; do
+    sleep 1
+done
+
+export DATABASE_ENGINE=postgres
+export DATABASE_NAME=lms DATABASE_USER=lms DATABASE_PASSWORD=lms
+export DATABASE_HOST=localhost DATABASE_PORT="$PORT"
+
+python manage.py test "$@"